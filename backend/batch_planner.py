@@ -0,0 +1,105 @@
+import math
+
+
+def estimate_tokens(text):
+    """Rough token count for English/Latin text (~3.5 chars per token, rounded up)."""
+    return math.ceil(len(text) / 3.5) if text else 0
+
+
+class BatchPlanner:
+    """Packs leads into LLM scoring batches against a token budget.
+
+    A batch is closed when adding the next lead would exceed either
+    - `max_prompt_tokens` for the prompt (shared rubric + lead lines), or
+    - `max_output_tokens * headroom` for the expected completion,
+    or when it reaches `max_leads`. Expected completion tokens per lead start at
+    `output_tokens_per_lead` and follow what responses actually produced. observe() also
+    accumulates per-call token usage (incl. provider-cached prompt tokens) and latency.
+    """
+
+    def __init__(self, max_prompt_tokens=24000, max_output_tokens=4000, output_tokens_per_lead=160,
+                 max_leads=20, headroom=0.85):
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_output_tokens = max_output_tokens
+        self.output_tokens_per_lead = output_tokens_per_lead
+        self.max_leads = max_leads
+        self.headroom = headroom
+        self._requests = 0
+        self._batches = 0
+        self._leads = 0
+        self._prompt_tokens = 0  # estimated lead-line tokens across planned leads
+        self._splits = 0
+        # Per-call usage reported back via observe()
+        self._calls = 0
+        self._call_prompt_tokens = 0
+        self._call_cached_tokens = 0
+        self._call_completion_tokens = 0
+        self._call_seconds = 0.0
+        self._first_token_s = 0.0
+        self._first_token_calls = 0
+
+    def stats(self):
+        return {
+            "requests": self._requests,
+            "batches": self._batches,
+            "batches_per_request": round(self._batches / self._requests, 2) if self._requests else 0.0,
+            "leads_per_batch": round(self._leads / self._batches, 2) if self._batches else 0.0,
+            "prompt_tokens_per_lead": round(self._prompt_tokens / self._leads, 1) if self._leads else 0.0,
+            "output_tokens_per_lead": round(self.output_tokens_per_lead, 1),
+            "truncation_splits": self._splits,
+            "calls": self._calls,
+            "prompt_tokens": self._call_prompt_tokens,
+            "cached_prompt_tokens": self._call_cached_tokens,
+            "prompt_cache_rate": round(self._call_cached_tokens / self._call_prompt_tokens, 3) if self._call_prompt_tokens else 0.0,
+            "completion_tokens": self._call_completion_tokens,
+            "avg_call_s": round(self._call_seconds / self._calls, 3) if self._calls else 0.0,
+            "avg_first_token_s": round(self._first_token_s / self._first_token_calls, 3) if self._first_token_calls else 0.0,
+        }
+
+    def plan(self, lead_tokens, base_tokens):
+        """Group lead positions into batches.
+
+        lead_tokens: estimated prompt tokens of each lead line, in order.
+        base_tokens: estimated tokens of the prompt without any leads.
+        Returns a list of lists of positions into lead_tokens.
+        """
+        output_budget = self.max_output_tokens * self.headroom
+        batches, current, prompt_used = [], [], base_tokens
+        for pos, tokens in enumerate(lead_tokens):
+            full = current and (
+                len(current) >= self.max_leads
+                or prompt_used + tokens > self.max_prompt_tokens
+                or (len(current) + 1) * self.output_tokens_per_lead > output_budget
+            )
+            if full:
+                batches.append(current)
+                current, prompt_used = [], base_tokens
+            current.append(pos)
+            prompt_used += tokens
+        if current:
+            batches.append(current)
+
+        self._requests += 1
+        self._batches += len(batches)
+        self._leads += len(lead_tokens)
+        self._prompt_tokens += sum(lead_tokens)
+        return batches
+
+    def observe(self, leads, completion_tokens=0, prompt_tokens=0, cached_tokens=0, seconds=0.0, first_token_s=None):
+        """Feed back one completed call: `leads` parsed from `completion_tokens` of output."""
+        self._calls += 1
+        self._call_prompt_tokens += prompt_tokens
+        self._call_cached_tokens += cached_tokens
+        self._call_completion_tokens += completion_tokens
+        self._call_seconds += seconds
+        if first_token_s is not None:
+            self._first_token_s += first_token_s
+            self._first_token_calls += 1
+        if leads > 0 and completion_tokens > 0:
+            per_lead = completion_tokens / leads
+            # Adapt quickly upward (truncation is costly), slowly downward
+            weight = 0.5 if per_lead > self.output_tokens_per_lead else 0.1
+            self.output_tokens_per_lead += weight * (per_lead - self.output_tokens_per_lead)
+
+    def record_split(self):
+        self._splits += 1
@@ -0,0 +1,68 @@
+"""Lead persistence throughput: one ORM GlobalLead per row vs bulk_insert_leads, in rows/sec.
+
+    cd backend && python benchmarks/bench_bulk_insert.py [rows ...]   (default 10000 50000)
+
+Runs against DATABASE_URL (a throwaway SQLite file when unset), so pointing it at a
+Postgres database measures the COPY path. Each run writes under its own session_id and
+deletes its rows afterwards.
+"""
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='bench-insert-')}/bench.db")
+
+from sqlalchemy import delete
+
+from database import DATABASE_URL, GlobalLead, SessionLocal, bulk_insert_leads, write_session
+
+
+def _rows(n, session_id):
+    return [
+        (session_id, f"First{i}", f"Last{i % 977}", f"https://www.linkedin.com/in/lead-{i}",
+         f"Co{i % 3001} Ventures", "Partner" if i % 7 else "", f"{1 + i % 28:02d} Mar 2024")
+        for i in range(n)
+    ]
+
+
+def orm_insert(rows):
+    """The old _persist_leads: one GlobalLead instance per row, add_all + commit."""
+    db = SessionLocal()
+    try:
+        db.add_all([
+            GlobalLead(session_id=session_id, first_name=first, last_name=last, url=url, company=company,
+                       position=position, connected_on=connected_on)
+            for session_id, first, last, url, company, position, connected_on in rows
+        ])
+        db.commit()
+    finally:
+        db.close()
+    return len(rows)
+
+
+def bulk_insert(rows):
+    return bulk_insert_leads(iter(rows))
+
+
+def timed_insert(fn, n):
+    session_id = str(uuid.uuid4())
+    rows = _rows(n, session_id)
+    started = time.perf_counter()
+    assert fn(rows) == n
+    seconds = time.perf_counter() - started
+    with write_session() as db:
+        db.execute(delete(GlobalLead).where(GlobalLead.session_id == session_id))
+    return seconds
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 50_000]
+    print(f"database: {DATABASE_URL.split('://')[0]}")
+    print(f"{'rows':>8} {'ORM rows/s':>12} {'bulk rows/s':>12} {'speedup':>8}")
+    for rows in sizes:
+        old_s = min(timed_insert(orm_insert, rows) for _ in range(2))
+        new_s = min(timed_insert(bulk_insert, rows) for _ in range(2))
+        print(f"{rows:>8} {rows / old_s:>12,.0f} {rows / new_s:>12,.0f} {old_s / new_s:>7.1f}x", flush=True)
@@ -0,0 +1,91 @@
+"""Lead-frame memory benchmark: bytes per row of the parsed, deduplicated frame.
+
+    cd backend && python benchmarks/bench_frame_memory.py [--rows 200000] [--formats linkedin,hubspot,salesforce]
+
+Each format runs in a fresh subprocess: a synthetic export (benchmarks/synthetic.py) goes
+through _parse_uploads (process_csv + dedup, as /analyze does for in-memory uploads),
+then the BM25 index and prefilter. Reports the frame's deep memory_usage per row, its
+columns and dtypes, peak RSS and stage seconds.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+
+STRATEGY = {
+    "keywords": ["partner", "vc", "capital", "ventures", "angel"],
+    "boost_words": ["Partner", "Principal"],
+    "company_words": ["Capital", "Ventures"],
+    "negative_words": ["Intern", "Student"],
+    "priority_signals": ["partner at", "venture capital"],
+}
+
+
+def run_case(path):
+    import main
+    from services import build_lead_index
+
+    with open(path, "rb") as f:
+        uploads = [(os.path.basename(path), f.read())]
+    t = time.perf_counter()
+    df = main._parse_uploads(uploads)
+    parse_s = time.perf_counter() - t
+    del uploads
+    frame_bytes = int(df.memory_usage(deep=True).sum())
+    dtypes = {str(c): str(d) for c, d in df.dtypes.items()}
+    t = time.perf_counter()
+    index = build_lead_index(df)
+    candidates = main._prefilter(df, index, STRATEGY, 100)
+    prefilter_s = time.perf_counter() - t
+    print(json.dumps({
+        "rows": len(df),
+        "columns": len(dtypes),
+        "frame_mb": round(frame_bytes / 2 ** 20, 1),
+        "bytes_per_row": round(frame_bytes / len(df)),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024),
+        "parse_s": round(parse_s, 2),
+        "index+prefilter_s": round(prefilter_s, 2),
+        "top_candidate": candidates["Position"].iloc[0],
+        "dtypes": dtypes,
+    }))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--formats", default="linkedin,hubspot,salesforce")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.case:
+        run_case(args.case)
+        return
+
+    from synthetic import write_export
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in args.formats.split(","):
+            path = os.path.join(tmp, f"{fmt}-{args.rows}.csv")
+            write_export(path, fmt, args.rows)
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/bench.db", GMI_API_KEY="bench", LOG_LEVEL="warning")
+            out = subprocess.run([sys.executable, __file__, "--case", path], env=env, capture_output=True, text=True)
+            lines = [line for line in out.stdout.splitlines() if line.startswith("{")]
+            if out.returncode or not lines:
+                print(f"{fmt}: failed\n{out.stderr[-2000:]}", file=sys.stderr)
+                continue
+            r = json.loads(lines[-1])
+            print(f"{fmt:<11} {os.path.getsize(path) / 2 ** 20:6.1f} MB file  {r['rows']:>7} rows  {r['columns']:>2} cols  "
+                  f"{r['bytes_per_row']:>5} B/row  frame {r['frame_mb']:>6} MB  peak {r['peak_rss_mb']:>5} MB  "
+                  f"parse {r['parse_s']:.2f}s  index+prefilter {r['index+prefilter_s']:.2f}s")
+            print(f"{'':<11} {r['dtypes']}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""End-to-end /analyze benchmark against the deterministic fake LLM — no real tokens spent.
+
+    cd backend && python benchmarks/bench_pipeline.py [--rows 1000,10000,100000,500000]
+        [--formats linkedin,hubspot,salesforce] [--latency 0.2] [--rate-429 0.02] [--malformed 0.02]
+        [--out FILE] [--compare FILE]
+
+Each (format, rows) case runs in a fresh subprocess with its own fake LLM server
+(benchmarks/fake_llm.py) and throwaway SQLite database, through the same upload path as
+/analyze (in memory up to 10MB, streamed from disk above). Per-stage timings come from
+_run_analysis: parse (process_csv + dedup), persist, index, strategy, prefilter
+(quick_score + BM25 top-K), llm (batch fan-out), merge. Results are written as JSON
+(default benchmarks/results/pipeline-<commit>.json); --compare prints the change
+against an earlier results file.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+
+IDEA = "Raise a seed round for an AI infrastructure startup"
+STAGES = ["read", "parse", "persist", "index", "strategy", "prefilter", "llm", "merge", "total"]
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_fake_llm(args):
+    """Serve the fake LLM from a daemon thread; returns its base URL."""
+    import uvicorn
+    from fake_llm import create_app
+
+    port = _free_port()
+    app = create_app(args.latency, args.token_ms, args.rate_429, args.malformed, args.seed)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}"
+
+
+def run_case(fmt, rows, args):
+    """One benchmark case in this process; prints its result as a JSON line."""
+    from synthetic import write_export
+
+    tmp = tempfile.mkdtemp(prefix="bench-pipeline-")
+    path = os.path.join(tmp, f"{fmt}-{rows}.csv")
+    write_export(path, fmt, rows, seed=args.seed)
+    fake_url = _start_fake_llm(args)
+    os.environ.update(
+        GMI_BASE_URL=f"{fake_url}/v1", GMI_API_KEY="bench", DATABASE_URL=f"sqlite:///{tmp}/bench.db",
+        SCORE_CACHE_ENABLED="0", ANALYZE_DEDUP_ENABLED="0", STRATEGY_CACHE_TTL_S="0", UPLOAD_SPOOL_DIR=tmp,
+        LOG_LEVEL=os.getenv("LOG_LEVEL", "warning"),
+    )
+    import contextlib
+    import io
+
+    import httpx
+    from starlette.datastructures import UploadFile
+
+    import main
+    from services import batch_planner, llm_scheduler
+
+    async def go():
+        timings = {}
+        with open(path, "rb") as f:
+            t = time.perf_counter()
+            uploads = await main._read_uploads([UploadFile(f, size=os.path.getsize(path), filename=os.path.basename(path))])
+            timings["read"] = time.perf_counter() - t
+        streamed = any(isinstance(u, main.SpooledUpload) for u in uploads)
+        result = await main._run_analysis(IDEA, uploads, "bench", main.Funnel(), timings=timings)
+        async with httpx.AsyncClient() as client:
+            fake = (await client.get(f"{fake_url}/stats")).json()
+        return timings, streamed, result, fake
+
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        timings, streamed, result, fake = asyncio.run(go())
+    print(json.dumps({
+        "format": fmt,
+        "rows": rows,
+        "file_mb": round(os.path.getsize(path) / 2 ** 20, 2),
+        "mode": "stream" if streamed else "memory",
+        "stages_s": {k: round(v, 4) for k, v in timings.items() if k in STAGES},
+        "rows_per_s": round(rows / timings["total"]) if timings.get("total") else None,
+        "leads_returned": len(result["data"]),
+        "top_score": result["data"][0]["score"] if result["data"] else None,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024),
+        "fake_llm": fake,
+        "scheduler": llm_scheduler.stats(),
+        "batches": {k: v for k, v in batch_planner.stats().items() if k in ("batches", "leads_per_batch", "truncation_splits")},
+    }))
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _print_table(results, baseline=None):
+    before = {(r["format"], r["rows"]): r for r in (baseline or {}).get("results", [])}
+    print(f"{'format':<11}{'rows':>8} {'mode':<7}" + "".join(f"{s:>10}" for s in STAGES))
+    for r in results:
+        line = f"{r['format']:<11}{r['rows']:>8} {r['mode']:<7}"
+        line += "".join(f"{r['stages_s'].get(s, float('nan')):>10.3f}" for s in STAGES)
+        print(line)
+        old = before.get((r["format"], r["rows"]))
+        if old:
+            ratios = []
+            for s in STAGES:
+                a, b = old["stages_s"].get(s), r["stages_s"].get(s)
+                ratios.append(f"{b / a:>9.2f}x" if a and b is not None else f"{'':>10}")
+            print(f"{'  vs base':<27}" + "".join(ratios))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", default="1000,10000,100000,500000")
+    parser.add_argument("--formats", default="linkedin,hubspot,salesforce")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake LLM seconds per call")
+    parser.add_argument("--token-ms", type=float, default=0.5, help="fake LLM milliseconds per completion token")
+    parser.add_argument("--rate-429", type=float, default=0.02)
+    parser.add_argument("--malformed", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--case", nargs=2, metavar=("FORMAT", "ROWS"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.case:
+        run_case(args.case[0], int(args.case[1]), args)
+        return
+
+    passthrough = ["--latency", str(args.latency), "--token-ms", str(args.token_ms), "--rate-429", str(args.rate_429),
+                   "--malformed", str(args.malformed), "--seed", str(args.seed)]
+    results = []
+    for fmt in args.formats.split(","):
+        for rows in (int(r) for r in args.rows.split(",")):
+            out = subprocess.run([sys.executable, __file__, "--case", fmt, str(rows), *passthrough],
+                                 capture_output=True, text=True)
+            lines = [line for line in out.stdout.splitlines() if line.startswith("{")]
+            if out.returncode or not lines:
+                print(f"{fmt} {rows}: failed\n{out.stderr[-2000:]}", file=sys.stderr)
+                continue
+            results.append(json.loads(lines[-1]))
+            r = results[-1]
+            print(f"{fmt} {rows}: {r['stages_s']['total']:.2f}s ({r['mode']}, peak {r['peak_rss_mb']} MB)", flush=True)
+
+    commit = _git_commit()
+    report = {
+        "commit": commit,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "case")},
+        "results": results,
+    }
+    out_path = args.out or os.path.join(HERE, "results", f"pipeline-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    _print_table(results, baseline)
+    print(f"results: {out_path}")
+
+
+if __name__ == "__main__":
+    main()
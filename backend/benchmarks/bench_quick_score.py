@@ -0,0 +1,64 @@
+"""Keyword pre-score throughput: quick_score_frame vs the old per-row scorer, in rows/sec.
+
+    cd backend && python benchmarks/bench_quick_score.py [rows ...]   (default 10000 50000 200000)
+
+The per-row baseline is the oracle from tests/test_quick_score.py, run with
+df.apply(axis=1) the way /analyze used to. Both must give identical scores.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("GMI_API_KEY", "bench")
+
+import pandas as pd
+
+from services import materialize_profiles, quick_score_frame
+from tests.test_quick_score import legacy_quick_score
+
+STRATEGY = {
+    "keywords": ["partner", "vc", "capital", "ventures", "angel"],
+    "boost_words": ["Partner", "Principal"],
+    "company_words": ["Capital", "Ventures"],
+    "negative_words": ["Intern", "Student"],
+    "priority_signals": ["partner at", "venture capital"],
+}
+TITLES = ["General Partner", "Partner", "Principal", "Managing Director", "Software Engineer", "VP Sales",
+          "Head of Growth", "Founder & CEO", "Account Executive", "Intern", "Angel Investor", "Associate"]
+SENIORITY = ["", "Senior ", "Lead ", "Chief ", "Associate "]
+SUFFIXES = ["Ventures", "Capital", "Partners", "Labs", "Inc", "LLP", "Group", "Technologies"]
+
+
+def synthetic_frame(n, seed=0):
+    """A LinkedIn-like export: titles repeat heavily, companies much less."""
+    rnd = random.Random(seed)
+    return materialize_profiles(pd.DataFrame({
+        "First Name": [f"First{i}" for i in range(n)],
+        "Last Name": [f"Last{i % 977}" for i in range(n)],
+        "Position": [rnd.choice(SENIORITY) + rnd.choice(TITLES) for _ in range(n)],
+        "Company": [f"Co{rnd.randint(0, n // 5)} {rnd.choice(SUFFIXES)}" for _ in range(n)],
+        "Industry": "", "Location": "", "URL": "", "Email": "", "Connected On": "",
+    }))
+
+
+def per_row(df):
+    return df.apply(lambda row: legacy_quick_score(row, STRATEGY), axis=1)
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - started, result
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 50_000, 200_000]
+    print(f"{'rows':>8} {'per-row rows/s':>15} {'vectorized rows/s':>18} {'speedup':>8}")
+    for rows in sizes:
+        df = synthetic_frame(rows)
+        old_s, old = timed(per_row, df)
+        new_s, new = min(timed(quick_score_frame, df, STRATEGY) for _ in range(3))
+        assert old.tolist() == new.tolist(), "scores differ from the per-row scorer"
+        print(f"{rows:>8} {rows / old_s:>15,.0f} {rows / new_s:>18,.0f} {old_s / new_s:>7.0f}x", flush=True)
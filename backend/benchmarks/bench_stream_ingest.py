@@ -0,0 +1,72 @@
+"""Peak-RSS benchmark: streaming chunked ingest vs the in-memory path, per upload size.
+
+    cd backend && python benchmarks/bench_stream_ingest.py [rows ...]
+
+Each (mode, size) runs in a fresh subprocess against a throwaway SQLite database and
+reports peak RSS (ru_maxrss) for parse + persist + prefilter to the top 100.
+"""
+import concurrent.futures
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+STRATEGY = {
+    "keywords": ["partner", "vc", "capital", "ventures", "angel"],
+    "boost_words": ["Partner", "Principal"],
+    "company_words": ["Capital", "Ventures"],
+    "negative_words": ["Intern", "Student"],
+    "priority_signals": ["partner at", "venture capital"],
+}
+
+
+def write_csv(path, rows):
+    from bench_relevance import synthetic_frame
+    step = 100_000
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for start in range(0, rows, step):
+            frame = synthetic_frame(min(step, rows - start), seed=start)
+            columns = ["First Name", "Last Name", "URL", "Email", "Company", "Position", "Connected On"]
+            frame[columns].to_csv(f, header=start == 0, index=False)
+
+
+def run(mode, path):
+    import main
+    timings = {}
+    started = time.perf_counter()
+    if mode == "stream":
+        ready = concurrent.futures.Future()
+        ready.set_result(STRATEGY)
+        upload = main.SpooledUpload("bench.csv", path, 0, "")
+        candidates, rows = main._stream_ingest([upload], "bench", ready, 100, threading.Event(), timings)
+    else:
+        with open(path, "rb") as f:
+            uploads = [("bench.csv", f.read())]
+        df, index = main._ingest_uploads(uploads, "bench", timings)
+        del uploads
+        candidates, rows = main._prefilter(df, index, STRATEGY, 100), len(df)
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"mode": mode, "rows": rows, "peak_rss_mb": round(peak_mb), "seconds": round(time.perf_counter() - started, 1),
+                      "candidates": len(candidates)}))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] in ("stream", "memory"):
+        run(sys.argv[1], sys.argv[2])
+        sys.exit()
+    sizes = [int(a) for a in sys.argv[1:]] or [100_000, 300_000, 1_000_000]
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in sizes:
+            path = os.path.join(tmp, f"leads-{rows}.csv")
+            write_csv(path, rows)
+            print(f"# {rows} rows, {os.path.getsize(path) / 2**20:.0f} MB", flush=True)
+            for mode in ("stream", "memory"):
+                env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/bench-{mode}-{rows}.db", GMI_API_KEY="bench")
+                out = subprocess.run([sys.executable, __file__, mode, path], env=env, capture_output=True, text=True)
+                print([line for line in out.stdout.splitlines() if line.startswith("{")][-1:] or out.stderr[-500:], flush=True)
@@ -0,0 +1,124 @@
+"""Deterministic OpenAI-compatible fake for /v1/chat/completions, for benchmarks.
+
+    cd backend && python benchmarks/fake_llm.py [--port 8765] [--latency 0.2] [--rate-429 0.05] [--malformed 0.02]
+
+then point the app at it with GMI_BASE_URL=http://127.0.0.1:8765/v1. Strategy prompts get
+a fixed strategy; scoring prompts get one object per numbered lead line, scored from a
+hash of the line. 429s and malformed responses are picked by hashing the prompt with
+its attempt number, so a run is reproducible whatever order the calls arrive in.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import re
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+STRATEGY = {
+    "value_flow": "to_me",
+    "implicit_ask": "Seed-stage investors who lead AI infrastructure rounds",
+    "summary_analysis": "Most leverage sits with partners at early-stage funds.",
+    "persona": "Seed Investors",
+    "anchor_domain": "AI infrastructure",
+    "keywords": ["partner", "vc", "capital", "ventures", "angel", "investor"],
+    "boost_words": ["Partner", "Principal", "General Partner"],
+    "company_words": ["Capital", "Ventures", "Partners"],
+    "negative_words": ["Intern", "Student", "Freelance", "Assistant"],
+    "rubric": "Tier1(9-10): fund partners, Tier2(7-8): principals, Tier3(5-6): angels, Tier4(0-4): others",
+    "priority_signals": ["partner at", "venture capital", "general partner"],
+}
+
+_LEAD_LINE = re.compile(r"^(\d+)\. (.*)$", re.M)
+
+
+def _fraction(*parts):
+    """Stable value in [0, 1) for the given parts."""
+    digest = hashlib.sha1("\x1f".join(map(str, parts)).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+
+def _estimate_tokens(text):
+    return -(-len(text) // 4)
+
+
+def create_app(latency=0.2, token_ms=0.5, rate_429=0.0, malformed=0.0, seed=0):
+    """latency: seconds per call; token_ms: extra milliseconds per completion token;
+    rate_429 / malformed: share of calls answered with a 429 / with broken JSON."""
+    app = FastAPI()
+    attempts = {}  # prompt digest -> calls seen
+    counters = {"calls": 0, "rate_limited": 0, "malformed": 0, "leads": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    @app.get("/stats")
+    async def stats():
+        return counters
+
+    @app.post("/v1/chat/completions")
+    async def chat(request: Request):
+        body = await request.json()
+        prompt = "\n".join(m.get("content") or "" for m in body["messages"])
+        key = hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+        attempt = attempts[key] = attempts.get(key, 0) + 1
+        counters["calls"] += 1
+        if _fraction(seed, key, attempt, "429") < rate_429:
+            counters["rate_limited"] += 1
+            return JSONResponse({"error": {"message": "rate limited", "type": "rate_limit"}},
+                                status_code=429, headers={"retry-after": "0.05"})
+
+        if "LEADS TO SCORE:" in prompt:
+            leads = _LEAD_LINE.findall(prompt.split("LEADS TO SCORE:", 1)[1])
+            counters["leads"] += len(leads)
+            content = json.dumps([
+                {"id": int(i), "score": round(10 * _fraction(seed, line), 1),
+                 "symmetric_value": f"Intro value for {line[:40]}", "reasoning": "Deterministic benchmark score"}
+                for i, line in leads
+            ])
+        else:
+            content = json.dumps(STRATEGY)
+        if _fraction(seed, key, attempt, "malformed") < malformed:
+            counters["malformed"] += 1
+            content = "Here are the scores:\n" + content[: len(content) * 2 // 3]
+
+        prompt_tokens, completion_tokens = _estimate_tokens(prompt), _estimate_tokens(content)
+        counters["prompt_tokens"] += prompt_tokens
+        counters["completion_tokens"] += completion_tokens
+        await asyncio.sleep(latency + completion_tokens * token_ms / 1000)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        envelope = {"id": key[:12], "created": int(time.time()), "model": body.get("model", "fake")}
+
+        if not body.get("stream"):
+            return {**envelope, "object": "chat.completion", "usage": usage, "choices": [
+                {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}
+            ]}
+
+        def events():
+            chunk = {**envelope, "object": "chat.completion.chunk"}
+            for i in range(0, len(content), 64):
+                delta = {"index": 0, "delta": {"content": content[i:i + 64]}, "finish_reason": None}
+                yield f"data: {json.dumps({**chunk, 'choices': [delta]})}\n\n"
+            yield f"data: {json.dumps({**chunk, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})}\n\n"
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield f"data: {json.dumps({**chunk, 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--token-ms", type=float, default=0.5)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--malformed", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    app = create_app(args.latency, args.token_ms, args.rate_429, args.malformed, args.seed)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,81 @@
+"""Synthetic LinkedIn / HubSpot / Salesforce contact exports for benchmarks.
+
+write_export(path, fmt, rows, seed) writes a CSV laid out like the real export (LinkedIn's
+notes preamble included) in blocks, so 500k-row files never sit in memory. Output is
+deterministic per (fmt, rows, seed); about 1 row in 20 repeats an earlier person.
+"""
+import csv
+import random
+
+TITLES = ["General Partner", "Partner", "Principal", "Managing Director", "Software Engineer", "VP Sales",
+          "Head of Growth", "Founder & CEO", "Account Executive", "Investor Relations", "Angel Investor", "Associate"]
+SENIORITY = ["", "Senior ", "Lead ", "Chief ", "Associate "]
+SUFFIXES = ["Ventures", "Capital", "Partners", "Labs", "Inc", "LLP", "Group", "Technologies"]
+INDUSTRIES = ["Venture Capital & Private Equity", "Software Development", "Legal Services", "Banking",
+              "Investment Management", "Marketing Services", ""]
+FIRST_NAMES = ["Ada", "Ben", "Chloe", "Dev", "Elena", "Farid", "Grace", "Hiro", "Ines", "Jonas", "Kemi", "Liam",
+               "Maya", "Nikhil", "Olga", "Pablo", "Quinn", "Rosa", "Sami", "Tara", "Umar", "Vera", "Wei", "Yara"]
+LAST_NAMES = ["Anders", "Brooks", "Chen", "Diaz", "Evans", "Fischer", "Garcia", "Haddad", "Ito", "Jensen", "Kim",
+              "Lopez", "Moreau", "Novak", "Okafor", "Patel", "Rossi", "Schmidt", "Tanaka", "Usman", "Weber", "Zhou"]
+CITIES = ["San Francisco", "New York", "London", "Berlin", "Paris", "Toronto", "Singapore", "Austin"]
+
+LINKEDIN_PREAMBLE = [
+    "Notes:",
+    '"When exporting your connection data, you may notice that some of the email addresses are missing."',
+    "",
+]
+
+FORMATS = {
+    "linkedin": ["First Name", "Last Name", "URL", "Email Address", "Company", "Position", "Connected On"],
+    "hubspot": ["Record ID", "First Name", "Last Name", "Email", "Job Title", "Company Name", "Industry", "City"],
+    "salesforce": ["Contact ID", "Salutation", "First Name", "Last Name", "Title", "Account Name", "Email",
+                   "Mailing City", "Lead Source"],
+}
+
+
+def _person(rnd, i, n):
+    first, last = rnd.choice(FIRST_NAMES), f"{rnd.choice(LAST_NAMES)}{i % 997}"
+    return {
+        "first": first,
+        "last": last,
+        "slug": f"{first}-{last}-{i}".lower(),
+        "email": f"{first}.{last}{i}@example.com".lower() if rnd.random() < 0.4 else "",
+        "company": f"Co{rnd.randint(0, max(n // 5, 1))} {rnd.choice(SUFFIXES)}",
+        "title": rnd.choice(SENIORITY) + rnd.choice(TITLES),
+        "industry": rnd.choice(INDUSTRIES),
+        "city": rnd.choice(CITIES),
+        "connected": f"{rnd.randint(1, 28):02d} {rnd.choice(['Jan', 'Mar', 'Jun', 'Sep', 'Nov'])} {rnd.randint(2012, 2025)}",
+    }
+
+
+def _row(fmt, p, i):
+    if fmt == "linkedin":
+        return [p["first"], p["last"], f"https://www.linkedin.com/in/{p['slug']}", p["email"], p["company"],
+                p["title"], p["connected"]]
+    if fmt == "hubspot":
+        return [100000 + i, p["first"], p["last"], p["email"], p["title"], p["company"], p["industry"], p["city"]]
+    return [f"003{i:012d}", "", p["first"], p["last"], p["title"], p["company"], p["email"], p["city"], "LinkedIn"]
+
+
+def write_export(path, fmt, rows, seed=0, block=50_000):
+    """Write a `rows`-row export in `fmt` ("linkedin", "hubspot" or "salesforce") to path."""
+    rnd = random.Random(f"{fmt}:{seed}")
+    recent = []  # a window of earlier people, for the repeats
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if fmt == "linkedin":
+            f.write("\n".join(LINKEDIN_PREAMBLE) + "\n")
+        writer = csv.writer(f)
+        writer.writerow(FORMATS[fmt])
+        for start in range(0, rows, block):
+            out = []
+            for i in range(start, min(rows, start + block)):
+                if recent and rnd.random() < 0.05:
+                    p = rnd.choice(recent)
+                else:
+                    p = _person(rnd, i, rows)
+                    if len(recent) < 1000:
+                        recent.append(p)
+                    else:
+                        recent[rnd.randrange(1000)] = p
+                out.append(_row(fmt, p, i))
+            writer.writerows(out)
@@ -0,0 +1,148 @@
+import collections
+import functools
+
+
+def flatten_header(text):
+    """Header text with separators removed ("First_Name" -> "firstname"), for exact matching."""
+    return text.replace(" ", "").replace("-", "").replace("_", "")
+
+
+class SubstringAutomaton:
+    """Aho-Corasick automaton: every (pattern, value) whose pattern occurs in a text,
+    found in one pass over the text."""
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for pattern, value in patterns:
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                node = nxt
+            self._out[node] += (value,)
+        # Breadth-first: a node's failure link is the longest proper suffix that is also a
+        # trie path, and it inherits that node's matches
+        queue = collections.deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def search(self, text):
+        """Values of every pattern occurring in text (with repeats)."""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        found = []
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.extend(out[node])
+        return found
+
+
+class ColumnMatcher:
+    """Header-cell -> canonical column matching, compiled once from a variants table
+    {canonical: [lowercase variants]}.
+
+    A cell (stripped, lowercased) matches a canonical *exactly* when it equals one of its
+    variants ignoring spaces, "-" and "_" — one hash lookup. It matches *loosely* when a
+    variant of at least `min_variant` chars occurs in it, or it (at least `min_cell` chars)
+    occurs in such a variant — the automaton covers the first, an index of every variant
+    substring the second. Per-cell matches and whole-header rename maps are memoized
+    (LRU), since the same export layouts come back over and over.
+    """
+
+    def __init__(self, variants, min_variant=4, min_cell=3, cell_cache=4096, header_cache=1024):
+        self.min_cell = min_cell
+        self._rank = {canonical: i for i, canonical in enumerate(variants)}
+        exact = collections.defaultdict(set)
+        contained = collections.defaultdict(set)
+        long_variants = []
+        for canonical, names in variants.items():
+            for v in names:
+                exact[flatten_header(v)].add(canonical)
+                if len(v) >= min_variant:
+                    long_variants.append((v, canonical))
+                    for i in range(len(v)):
+                        for j in range(i + min_cell, len(v) + 1):
+                            contained[v[i:j]].add(canonical)
+        self._exact = {flat: self._ordered(c) for flat, c in exact.items()}
+        self._contained = {text: self._ordered(c) for text, c in contained.items()}
+        self._automaton = SubstringAutomaton(long_variants)
+        self.cell_matches = functools.lru_cache(maxsize=cell_cache)(self._cell_matches)
+        self._rename = functools.lru_cache(maxsize=header_cache)(self._build_rename)
+
+    def _ordered(self, canonicals):
+        return tuple(sorted(canonicals, key=self._rank.__getitem__))
+
+    def _cell_matches(self, cell):
+        """(exact canonicals, loose canonicals) for a stripped, lowercased header cell,
+        each in variants-table order."""
+        exact = self._exact.get(flatten_header(cell), ())
+        if len(cell) < self.min_cell:
+            return exact, ()
+        loose = set(self._automaton.search(cell))
+        loose.update(self._contained.get(cell, ()))
+        return exact, self._ordered(loose)
+
+    def match_count(self, cells):
+        """How many distinct canonicals the cells match, exactly or loosely."""
+        seen = set()
+        for cell in cells:
+            cell = cell.strip().lower()
+            if cell:
+                exact, loose = self.cell_matches(cell)
+                seen.update(exact)
+                seen.update(loose)
+        return len(seen)
+
+    def rename(self, columns):
+        """{original column: canonical}, each canonical used at most once: exact matches
+        are assigned first over all columns, then loose matches for what is left."""
+        return dict(self._rename(tuple(columns)))
+
+    def _build_rename(self, columns):
+        used = set()
+        rename = {}
+        for col in columns:
+            cell = col.strip().lower()
+            if not cell:
+                continue
+            for canonical in self.cell_matches(cell)[0]:
+                if canonical not in used:
+                    rename[col] = canonical
+                    used.add(canonical)
+        for col in columns:
+            if col in rename:
+                continue
+            cell = col.strip().lower()
+            if not cell:
+                continue
+            for canonical in self.cell_matches(cell)[1]:
+                if canonical not in used:
+                    rename[col] = canonical
+                    used.add(canonical)
+        return rename
+
+    def stats(self):
+        cells, headers = self.cell_matches.cache_info(), self._rename.cache_info()
+        return {
+            "cell_cache_hits": cells.hits,
+            "cell_cache_misses": cells.misses,
+            "header_cache_hits": headers.hits,
+            "header_cache_misses": headers.misses,
+        }
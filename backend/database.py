@@ -1,14 +1,130 @@
+import asyncio
+import contextlib
+import functools
+import io
 import os
-from sqlalchemy import create_engine, Column, Integer, String, DateTime
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, event, Column, Integer, String, DateTime, Float, Text
 from sqlalchemy.orm import sessionmaker, declarative_base
 import datetime
 
 # By default, creates a local SQLite file. On Railway, we'll give it a Postgres URL.
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./pipelineom_global.db")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {})
+# Connection pool: sized explicitly, connections checked before use and recycled
+# before server-side idle timeouts can kill them
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=float(os.getenv("DB_POOL_TIMEOUT_S", "30")),
+    pool_recycle=int(os.getenv("DB_POOL_RECYCLE_S", "1800")),
+    pool_pre_ping=True,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+class _FairLock:
+    """FIFO lock: a release hands ownership straight to the longest waiter."""
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._waiters = deque()
+        self._held = False
+
+    def __enter__(self):
+        with self._mutex:
+            if not self._held and not self._waiters:
+                self._held = True
+                return self
+            turn = threading.Event()
+            self._waiters.append(turn)
+        turn.wait()
+        return self
+
+    def __exit__(self, *exc):
+        with self._mutex:
+            if self._waiters:
+                self._waiters.popleft().set()
+            else:
+                self._held = False
+
+
+_sqlite_write_lock = _FairLock()
+
+
+@contextlib.contextmanager
+def write_transaction():
+    """Wrap one write transaction. SQLite allows a single writer and its busy-retry lets a
+    long bulk insert starve small writes, so there writers queue here in FIFO order.
+    No-op on other databases."""
+    if engine.dialect.name != "sqlite":
+        yield
+        return
+    with _sqlite_write_lock:
+        yield
+
+
+@contextlib.contextmanager
+def write_session():
+    """A new Session inside write_transaction(): committed when the block exits cleanly,
+    rolled back if it raises, always closed."""
+    db = SessionLocal()
+    try:
+        with write_transaction():
+            yield db
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record):
+        # WAL: readers don't block the writer; wait for the write lock instead of failing fast
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA busy_timeout=30000")
+        cursor.close()
+
+# Blocking DB work from async endpoints runs here — one worker per pooled connection,
+# so a slow commit never stalls the event loop and never waits on the pool
+_db_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE + DB_MAX_OVERFLOW, thread_name_prefix="db")
+
+
+async def run_db(fn, *args, **kwargs):
+    """Run a blocking DB function on the DB executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, functools.partial(fn, *args, **kwargs))
+
+
+class DBSession:
+    """A Session whose blocking work is done on the DB executor: `await db.run(fn, ...)`
+    calls fn(session, ...) there. The session is only ever used by one call at a time."""
+
+    def __init__(self, session):
+        self.session = session
+
+    async def run(self, fn, *args, **kwargs):
+        return await run_db(fn, self.session, *args, **kwargs)
+
+
+async def get_db():
+    """FastAPI dependency: a DBSession, closed (off the event loop) after the request."""
+    session = SessionLocal()
+    try:
+        yield DBSession(session)
+    finally:
+        await run_db(session.close)
+
 Base = declarative_base()
 
 class GlobalLead(Base):
@@ -39,5 +155,160 @@ class SiteEmail(Base):
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
 
+class LeadScoreCache(Base):
+    """LLM score per (lead profile, strategy, model, prompt version), keyed by content hash."""
+    __tablename__ = "lead_score_cache"
+
+    key = Column(String(64), primary_key=True)
+    score = Column(Float, nullable=False)
+    reasoning = Column(Text, nullable=True)
+    symmetric_value = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    last_used_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+
+class AnalysisSession(Base):
+    """One /analyze run, fingerprinted by a hash of its uploads + goal + funnel so an
+    identical resubmission can reuse it. `result` is the JSON response once done."""
+    __tablename__ = "analysis_sessions"
+
+    session_id = Column(String(36), primary_key=True)
+    request_hash = Column(String(64), nullable=False, index=True)
+    idea = Column(Text, nullable=True)
+    status = Column(String(16), nullable=False, default="running")  # running -> done | error
+    result = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class SessionLead(Base):
+    """Every scored lead of a finished session, best first — what reports are built from."""
+    __tablename__ = "session_leads"
+
+    session_id = Column(String(36), primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    name = Column(String, nullable=True)
+    role = Column(String, nullable=True)
+    company = Column(String, nullable=True)
+    score = Column(Float, nullable=False)
+    symmetric_value = Column(Text, nullable=True)
+    reasoning = Column(Text, nullable=True)
+
+
+class OutboxEmail(Base):
+    """A queued outgoing email; the outbox sender delivers it with retries."""
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    to = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    html = Column(Text, nullable=False)
+    attachments = Column(Text, nullable=True)  # JSON [{"filename", "content": base64}]
+    session_id = Column(String, nullable=True, index=True)
+    status = Column(String(16), nullable=False, default="queued")  # queued -> sending -> sent | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+
+class RequestProfile(Base):
+    """A profiled /analyze run: folded CPU stacks (flamegraph input) and its wall-clock
+    spans as Chrome trace JSON, keyed by session_id."""
+    __tablename__ = "request_profiles"
+
+    session_id = Column(String(36), primary_key=True)
+    duration = Column(Float, nullable=True)
+    folded = Column(Text, nullable=False)
+    trace = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+
+# Columns written by bulk_insert_leads, in tuple order
+LEAD_INSERT_COLUMNS = ("session_id", "first_name", "last_name", "url", "company", "position", "connected_on")
+
+
+def bulk_insert_leads(rows, chunk_size=5000):
+    """Insert global_leads rows without building ORM objects. Blocking — run off the event loop.
+
+    rows: iterable of tuples in LEAD_INSERT_COLUMNS order, consumed in chunks. Uses
+    COPY FROM STDIN on Postgres and chunked executemany elsewhere. On Postgres and other
+    servers the whole upload is one transaction; on SQLite each chunk commits on its own,
+    so a failure part-way keeps the chunks already written.
+    """
+    created_at = datetime.datetime.utcnow()
+    if engine.dialect.name == "postgresql":
+        return _copy_leads(rows, created_at, chunk_size)
+
+    # SQLite has a single database-wide writer lock: commit per chunk so other writers
+    # (e.g. /subscribe) get in between chunks instead of waiting out the whole upload
+    per_chunk = engine.dialect.name == "sqlite"
+    table = GlobalLead.__table__
+    count = 0
+    with engine.connect() as conn:
+        if per_chunk:
+            for chunk in _chunks(rows, chunk_size):
+                values = [dict(zip(LEAD_INSERT_COLUMNS, row), created_at=created_at) for row in chunk]
+                with write_transaction():
+                    conn.execute(table.insert(), values)
+                    conn.commit()
+                count += len(chunk)
+        else:
+            for chunk in _chunks(rows, chunk_size):
+                conn.execute(
+                    table.insert(),
+                    [dict(zip(LEAD_INSERT_COLUMNS, row), created_at=created_at) for row in chunk],
+                )
+                count += len(chunk)
+            conn.commit()
+    return count
+
+
+def _copy_leads(rows, created_at, chunk_size):
+    columns = ", ".join(LEAD_INSERT_COLUMNS + ("created_at",))
+    sql = f"COPY {GlobalLead.__tablename__} ({columns}) FROM STDIN WITH (FORMAT csv)"
+    stamp = created_at.isoformat(sep=" ", timespec="microseconds")
+    count = 0
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        for chunk in _chunks(rows, chunk_size):
+            cursor.copy_expert(sql, _copy_csv(chunk, stamp))
+            count += len(chunk)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return count
+
+
+def _copy_csv(chunk, stamp):
+    """COPY ... (FORMAT csv) input for rows + the created_at stamp. Every value is quoted,
+    so "" stays an empty string; None is left unquoted and empty, which COPY reads as NULL."""
+    buf = io.StringIO()
+    for row in chunk:
+        buf.write(",".join(
+            "" if value is None else '"' + str(value).replace('"', '""') + '"' for value in row + (stamp,)
+        ))
+        buf.write("\n")
+    buf.seek(0)
+    return buf
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
 # Create the tables
 Base.metadata.create_all(bind=engine)
\ No newline at end of file
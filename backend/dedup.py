@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+
+
+# Trailing company-name tokens that don't identify the company
+_LEGAL_SUFFIXES = r"(?:\s+(?:inc|llc|ltd|limited|corp|corporation|co|company|gmbh|plc|sa|ag|bv|pty|srl|lp|llp))+$"
+
+
+def _profile_url_key(urls):
+    """'in/<slug>' for LinkedIn profile URLs, '' otherwise. Generic websites are not
+    identities (a HubSpot "Website" column is shared by everyone at the company)."""
+    slug = urls.str.casefold().str.extract(r"linkedin\.com/(?:in|pub)/([^/?#\s]+)", expand=False)
+    return ("in/" + slug.str.rstrip("/")).fillna("")
+
+
+def _email_key(emails):
+    e = emails.str.strip().str.casefold()
+    return e.where(e.str.match(r"^[^@\s]+@[^@\s]+\.[^@\s]+$"), "")
+
+
+def _name_token(values):
+    return values.str.casefold().str.replace(r"[\W_]+", "", regex=True)
+
+
+def _company_core(values):
+    c = values.str.casefold().str.replace(r"[^\w\s]+", " ", regex=True).str.replace(r"\s+", " ", regex=True).str.strip()
+    return c.str.replace(_LEGAL_SUFFIXES, "", regex=True)
+
+
+def _on_distinct(values, normalize):
+    """normalize() applied to the distinct values only, mapped back to every row (object array)."""
+    codes, uniques = pd.factorize(values.astype(str))
+    return normalize(pd.Series(uniques, dtype=object)).to_numpy(dtype=object)[codes]
+
+
+def _compatible(a, b):
+    """First names that may be the same person: equal, or one abbreviates the other (Rob/Robert)."""
+    return a.startswith(b) or b.startswith(a)
+
+
+class LeadDeduper:
+    """Folds duplicate people in materialized lead frames into one row each.
+
+    Two rows are the same person when they share a LinkedIn profile URL, an email, or a
+    blocking key (last name + company without legal suffixes) with compatible first
+    names. Matches are found through hash groups and, for names, neighbours in sorted
+    order within a block — never all pairs. Each group keeps its first row, with empty
+    fields filled from the later ones; "_merged" counts the rows folded into it.
+
+    dedupe() fills the merged rows of the frame it is given in place (no copy of the
+    whole frame) and returns the kept rows. It can be called per chunk: rows matching an
+    earlier call's rows are dropped (those were already emitted, so they are not merged into).
+    """
+
+    def __init__(self):
+        self._seen_urls = set()
+        self._seen_emails = set()
+        self._seen_names = {}  # block key -> set of first-name tokens
+        self.rows_in = 0
+        self.rows_out = 0
+        self.matched = {"url": 0, "email": 0, "name": 0, "earlier": 0}
+
+    def stats(self):
+        return {
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "removed": self.rows_in - self.rows_out,
+            "by_key": dict(self.matched),
+        }
+
+    def dedupe(self, df):
+        n = len(df)
+        self.rows_in += n
+        if n == 0:
+            return df.assign(_merged=0)
+        url = _on_distinct(df["URL"], _profile_url_key)
+        email = _on_distinct(df["Email"], _email_key)
+        first = _on_distinct(df["First Name"], _name_token)
+        last = _on_distinct(df["Last Name"], _name_token)
+        company = _on_distinct(df["Company"], _company_core)
+        has_block = (last != "") & (company != "") & (first != "")
+        block = last + "|" + company
+
+        # Rows already seen in an earlier chunk are dropped outright
+        earlier = (url != "") & pd.Series(url).isin(self._seen_urls).to_numpy()
+        earlier |= (email != "") & pd.Series(email).isin(self._seen_emails).to_numpy()
+        if self._seen_names:
+            for i in np.flatnonzero(has_block & ~earlier & pd.Series(block).isin(self._seen_names.keys()).to_numpy()):
+                if any(_compatible(first[i], seen) for seen in self._seen_names[block[i]]):
+                    earlier[i] = True
+        self.matched["earlier"] += int(earlier.sum())
+
+        parent = list(range(n))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union(i, j, reason):
+            ri, rj = find(i), find(j)
+            if ri != rj:
+                # The earliest row stays the root, so it is the one kept
+                parent[max(ri, rj)] = min(ri, rj)
+                self.matched[reason] += 1
+
+        live = ~earlier
+        for keys, reason in ((url, "url"), (email, "email")):
+            rows = np.flatnonzero(live & (keys != ""))
+            if len(rows) < 2:
+                continue
+            codes, _ = pd.factorize(keys[rows])
+            first_of = pd.Series(rows).groupby(codes).transform("first").to_numpy()
+            for i, j in zip(rows[first_of != rows], first_of[first_of != rows]):
+                union(int(i), int(j), reason)
+
+        rows = np.flatnonzero(live & has_block)
+        if len(rows) > 1:
+            order = rows[np.lexsort((first[rows].astype(str), block[rows].astype(str)))]
+            same_block = block[order[1:]] == block[order[:-1]]
+            for a, b in zip(order[:-1][same_block], order[1:][same_block]):
+                if _compatible(first[a], first[b]):
+                    union(int(a), int(b), "name")
+
+        root = np.fromiter((find(i) for i in range(n)), dtype=np.int64, count=n)
+        sizes = np.bincount(root, minlength=n)
+        grouped = sizes[root] > 1
+        if grouped.any():
+            cols = [c for c in df.columns if c != "_merged"]
+            merged = (
+                df.iloc[np.flatnonzero(grouped)][cols]
+                .replace("", np.nan)
+                .groupby(root[grouped], sort=False)
+                .first()
+            )
+            reps = merged.index.to_numpy()
+            df.iloc[reps, [df.columns.get_loc(c) for c in merged.columns]] = merged.fillna("").to_numpy()
+        keep = live & (root == np.arange(n))
+        df = df.assign(_merged=sizes - 1).iloc[np.flatnonzero(keep)]
+
+        self._seen_urls.update(url[url != ""])
+        self._seen_emails.update(email[email != ""])
+        for i in np.flatnonzero(has_block):
+            self._seen_names.setdefault(block[i], set()).add(first[i])
+        self.rows_out += len(df)
+        return df
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import time
+
+from logs import get_logger
+
+log = get_logger("jobs")
+
+
+class Job:
+    """One background /analyze run: status, an append-only event log and the final result."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.status = "queued"  # queued -> running -> done | error
+        self.stage = "queued"
+        self.events = []  # (event name, data) in publish order
+        self.partial = []  # latest partial top-N
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.keep_alive = 15  # seconds between SSE comments on a quiet stream
+        self._changed = asyncio.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "error")
+
+    async def publish(self, event, **data):
+        """Record a progress event and wake every stream waiting on this job."""
+        if event in ("stage", "partial"):
+            self.stage = data.get("stage", self.stage)
+        if event == "partial":
+            self.partial = data.get("leads", self.partial)
+        self.events.append((event, data))
+        async with self._changed:
+            self._changed.notify_all()
+
+    def snapshot(self):
+        """Polling view of the job."""
+        snap = {
+            "job_id": self.job_id,
+            "session_id": self.job_id,
+            "status": self.status,
+            "stage": self.stage,
+            "events": len(self.events),
+            "partial": self.partial,
+        }
+        if self.result is not None:
+            snap["result"] = self.result
+        if self.error is not None:
+            snap["error"] = self.error
+        return snap
+
+    async def stream(self, start=0):
+        """Yield Server-Sent Events from event index `start` until the job finishes."""
+        i = start
+        while True:
+            while i < len(self.events):
+                event, data = self.events[i]
+                i += 1
+                yield f"id: {i}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+            if self.finished:
+                return
+            idle = False
+            async with self._changed:
+                if i >= len(self.events) and not self.finished:
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), timeout=self.keep_alive)
+                    except asyncio.TimeoutError:
+                        idle = True
+            # Yield outside the lock: a slow client must never block publish()
+            if idle:
+                yield ": keep-alive\n\n"
+
+
+class JobManager:
+    """In-process worker pool for /analyze jobs: at most `max_concurrent` run at once,
+    the rest wait in submit order. Finished jobs are kept for `ttl` seconds."""
+
+    def __init__(self, max_concurrent=4, ttl=3600):
+        self.max_concurrent = max_concurrent
+        self.ttl = ttl
+        self._jobs = {}
+        self._slots = None  # created lazily on the running loop
+        self._tasks = set()
+
+    def get(self, job_id):
+        self._expire()
+        return self._jobs.get(job_id)
+
+    def stats(self):
+        counts = {"queued": 0, "running": 0, "done": 0, "error": 0}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return counts
+
+    def submit(self, job_id, run):
+        """Start `await run(job)` in the background; returns the Job immediately."""
+        self._expire()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        job = Job(job_id)
+        self._jobs[job_id] = job
+        task = asyncio.create_task(self._run(job, run))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job, run):
+        async with self._slots:
+            job.status = "running"
+            await job.publish("stage", stage="started")
+            try:
+                result = await run(job)
+            except Exception as e:
+                job.error = getattr(e, "detail", None) or str(e)
+                job.status = "error"
+                job.finished_at = time.time()
+                log.error("job failed", job_id=job.job_id, error=job.error)
+                await job.publish("error", detail=job.error)
+            else:
+                job.result = result
+                job.status = "done"
+                job.finished_at = time.time()
+                await job.publish("done", **result)
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [j for j, job in self._jobs.items() if job.finished and job.finished_at < cutoff]:
+            del self._jobs[job_id]
@@ -0,0 +1,137 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+import openai
+
+from logs import get_logger
+from profiling import span
+from retries import backoff_delay
+
+log = get_logger("llm")
+
+
+# Errors worth retrying: provider throttling, timeouts and transient server/network failures
+_RETRYABLE = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    asyncio.TimeoutError,
+)
+
+
+class LLMScheduler:
+    """Process-wide gate for LLM calls.
+
+    - At most `max_in_flight` calls run at once across all requests.
+    - Waiting calls are grouped by request key and served round-robin, so one large
+      /analyze can't starve the others.
+    - Each attempt gets `timeout` seconds; retryable failures are retried up to
+      `max_retries` times with full-jitter exponential backoff. The slot is released
+      while backing off.
+    """
+
+    def __init__(self, max_in_flight=8, timeout=60.0, max_retries=3, base_delay=1.0, max_delay=20.0):
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._in_flight = 0
+        self._queues = OrderedDict()  # request key -> deque of waiter futures
+        self._calls = 0
+        self._retries = 0
+        self._timeouts = 0
+        self._failures = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def queue_depth(self):
+        return sum(len(q) for q in self._queues.values())
+
+    def stats(self):
+        return {
+            "in_flight": self._in_flight,
+            "queue_depth": self.queue_depth(),
+            "queued_requests": len(self._queues),
+            "calls": self._calls,
+            "retries": self._retries,
+            "timeouts": self._timeouts,
+            "failures": self._failures,
+            "avg_wait_s": round(self._wait_total / self._waits, 3) if self._waits else 0.0,
+            "max_wait_s": round(self._wait_max, 3),
+        }
+
+    async def _acquire(self, key):
+        started = time.monotonic()
+        if self._in_flight < self.max_in_flight and not self._queues:
+            self._in_flight += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._queues.setdefault(key, deque()).append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._release()  # the slot was already handed to us
+                else:
+                    queue = self._queues.get(key)
+                    if queue is not None and waiter in queue:
+                        queue.remove(waiter)
+                        if not queue:
+                            del self._queues[key]
+                raise
+        waited = time.monotonic() - started
+        self._waits += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        return waited
+
+    def _release(self):
+        # Hand the slot straight to the next request in round-robin order
+        while self._queues:
+            key, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._in_flight -= 1
+
+    def _backoff(self, attempt, exc):
+        return backoff_delay(attempt, exc, self.base_delay, self.max_delay)
+
+    async def run(self, key, call):
+        """Run `call()` (a zero-arg coroutine factory) under the scheduler for request `key`."""
+        attempt = 0
+        while True:
+            with span("llm.queue"):
+                await self._acquire(key)
+            self._calls += 1
+            try:
+                with span("llm.call"):
+                    return await asyncio.wait_for(call(), self.timeout)
+            except _RETRYABLE as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self._timeouts += 1
+                if attempt >= self.max_retries:
+                    self._failures += 1
+                    raise
+                error = e
+            except Exception:
+                self._failures += 1
+                raise
+            finally:
+                self._release()
+            delay = self._backoff(attempt, error)
+            attempt += 1
+            self._retries += 1
+            log.warning("llm retry", request=key, error=type(error).__name__, attempt=attempt,
+                        max_retries=self.max_retries, delay_s=round(delay, 2))
+            with span("llm.backoff"):
+                await asyncio.sleep(delay)
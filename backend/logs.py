@@ -0,0 +1,81 @@
+import datetime
+import json
+import logging
+import os
+import sys
+
+ROOT = "pipelineom"
+
+
+class _Formatter(logging.Formatter):
+    """One line per event: logfmt-style `key=value` pairs, or a JSON object."""
+
+    def __init__(self, as_json=False):
+        super().__init__()
+        self.as_json = as_json
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name.removeprefix(ROOT + "."),
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        if self.as_json:
+            return json.dumps(entry, default=str, ensure_ascii=False)
+        return " ".join(f"{key}={_logfmt(value)}" for key, value in entry.items())
+
+
+def _logfmt(value):
+    text = value if isinstance(value, str) else json.dumps(value, default=str, ensure_ascii=False)
+    if text and not any(c in text for c in ' "=\n'):
+        return text
+    return json.dumps(text, ensure_ascii=False)
+
+
+class Logger:
+    """Leveled structured logger: `log.info("event", key=value, ...)`. Disabled levels cost
+    one level check; wrap expensive field computations in `if log.enabled("debug"):`."""
+
+    def __init__(self, name):
+        self._logger = logging.getLogger(f"{ROOT}.{name}")
+
+    def enabled(self, level):
+        return self._logger.isEnabledFor(logging.getLevelName(level.upper()))
+
+    def _log(self, level, event, fields, exc_info=False):
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, event, extra={"fields": fields}, exc_info=exc_info)
+
+    def debug(self, event, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event, exc_info=False, **fields):
+        self._log(logging.ERROR, event, fields, exc_info)
+
+
+def get_logger(name):
+    return Logger(name)
+
+
+def configure(level=None, fmt=None):
+    """Send pipelineom.* logs to stderr at LOG_LEVEL (default info), as LOG_FORMAT
+    ("text" logfmt, default, or "json"). Safe to call more than once."""
+    root = logging.getLogger(ROOT)
+    root.setLevel((level or os.getenv("LOG_LEVEL", "info")).upper())
+    handler = next((h for h in root.handlers if getattr(h, "_pipelineom", False)), None)
+    if handler is None:
+        handler = logging.StreamHandler(sys.stderr)
+        handler._pipelineom = True
+        root.addHandler(handler)
+    handler.setFormatter(_Formatter(as_json=(fmt or os.getenv("LOG_FORMAT", "text")).lower() == "json"))
+    root.propagate = False
@@ -1,20 +1,49 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
-from pydantic import BaseModel
+from typing import List, NamedTuple, Optional
+from pydantic import BaseModel, Field, ValidationError, model_validator
 import pandas as pd
 import asyncio
 import os
+import concurrent.futures
+import contextlib
 import datetime
+import hashlib
+import heapq
+import itertools
+import tempfile
+import threading
+import time
 import uuid
-import resend
 import csv
 from io import StringIO
 from sqlalchemy import update
-from services import process_csv, generate_strategy, analyze_leads_batch, _build_lead_profile
-from database import SessionLocal, GlobalLead, SiteEmail
+from services import process_csv, iter_csv_chunks, compact_leads, generate_strategy, analyze_leads_batch, quick_score_frame, build_lead_index, relevance_scores, top_k_positions, lead_profiles, llm_scheduler, strategy_cache, strategy_fingerprint, lead_score_key, plan_batches, batch_planner
+from score_cache import score_cache
+from session_store import request_hash, session_store
+from jobs import JobManager
+from outbox import email_outbox
+from dedup import LeadDeduper
+from database import GlobalLead, SiteEmail, DBSession, bulk_insert_leads, get_db, run_db, write_transaction
+from logs import configure as configure_logging, get_logger
+from metrics import ANALYZE_REQUESTS, ROWS, STAGE_SECONDS, registry
+from profiling import profiler, span
 
-app = FastAPI(title="OM API")
+configure_logging()
+log = get_logger("analyze")
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Deliver emails queued before a restart, then stop cleanly on shutdown
+    email_outbox.start()
+    try:
+        yield
+    finally:
+        await email_outbox.stop()
+
+
+app = FastAPI(title="OM API", lifespan=lifespan)
 @app.get("/")
 async def health_check():
     return {"status": "online", "message": "OM API is awake and ready."}
@@ -34,95 +63,104 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Email Setup
-resend.api_key = os.getenv("RESEND_API_KEY")
-
 class EmailRequest(BaseModel):
     email: str
 
 class ReportRequest(BaseModel):
     email: str
-    leads: List[dict]
-    query: str
-    persona: str
-    summary_analysis: str = ""
-    session_id: str = ""
+    session_id: str
+
+
+REPORT_MAX_LEADS = int(os.getenv("REPORT_MAX_LEADS", "500"))
+
+def _save_site_email(db, email, source, session_id=""):
+    """Record a captured email; for report unlocks also tag the session's leads with it."""
+    with write_transaction():
+        try:
+            if session_id:
+                stmt = update(GlobalLead).where(GlobalLead.session_id == session_id).values(owner_email=email)
+                db.execute(stmt)
+            db.add(SiteEmail(email=email, source=source))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
 
 @app.post("/subscribe")
-async def subscribe(data: EmailRequest):
+async def subscribe(data: EmailRequest, db: DBSession = Depends(get_db)):
     email = data.email.strip()
     if not email or "@" not in email:
         raise HTTPException(status_code=400, detail="Valid email required")
-    print(f"💰 NEW LEAD (subscribe): {email}")
-    db = SessionLocal()
+    log.info("site email captured", source="subscribe", email=email)
     try:
-        db.add(SiteEmail(email=email, source="subscribe"))
-        db.commit()
+        await db.run(_save_site_email, email, "subscribe")
     except Exception as e:
-        print(f"Subscribe DB Error: {e}")
-    finally:
-        db.close()
+        log.error("subscribe db error", error=str(e))
     return {"status": "success"}
 
+def _report_csv(session_id, limit):
+    """CSV of the session's stored leads, best first, written as rows are fetched.
+    Returns (csv text, lead count, top lead name)."""
+    csv_buffer = StringIO()
+    writer = csv.writer(csv_buffer)
+    writer.writerow(["Name", "Role", "Company", "Utility Score", "Symmetric Value", "Reasoning"])
+    count = 0
+    top_lead = ""
+    for row in session_store.iter_leads(session_id, limit):
+        if count == 0:
+            top_lead = row[0]
+        writer.writerow(row)
+        count += 1
+    return csv_buffer.getvalue(), count, top_lead
+
+
 @app.post("/send-report")
-async def send_report(data: ReportRequest):
+async def send_report(data: ReportRequest, db: DBSession = Depends(get_db)):
     email = (data.email or "").strip()
     if not email or "@" not in email:
         raise HTTPException(status_code=400, detail="Valid email required")
 
-    db = SessionLocal()
+    # The report comes from the leads stored for the session, never from the client
+    session = await run_db(session_store.get, data.session_id) if data.session_id else None
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown session")
+    status, idea, result, _ = session
+    if status != "done":
+        raise HTTPException(status_code=409, detail="Analysis is not finished yet")
+
     try:
-        if data.session_id:
-            stmt = update(GlobalLead).where(GlobalLead.session_id == data.session_id).values(owner_email=email)
-            db.execute(stmt)
-        db.add(SiteEmail(email=email, source="report_unlock"))
-        db.commit()
+        await db.run(_save_site_email, email, "report_unlock", data.session_id)
     except Exception as e:
-        print(f"Send-report DB Error: {e}")
-    finally:
-        db.close()
+        log.error("send-report db error", error=str(e))
+    strategy = (result or {}).get("strategy") or {}
+    query = idea or "Network Analysis"
+    summary_analysis = strategy.get("summary_analysis") or strategy.get("summary") or "Analysis complete."
 
     try:
         # 1. Short attachment filename
         date_str = datetime.datetime.now().strftime("%Y%m%d")
         filename = f"OM_Report_{date_str}.csv"
 
-        # 2. Generate CSV in Memory
-        csv_buffer = StringIO()
-        writer = csv.writer(csv_buffer)
-        writer.writerow(["Name", "Role", "Company", "Utility Score", "Symmetric Value", "Reasoning"])
-        for lead in data.leads:
-            writer.writerow([
-                lead.get("name", ""),
-                lead.get("role", ""),
-                lead.get("company", ""),
-                lead.get("score", ""),
-                lead.get("symmetric_value", ""),
-                lead.get("reasoning", "")
-            ])
-        csv_content = csv_buffer.getvalue()
-        
+        # 2. Generate CSV from storage
+        csv_content, lead_count, top_lead = await run_db(_report_csv, data.session_id, REPORT_MAX_LEADS)
+
         # 3. Contextual Email Body
-        top_lead = data.leads[0]['name'] if data.leads else "high-value matches"
-        
-        params = {
-"from": "OM <no-reply@leads.pipelineom.com>",
-            "to": [data.email],
-            "subject": "Your OM report",
-            "html": f"""
+        top_lead = top_lead or "high-value matches"
+
+        html = f"""
                 <div style="font-family: sans-serif; max-width: 600px; color: #1e293b; line-height: 1.6;">
                     <h2 style="color: #4f46e5;">Your Network Analysis is Ready</h2>
-                    <p>We analyzed your connections to help with your goal: <strong>"{data.query}"</strong></p>
+                    <p>We analyzed your connections to help with your goal: <strong>"{query}"</strong></p>
                     
                     <div style="background: #f8fafc; padding: 20px; border-left: 4px solid #4f46e5; margin: 20px 0;">
                         <p style="margin: 0; font-weight: 600; color: #475569; text-transform: uppercase; font-size: 12px; letter-spacing: 0.05em;">Overview</p>
-                        <p style="margin: 5px 0 0 0; color: #334155;">{data.summary_analysis}</p>
+                        <p style="margin: 5px 0 0 0; color: #334155;">{summary_analysis}</p>
                     </div>
                     
                     <h3>Proposed Next Steps:</h3>
                     <ul style="padding-left: 20px;">
                         <li><strong>High Priority:</strong> Reach out to <strong>{top_lead}</strong>. Based on their authority and industry presence, they are a primary decision-maker for your goal.</li>
-                        <li><strong>Leverage the List:</strong> The attached CSV contains 20 leads filtered by hiring authority and budget stability.</li>
+                        <li><strong>Leverage the List:</strong> The attached CSV contains {lead_count} leads filtered by hiring authority and budget stability.</li>
                         <li><strong>Refine Your Pitch:</strong> Focus on the specific value points mentioned in the "Reasoning" column of the report.</li>
                     </ul>
                     
@@ -132,160 +170,683 @@ async def send_report(data: ReportRequest):
                     <hr style="border: none; border-top: 1px solid #e2e8f0; margin: 20px 0;" />
                     <p style="font-size: 11px; color: #94a3b8; text-align: center;">Powered by OM — Built for the Autonomous Enterprise</p>
                 </div>
-            """,
-            "attachments": [
-                {
-                    "filename": filename, 
-                    "content": list(csv_content.encode("utf-8"))
-                }
-            ]
-        }
-        resend.Emails.send(params)
-        return {"status": "success"}
+            """
+
+        # 4. Queue it — the outbox sender delivers (with retries) in the background
+        email_id = await run_db(
+            email_outbox.enqueue, email, "Your OM report", html,
+            [(filename, csv_content.encode("utf-8"))], data.session_id,
+        )
+        email_outbox.wake()
+        return {"status": "queued", "email_id": email_id}
     except Exception as e:
-        print(f"Email Error: {e}")
+        log.error("report email error", session_id=data.session_id, error=str(e))
         return {"status": "error", "detail": str(e)}
 
-MAX_TOTAL_UPLOAD_MB = 10  # Total file size limit across all uploaded files
+MAX_TOTAL_UPLOAD_MB = 10  # Uploads up to this total are parsed in memory
+STREAM_MAX_UPLOAD_MB = int(os.getenv("STREAM_MAX_UPLOAD_MB", "1024"))  # larger ones stream from disk, up to this
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "50000"))
+STREAM_MAX_BUFFERED_CHUNKS = 4  # chunks held while waiting for the strategy before ingest blocks on it
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None  # default: system temp dir
 
-@app.post("/analyze")
-async def analyze(idea: str = Form(...), files: List[UploadFile] = File(...)):
+
+class SpooledUpload(NamedTuple):
+    """An upload too large for memory, copied to a temp file for streaming ingest."""
+    filename: str
+    path: str
+    lines: int
+    sha256: str
+
+
+class Funnel(BaseModel):
+    """How many leads survive each /analyze stage.
+
+    prefilter_k rows (by keyword score, then BM25) are looked up in the score cache; at
+    most llm_k uncached ones, best first, go to the LLM; the top_n scored leads with
+    score >= min_score are returned.
+    """
+    prefilter_k: int = Field(int(os.getenv("ANALYZE_CANDIDATES", "100")), ge=1, le=2000)
+    llm_k: int = Field(int(os.getenv("ANALYZE_LLM_K", "100")), ge=0, le=500)
+    top_n: int = Field(int(os.getenv("ANALYZE_TOP_N", "25")), ge=1, le=200)
+    min_score: float = Field(0.0, ge=0, le=10)
+
+    @model_validator(mode="after")
+    def _llm_within_prefilter(self):
+        self.llm_k = min(self.llm_k, self.prefilter_k)
+        return self
+
+
+def _funnel(prefilter_k=None, llm_k=None, top_n=None, min_score=None):
+    """Funnel from optional form fields (unset ones keep their defaults); 422 if out of range."""
+    fields = {"prefilter_k": prefilter_k, "llm_k": llm_k, "top_n": top_n, "min_score": min_score}
+    try:
+        return Funnel(**{k: v for k, v in fields.items() if v is not None})
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+
+def _parse_uploads(uploads):
+    """Parse every (filename, bytes) upload and stack them into one frame, one row per person."""
+    dfs = []
+    for filename, contents in uploads:
+        try:
+            dfs.append(process_csv(contents))
+        except Exception as csv_err:
+            raise HTTPException(status_code=400, detail=f"Could not parse CSV '{filename}': {str(csv_err)}")
+
+    if not dfs:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+
+    # Every frame has exactly the canonical columns, so stacking adds no gaps to fill
+    files = len(dfs)
+    df = dfs[0] if files == 1 else pd.concat(dfs, ignore_index=True)
+    del dfs
+    ROWS.inc(len(df), stage="parsed")
+    log.info("uploads parsed", files=files, rows=len(df), columns=len(df.columns))
+
+    if df.empty:
+        raise HTTPException(status_code=400, detail="Empty CSV")
+    deduper = LeadDeduper()
+    df = deduper.dedupe(df).reset_index(drop=True)
+    ROWS.inc(len(df), stage="deduped")
+    log.info("dedup", **deduper.stats())
+    return compact_leads(df)
+
+
+def _persist_leads(df, session_id):
+    """Save all rows to global_leads (errors are logged, not raised)."""
+    try:
+        rows = zip(
+            itertools.repeat(session_id), df["First Name"], df["Last Name"], df["URL"].astype(str),
+            df["Company"], df["Position"], df["Connected On"].astype(str),
+        )
+        ROWS.inc(bulk_insert_leads(rows), stage="persisted")
+    except Exception as e:
+        log.error("lead insert failed", session_id=session_id, error=str(e))
+
+
+def _ingest_uploads(uploads, session_id, timings):
+    """Parse + persist + index; runs in a worker thread while the strategy call is in flight."""
+    t0 = time.perf_counter()
+    with span("parse"):
+        df = _parse_uploads(uploads)
+    t1 = time.perf_counter()
+    with span("persist"):
+        _persist_leads(df, session_id)
+    t2 = time.perf_counter()
+    with span("index"):
+        index = build_lead_index(df)
+    timings["parse"] = t1 - t0
+    timings["persist"] = t2 - t1
+    timings["index"] = time.perf_counter() - t2
+    return df, index
+
+
+def _prefilter(df, index, strategy, k):
+    """Keyword pre-score + BM25 relevance for every row; the top k candidates, best first
+    (ties keep upload order)."""
+    df['quick_score'] = quick_score_frame(df, strategy)
+    df['relevance'] = relevance_scores(index, df, strategy)
+    return df.iloc[top_k_positions(df['quick_score'].to_numpy(), df['relevance'].to_numpy(), k)]
+
+
+async def _timed(coro, timings, stage):
+    started = time.perf_counter()
+    try:
+        with span(stage):
+            return await coro
+    finally:
+        timings[stage] = time.perf_counter() - started
+
+
+async def _read_uploads(files):
+    """Read every uploaded file into memory, enforcing the total size limit. Uploads over
+    MAX_TOTAL_UPLOAD_MB in total (up to STREAM_MAX_UPLOAD_MB) are spooled to temp files
+    instead and returned as SpooledUpload."""
+    declared = sum(file.size or 0 for file in files)
+    if declared > MAX_TOTAL_UPLOAD_MB * 1024 * 1024:
+        if declared > STREAM_MAX_UPLOAD_MB * 1024 * 1024:
+            raise HTTPException(status_code=413, detail=f"Total upload exceeds {STREAM_MAX_UPLOAD_MB}MB limit.")
+        uploads = []
+        try:
+            for file in files:
+                uploads.append(await asyncio.to_thread(_spool_upload, file))
+        except BaseException:
+            _discard_uploads(uploads)
+            raise
+        return uploads
+
+    uploads = []
+    total_bytes = 0
+    for file in files:
+        contents = await file.read()
+        total_bytes += len(contents)
+        if total_bytes > MAX_TOTAL_UPLOAD_MB * 1024 * 1024:
+            raise HTTPException(status_code=413, detail=f"Total upload exceeds {MAX_TOTAL_UPLOAD_MB}MB limit.")
+        uploads.append((getattr(file, 'filename', 'file'), contents))
+    return uploads
+
+
+def _spool_upload(file):
+    """Copy an upload to a temp file in 1MB blocks, counting lines and hashing on the way."""
+    file.file.seek(0)
+    lines = 0
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(prefix="upload-", suffix=".csv", dir=UPLOAD_SPOOL_DIR, delete=False) as out:
+        for block in iter(lambda: file.file.read(1024 * 1024), b""):
+            out.write(block)
+            lines += block.count(b"\n")
+            digest.update(block)
+    return SpooledUpload(getattr(file, 'filename', 'file'), out.name, lines, digest.hexdigest())
+
+
+def _discard_uploads(uploads):
+    for upload in uploads:
+        if isinstance(upload, SpooledUpload):
+            try:
+                os.unlink(upload.path)
+            except OSError:
+                pass
+
+
+def _upload_digests(uploads):
+    return [
+        u.sha256 if isinstance(u, SpooledUpload) else hashlib.sha256(u[1]).hexdigest()
+        for u in uploads
+    ]
+
+
+# Sessions running in this process, by request hash: (session_id, asyncio.Future of the result)
+_in_flight = {}
+SESSION_POLL_S = 1.0
+
+
+async def _stored_result(result):
+    return result
+
+
+async def _wait_for_session(session_id, created_at):
+    """Result of a session running in another worker, polled from analysis_sessions until
+    session_store.wait_deadline() of its start."""
+    remaining = (session_store.wait_deadline(created_at) - datetime.datetime.utcnow()).total_seconds()
+    deadline = time.monotonic() + remaining
+    while time.monotonic() < deadline:
+        await asyncio.sleep(SESSION_POLL_S)
+        status, _, result, error = await run_db(session_store.get, session_id) or ("error", "", None, "Session vanished")
+        if status == "done":
+            return result
+        if status == "error":
+            raise HTTPException(status_code=500, detail=error)
+    raise HTTPException(status_code=504, detail="An identical analysis is still running")
+
+
+async def _find_existing(fingerprint):
+    """(session_id, factory) for an identical request within the dedup window — in flight
+    here, finished, or running in another worker; `await factory()` gives its result.
+    None if there is no such session."""
+    if not session_store.enabled:
+        return None
+    for attempt in range(2):
+        entry = _in_flight.get(fingerprint)
+        if entry is not None:
+            session_id, pending = entry
+            session_store.record_attach()
+            return session_id, lambda: asyncio.shield(pending)
+        if attempt:
+            return None
+        found = await run_db(session_store.find, fingerprint)
+        if found is not None:
+            session_id, status, result, created_at = found
+            if status == "done":
+                return session_id, lambda: _stored_result(result)
+            return session_id, lambda: _wait_for_session(session_id, created_at)
+        # Re-check after the lookup: an identical request may have started meanwhile
+
+
+def _claim(fingerprint, session_id):
+    """Register session_id as the in-flight run for fingerprint. Call with no await since
+    _find_existing() returned None, so identical requests attach instead of racing."""
+    pending = asyncio.get_running_loop().create_future()
+    _in_flight[fingerprint] = (session_id, pending)
+    return pending
+
+
+async def _run_claimed(fingerprint, session_id, idea, pending, run, profiled=False):
+    """`await run()` for a claimed session: recorded in analysis_sessions, and its outcome
+    handed to every request that attached to it. With `profiled`, the run is profiled
+    and the profile stored under session_id."""
+    await run_db(session_store.start, session_id, fingerprint, idea)
+    profile = profiler.start(session_id) if profiled else None
     try:
-        # 1. Process Files (with size limit)
-        dfs = []
-        total_bytes = 0
-        for file in files:
-            contents = await file.read()
-            total_bytes += len(contents)
-            if total_bytes > MAX_TOTAL_UPLOAD_MB * 1024 * 1024:
-                raise HTTPException(status_code=413, detail=f"Total upload exceeds {MAX_TOTAL_UPLOAD_MB}MB limit.")
+        result = await run()
+    except asyncio.CancelledError:
+        pending.cancel()
+        # Not left "running": an identical retry must start afresh, not wait on this row
+        await asyncio.shield(run_db(session_store.fail, session_id, "cancelled"))
+        raise
+    except Exception as e:
+        ANALYZE_REQUESTS.inc(outcome="error")
+        pending.set_exception(e)
+        pending.exception()  # mark retrieved when nobody attached
+        await run_db(session_store.fail, session_id, getattr(e, "detail", None) or e)
+        raise
+    else:
+        ANALYZE_REQUESTS.inc(outcome="ok")
+        await run_db(session_store.finish, session_id, result)
+        pending.set_result(result)
+        return result
+    finally:
+        if _in_flight.get(fingerprint, (None,))[0] == session_id:
+            del _in_flight[fingerprint]
+        if profile is not None:
+            profile.stop()
+            await run_db(profiler.save, profile)
+            log.info("request profiled", session_id=session_id, seconds=round(profile.duration, 3),
+                     samples=profile.samples, idle_samples=profile.idle_samples, spans=len(profile.spans))
+
+
+async def _prepare(idea, files, funnel):
+    """Read the uploads and fingerprint the request: (uploads, fingerprint, existing) where
+    existing is _find_existing()'s match (the uploads are then already discarded)."""
+    uploads = await _read_uploads(files)
+    try:
+        digests = await asyncio.to_thread(_upload_digests, uploads)
+        fingerprint = request_hash(idea, funnel.model_dump(), digests)
+        existing = await _find_existing(fingerprint)
+    except BaseException:
+        _discard_uploads(uploads)
+        raise
+    if existing is not None:
+        _discard_uploads(uploads)
+        ANALYZE_REQUESTS.inc(outcome="reused")
+        log.info("identical request reused", session_id=existing[0], **session_store.stats())
+    return uploads, fingerprint, existing
+
+
+def _merge_top_k(pool, chunk, index, strategy, k):
+    """Prefilter one chunk and merge it into the running top-k pool (pool rows came first,
+    so ties keep upload order)."""
+    chunk['quick_score'] = quick_score_frame(chunk, strategy)
+    chunk['relevance'] = relevance_scores(index, chunk, strategy)
+    chunk = chunk.iloc[top_k_positions(chunk['quick_score'].to_numpy(), chunk['relevance'].to_numpy(), k)]
+    if pool is not None:
+        chunk = pd.concat([pool, chunk], ignore_index=True).fillna("")
+    return chunk.iloc[top_k_positions(chunk['quick_score'].to_numpy(), chunk['relevance'].to_numpy(), k)].reset_index(drop=True)
+
+
+def _stream_ingest(uploads, session_id, strategy_ready, k, stop, timings):
+    """Ingest SpooledUploads chunk by chunk: dedupe and persist every chunk, and once `strategy_ready`
+    (a concurrent Future) resolves, prefilter it into a running top-k. Only the pool and a
+    few chunks are ever in memory. Returns (candidates best first, total rows)."""
+    pool, waiting, rows = None, [], 0
+    deduper = LeadDeduper()
+    reference = None  # first chunk's BM25 index; later chunks are scored with its statistics
+    parse_s = persist_s = prefilter_s = 0.0
+
+    def drain():
+        nonlocal pool, waiting, prefilter_s
+        t = time.perf_counter()
+        strategy = strategy_ready.result()
+        for waiting_chunk, index in waiting:
+            pool = _merge_top_k(pool, waiting_chunk, index, strategy, k)
+        waiting = []
+        prefilter_s += time.perf_counter() - t
+
+    for upload in uploads:
+        filename = upload.filename
+        chunks = iter_csv_chunks(upload.path, STREAM_CHUNK_ROWS)
+        while not stop.is_set():
+            t = time.perf_counter()
             try:
-                dfs.append(process_csv(contents))
+                with span("parse"):
+                    chunk = next(chunks, None)
             except Exception as csv_err:
-                raise HTTPException(status_code=400, detail=f"Could not parse CSV '{getattr(file, 'filename', 'file')}': {str(csv_err)}")
-        
-        if not dfs:
-            raise HTTPException(status_code=400, detail="No files uploaded")
-            
-        df = pd.concat(dfs, ignore_index=True)
-        df = df.fillna("")
-        print(f"[analyze] total rows: {len(df)}, columns: {list(df.columns)}")
-
-        if df.empty:
-            raise HTTPException(status_code=400, detail="Empty CSV")
-
-        # --- DB: Save all rows ---
-        session_id = str(uuid.uuid4())
-        db = SessionLocal()
+                raise HTTPException(status_code=400, detail=f"Could not parse CSV '{filename}': {str(csv_err)}")
+            parse_s += time.perf_counter() - t
+            if chunk is None:
+                break
+            chunk = deduper.dedupe(chunk)
+            rows += len(chunk)
+            t = time.perf_counter()
+            with span("persist"):
+                _persist_leads(chunk, session_id)
+            persist_s += time.perf_counter() - t
+            t = time.perf_counter()
+            index = build_lead_index(chunk, reference)
+            if reference is None:
+                reference = index
+            prefilter_s += time.perf_counter() - t
+            waiting.append((chunk, index))
+            if strategy_ready.done() or len(waiting) >= STREAM_MAX_BUFFERED_CHUNKS:
+                drain()
+    if stop.is_set():
+        raise asyncio.CancelledError()
+    if rows == 0:
+        raise HTTPException(status_code=400, detail="Empty CSV")
+    drain()
+    ROWS.inc(deduper.rows_in, stage="parsed")
+    ROWS.inc(deduper.rows_out, stage="deduped")
+    log.info("uploads streamed", files=len(uploads), rows=rows, **deduper.stats())
+    timings["parse"] = parse_s
+    timings["persist"] = persist_s
+    timings["prefilter"] = prefilter_s
+    return pool, rows
+
+
+def _rank_results(candidate_profiles, enrichments, funnel, limit=None):
+    """Result rows for the candidates scored so far with score >= min_score, best first
+    (equal scores keep prefilter order), at most `limit`. Also returns how many were scored."""
+    results = []
+    for profile, enrichment in zip(candidate_profiles, enrichments):
+        if enrichment is None:
+            continue
         try:
-            records = []
-            for _, row in df.iterrows():
-                p = _build_lead_profile(row)
-                records.append(GlobalLead(
-                    session_id=session_id,
-                    first_name=p.get("First Name", ""),
-                    last_name=p.get("Last Name", ""),
-                    url=str(row.get("URL", "")),
-                    company=p.get("Company", ""),
-                    position=p.get("Position", ""),
-                    connected_on=str(row.get("Connected On", "")),
-                ))
-            db.add_all(records)
-            db.commit()
-        except Exception as e:
-            print(f"DB Insert Error: {e}")
-        finally:
-            db.close()
-
-        # 1. Strategy — AI generates keywords + rubric for the user's goal
-        row_count = len(df)
-        strategy = await generate_strategy(idea, row_count)
-
-        keywords = [k.lower() for k in strategy.get("keywords", []) if isinstance(k, str)]
-        boost_words = [b.lower() for b in strategy.get("boost_words", []) if isinstance(b, str)]
-        company_words = [c.lower() for c in strategy.get("company_words", []) if isinstance(c, str)]
-        negative_words = [n.lower() for n in strategy.get("negative_words", ["intern", "student"]) if isinstance(n, str)]
-        priority_signals = [s.lower() for s in strategy.get("priority_signals", []) if isinstance(s, str)]
-
-        # 2. Keyword scan — score every row, take top 200 candidates
-        def quick_score(row):
-            profile = _build_lead_profile(row)
-            pos = profile.get("Position", "").lower()
-            comp = profile.get("Company", "").lower()
-            text = f"{pos} {comp}"
-            score = 0
-            score += sum(1 for w in keywords if w in text)
-            score += sum(2 for w in boost_words if w in pos)
-            score += sum(2 for w in company_words if w in comp)
-            score += sum(1 for w in priority_signals if w in text)
-            for w in negative_words:
-                if w in pos:
-                    score -= 5
-            return score
-
-        df['quick_score'] = df.apply(quick_score, axis=1)
-        candidates_df = df.sort_values(by='quick_score', ascending=False).head(200)
-        print(f"[analyze] {len(df)} rows → top 200 candidates, top quick_scores: {candidates_df['quick_score'].head(5).tolist()}")
-
-        # 3. AI enrichment — batch-score all 200 in parallel
-        candidate_rows = [row for _, row in candidates_df.iterrows()]
-        batch_size = 10
-        batches = [candidate_rows[i:i+batch_size] for i in range(0, len(candidate_rows), batch_size)]
-
-        if batches:
-            sample = [_build_lead_profile(r) for r in batches[0][:3]]
-            print(f"[analyze] sample profiles: {sample}")
-
-        batch_tasks = [analyze_leads_batch(batch, strategy, idea) for batch in batches]
-        batch_results = await asyncio.gather(*batch_tasks)
-
-        # 4. Merge AI scores back to candidates → return top 25
-        results = []
-        for batch_idx, batch_enrichments in enumerate(batch_results):
-            batch = batches[batch_idx]
-            enrichment_map = {}
-            for i, r in enumerate(batch_enrichments):
-                try:
-                    rid = int(r.get("id", i + 1))
-                except (ValueError, TypeError):
-                    rid = i + 1
-                enrichment_map[rid] = r
-
-            for i, row in enumerate(batch):
-                enrichment = enrichment_map.get(i + 1, None)
-                if enrichment is None and i < len(batch_enrichments):
-                    enrichment = batch_enrichments[i]
-                if enrichment is None:
-                    enrichment = {"score": 0, "reasoning": "", "symmetric_value": ""}
-                try:
-                    ai_score = float(enrichment.get("score", 0))
-                except (ValueError, TypeError):
-                    ai_score = 0.0
-                profile = _build_lead_profile(row)
-                results.append({
-                    "name": f"{profile.get('First Name', '')} {profile.get('Last Name', '')}".strip(),
-                    "company": profile.get('Company', ''),
-                    "role": profile.get('Position', ''),
-                    "score": ai_score,
-                    "reasoning": enrichment.get('reasoning', ''),
-                    "symmetric_value": enrichment.get('symmetric_value', ''),
-                })
-
-        final = sorted(results, key=lambda x: x['score'], reverse=True)[:25]
-        print(f"[analyze] scored {len(results)}, returning top {len(final)}, scores: {[r['score'] for r in final[:5]]}")
-
-        return {
-            "session_id": session_id,
-            "strategy": strategy,
-            "data": final,
-        }
+            ai_score = float(enrichment.get("score", 0))
+        except (ValueError, TypeError):
+            ai_score = 0.0
+        results.append({
+            "name": f"{profile.get('First Name', '')} {profile.get('Last Name', '')}".strip(),
+            "company": profile.get('Company', ''),
+            "role": profile.get('Position', ''),
+            "score": ai_score,
+            "reasoning": enrichment.get('reasoning', ''),
+            "symmetric_value": enrichment.get('symmetric_value', ''),
+        })
+    eligible = (r for r in results if r['score'] >= funnel.min_score)
+    if limit is None:
+        return sorted(eligible, key=lambda x: x['score'], reverse=True), len(results)
+    return heapq.nlargest(limit, eligible, key=lambda x: x['score']), len(results)
+
+
+def _match_enrichments(results, n):
+    """(enrichment or None, matched by id) for each lead of an n-lead batch. Results are
+    matched by their 1-based "id"; only a response with no usable ids at all falls back
+    to matching by position."""
+    by_id = {}
+    for r in results:
+        try:
+            rid = int(r.get("id"))
+        except (ValueError, TypeError, AttributeError):
+            continue
+        if 1 <= rid <= n:
+            by_id.setdefault(rid, r)
+    if by_id:
+        return [(by_id.get(i + 1), True) for i in range(n)]
+    return [(results[i] if i < len(results) else None, False) for i in range(n)]
+
 
+def _resolve(future, task):
+    """Mirror a finished asyncio task onto a concurrent Future (for worker threads)."""
+    if task.cancelled():
+        future.cancel()
+    elif task.exception() is not None:
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
+
+
+async def _no_progress(event, **data):
+    pass
+
+
+async def _run_analysis(idea, uploads, session_id, funnel, progress=_no_progress, timings=None):
+    """The /analyze pipeline, cut down per stage by `funnel`. `progress(event, **data)` is
+    awaited at each stage and after every scored batch (with the current top_n) —
+    background jobs stream these. Stage durations (seconds) are recorded into `timings`."""
+    started = time.perf_counter()
+    timings = {} if timings is None else timings
+
+    # 1. Strategy — AI generates keywords + rubric for the user's goal. It only needs
+    # the goal and a row count, so start it now (line count as the estimate) and
+    # parse + persist in a worker thread while it is in flight.
+    # Spooled (over-limit) uploads stream instead: each chunk is persisted and prefiltered
+    # into a running top-K as it is parsed, so the full frame never exists.
+    await progress("stage", stage="ingest")
+    streaming = any(isinstance(u, SpooledUpload) for u in uploads)
+    if streaming:
+        row_estimate = sum(u.lines for u in uploads)
+    else:
+        row_estimate = sum(contents.count(b"\n") for _, contents in uploads)
+    strategy_task = asyncio.create_task(
+        _timed(generate_strategy(idea, row_estimate, request_key=session_id), timings, "strategy")
+    )
+    try:
+        if streaming:
+            strategy_ready = concurrent.futures.Future()
+            strategy_task.add_done_callback(lambda task: _resolve(strategy_ready, task))
+            stop = threading.Event()
+            try:
+                with span("ingest"):
+                    candidates_df, rows = await asyncio.to_thread(
+                        _stream_ingest, uploads, session_id, strategy_ready, funnel.prefilter_k, stop, timings
+                    )
+            finally:
+                stop.set()
+        else:
+            with span("ingest"):
+                df, index = await asyncio.to_thread(_ingest_uploads, uploads, session_id, timings)
+            rows = len(df)
+    except BaseException:
+        strategy_task.cancel()
+        raise
+    finally:
+        _discard_uploads(uploads)
+    del uploads
+    await progress("stage", stage="strategy", rows=rows)
+    strategy = await strategy_task
+    timings["ingest+strategy"] = time.perf_counter() - started
+    log.debug("strategy cache", **strategy_cache.stats())
+    await progress("strategy", strategy=strategy)
+
+    # 2. Keyword scan + BM25 tiebreak — score every row, take the top candidates
+    if not streaming:
+        t = time.perf_counter()
+        with span("prefilter"):
+            candidates_df = await asyncio.to_thread(_prefilter, df, index, strategy, funnel.prefilter_k)
+        del df, index
+        timings["prefilter"] = time.perf_counter() - t
+    ROWS.inc(len(candidates_df), stage="candidates")
+    log.info("prefiltered", session_id=session_id, rows=rows, candidates=len(candidates_df),
+             top_quick_scores=candidates_df['quick_score'].head(5).tolist())
+
+    # 3. AI enrichment — reuse cached lead scores, batch-score the rest in parallel
+    candidate_profiles = lead_profiles(candidates_df)
+    fingerprint = strategy_fingerprint(strategy, idea)
+    cache_keys = [lead_score_key(p, fingerprint) for p in candidate_profiles]
+    with span("score_cache.get"):
+        cached = await run_db(score_cache.get_many, cache_keys)
+    enrichments = [cached.get(k) for k in cache_keys]
+    uncached = [i for i, e in enumerate(enrichments) if e is None]
+    pending = uncached[:funnel.llm_k]
+
+    plan = plan_batches([candidate_profiles[i] for i in pending], strategy, idea)
+    batches = [[pending[pos] for pos in positions] for positions in plan]
+    log.info("scoring planned", session_id=session_id, cache_hits=len(candidate_profiles) - len(uncached),
+             to_score=len(pending), batches=len(batches), over_llm_k=len(uncached) - len(pending))
+    # Duplicates folded into leads we score would otherwise have been scored again
+    folded = int(candidates_df['_merged'].to_numpy()[pending].sum()) if pending else 0
+    if folded:
+        per_batch = len(pending) / len(batches)
+        log.info("dedup saved llm work", folded_rows=folded, batches_saved=round(folded / per_batch, 1))
+
+    if batches and log.enabled("debug"):
+        log.debug("sample profiles", profiles=[candidate_profiles[i] for i in batches[0][:3]])
+
+    async def score_batch(batch_idx):
+        batch = batches[batch_idx]
+        with span("llm.batch"):
+            result = await analyze_leads_batch(
+                [candidate_profiles[i] for i in batch], strategy, idea, request_key=session_id
+            )
+        return batch_idx, result
+
+    await progress("stage", stage="scoring", candidates=len(candidate_profiles), cached=len(candidate_profiles) - len(uncached), batches=len(batches))
+    t = time.perf_counter()
+    fresh = {}
+    completed = 0
+    # 4. Merge AI scores back to candidates as each batch lands → return top_n
+    for next_batch in asyncio.as_completed([score_batch(i) for i in range(len(batches))]):
+        batch_idx, batch_enrichments = await next_batch
+        batch = batches[batch_idx]
+        for candidate_idx, (enrichment, by_id) in zip(batch, _match_enrichments(batch_enrichments, len(batch))):
+            if enrichment is None:
+                enrichment = {"score": 0, "reasoning": "", "symmetric_value": ""}
+            elif by_id and not enrichment.get("failed"):
+                # Only id-matched scores are cached — a positional guess may belong to another lead
+                fresh[cache_keys[candidate_idx]] = enrichment
+            enrichments[candidate_idx] = enrichment
+
+        completed += 1
+        if progress is not _no_progress:
+            partial, scored = _rank_results(candidate_profiles, enrichments, funnel, limit=funnel.top_n)
+            await progress("partial", stage="scoring", batches_done=completed, batches=len(batches), scored=scored, leads=partial)
+    timings["llm"] = time.perf_counter() - t
+    log.debug("llm scheduler", **llm_scheduler.stats())
+    log.debug("batch planner", **batch_planner.stats())
+
+    t = time.perf_counter()
+    if fresh:
+        with span("score_cache.put"):
+            await run_db(score_cache.put_many, fresh)
+
+    # Every eligible lead is kept server-side for the report; the response carries top_n
+    ranked, scored = _rank_results(candidate_profiles, enrichments, funnel)
+    with span("save_leads"):
+        await run_db(session_store.save_leads, session_id, ranked)
+    final = ranked[:funnel.top_n]
+    ROWS.inc(scored, stage="scored")
+    log.info("leads ranked", session_id=session_id, scored=scored, stored=len(ranked), returned=len(final),
+             top_scores=[r['score'] for r in final[:5]])
+    timings["merge"] = time.perf_counter() - t
+    timings["total"] = time.perf_counter() - started
+    for stage, seconds in timings.items():
+        STAGE_SECONDS.observe(seconds, stage=stage)
+    log.info("analyze timing", session_id=session_id, **{k: round(v, 3) for k, v in timings.items()})
+
+    return {
+        "session_id": session_id,
+        "strategy": strategy,
+        "funnel": funnel.model_dump(),
+        "data": final,
+    }
+
+
+@app.post("/analyze")
+async def analyze(
+    request: Request,
+    idea: str = Form(...),
+    files: List[UploadFile] = File(...),
+    prefilter_k: Optional[int] = Form(None),
+    llm_k: Optional[int] = Form(None),
+    top_n: Optional[int] = Form(None),
+    min_score: Optional[float] = Form(None),
+):
+    funnel = _funnel(prefilter_k, llm_k, top_n, min_score)
+    try:
+        uploads, fingerprint, existing = await _prepare(idea, files, funnel)
+        if existing is not None:
+            return await existing[1]()
+        session_id = str(uuid.uuid4())
+        pending = _claim(fingerprint, session_id)
+        return await _run_claimed(fingerprint, session_id, idea, pending, lambda: _run_analysis(idea, uploads, session_id, funnel),
+                                  profiled=profiler.wanted(request))
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Analyze error: {e}")
+        log.error("analyze failed", exc_info=True, error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
+
+# --- Background job mode: submit returns at once; progress via polling or SSE ---
+analysis_jobs = JobManager(
+    max_concurrent=int(os.getenv("ANALYZE_MAX_CONCURRENT_JOBS", "4")),
+    ttl=float(os.getenv("ANALYZE_JOB_TTL_S", "3600")),
+)
+
+
+@app.post("/analyze/jobs", status_code=202)
+async def submit_analyze_job(
+    request: Request,
+    idea: str = Form(...),
+    files: List[UploadFile] = File(...),
+    prefilter_k: Optional[int] = Form(None),
+    llm_k: Optional[int] = Form(None),
+    top_n: Optional[int] = Form(None),
+    min_score: Optional[float] = Form(None),
+):
+    funnel = _funnel(prefilter_k, llm_k, top_n, min_score)
+    uploads, fingerprint, existing = await _prepare(idea, files, funnel)
+    if existing is not None:
+        # Attach to the identical request's job, or replay its result as a finished job
+        session_id, result = existing
+        job = analysis_jobs.get(session_id) or analysis_jobs.submit(session_id, lambda job: result())
+        return {"job_id": job.job_id, "session_id": session_id, "status": job.status, "reused": True}
+    session_id = str(uuid.uuid4())
+    pending = _claim(fingerprint, session_id)
+    profiled = profiler.wanted(request)
+    job = analysis_jobs.submit(session_id, lambda job: _run_claimed(
+        fingerprint, session_id, idea, pending, lambda: _run_analysis(idea, uploads, session_id, funnel, progress=job.publish),
+        profiled=profiled,
+    ))
+    return {"job_id": job.job_id, "session_id": session_id, "status": job.status, "reused": False}
+
+
+@app.get("/analyze/jobs/{job_id}")
+async def get_analyze_job(job_id: str):
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job.snapshot()
+
+
+@app.get("/analyze/jobs/{job_id}/events")
+async def stream_analyze_job(job_id: str, request: Request):
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    try:
+        start = int(request.headers.get("last-event-id", 0))
+    except ValueError:
+        start = 0
+    return StreamingResponse(
+        job.stream(start),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# --- Profiles of /analyze runs (admin only) ---
+PROFILE_FORMATS = {
+    "folded": ("text/plain", "folded"),   # collapsed stacks: flamegraph.pl, inferno, speedscope
+    "trace": ("application/json", "json"),  # wall-clock spans: chrome://tracing, Perfetto
+}
+
+
+@app.get("/analyze/profiles/{session_id}")
+async def download_profile(session_id: str, request: Request, format: str = "folded"):
+    if not profiler.is_admin(request):
+        raise HTTPException(status_code=403, detail="Admin token required")
+    if format not in PROFILE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(PROFILE_FORMATS)}")
+    stored = await run_db(profiler.load, session_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="No profile for this session")
+    media_type, extension = PROFILE_FORMATS[format]
+    return PlainTextResponse(
+        stored[0] if format == "folded" else stored[1],
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="profile-{session_id}.{extension}"'},
+    )
+
+# --- Metrics: Prometheus text format; gauges are read from live state at scrape time ---
+registry.gauge("pipelineom_llm_in_flight", "LLM calls currently running.", lambda: llm_scheduler.stats()["in_flight"])
+registry.gauge("pipelineom_llm_queue_depth", "LLM calls waiting for a slot.", lambda: llm_scheduler.stats()["queue_depth"])
+registry.gauge("pipelineom_analyze_jobs", "Background /analyze jobs by status.", lambda: analysis_jobs.stats(), ["status"])
+registry.gauge("pipelineom_email_in_flight", "Outbox deliveries in progress.", lambda: email_outbox.stats()["in_flight"])
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
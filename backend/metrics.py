@@ -0,0 +1,183 @@
+import bisect
+import math
+import threading
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"expected labels {labelnames}, got {sorted(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set (Prometheus semantics)."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label key -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[i] += 1
+            state[-1] += value
+
+    def count(self, **labels):
+        state = self._values.get(_label_key(self.labelnames, labels))
+        return sum(state[:-1]) if state else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        for key, state in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), state[:-1]):
+                cumulative += n
+                yield self.name + "_bucket", _format_labels(self.labelnames, key, [("le", _format_value(float(bound)))]), cumulative
+            yield self.name + "_sum", _format_labels(self.labelnames, key), state[-1]
+            yield self.name + "_count", _format_labels(self.labelnames, key), cumulative
+
+
+class Gauge:
+    """Current value per label set, read from `fn()` at scrape time: a number, or a dict
+    {label value: number} when the gauge has one label."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, fn, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._fn = fn
+
+    def samples(self):
+        value = self._fn()
+        if isinstance(value, dict):
+            for label, v in sorted(value.items()):
+                yield self.name, _format_labels(self.labelnames, (str(label),)), v
+        else:
+            yield self.name, "", value
+
+
+class Registry:
+    """Named metrics, rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _add(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), **kwargs):
+        return self._add(Histogram(name, help, labelnames, **kwargs))
+
+    def gauge(self, name, help, fn, labelnames=()):
+        return self._add(Gauge(name, help, fn, labelnames))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                for name, labels, value in metric.samples():
+                    lines.append(f"{name}{labels} {_format_value(value)}")
+            except Exception:
+                pass  # a failing gauge callback drops its samples, not the scrape
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    "pipelineom_stage_seconds", "Duration of pipeline stages (per /analyze run; llm_batch per LLM call; email_send per delivery).",
+    ["stage"],
+)
+ROWS = registry.counter(
+    "pipelineom_rows_total", "Lead rows through each pipeline stage (parsed, deduped, persisted, candidates, scored).",
+    ["stage"],
+)
+LLM_TOKENS = registry.counter(
+    "pipelineom_llm_tokens_total", "LLM tokens by direction (prompt, cached_prompt, completion) and call kind.",
+    ["kind", "direction"],
+)
+LLM_CALLS = registry.counter(
+    "pipelineom_llm_calls_total", "LLM calls by kind (strategy, batch) and outcome (ok, truncated, error).",
+    ["kind", "outcome"],
+)
+BATCH_FAILURES = registry.counter(
+    "pipelineom_llm_batch_failures_total", "Scoring batches that failed after retries (their leads score 0).",
+)
+CACHE_REQUESTS = registry.counter(
+    "pipelineom_cache_requests_total", "Cache lookups by cache (score, strategy, session) and result (hit, miss, coalesced).",
+    ["cache", "result"],
+)
+CACHE_WRITES = registry.counter(
+    "pipelineom_cache_writes_total", "Cache entries written by cache (score) and op (stored, evicted).",
+    ["cache", "op"],
+)
+ANALYZE_REQUESTS = registry.counter(
+    "pipelineom_analyze_requests_total", "/analyze runs by outcome (ok, error, reused).",
+    ["outcome"],
+)
+EMAILS = registry.counter(
+    "pipelineom_emails_total", "Outbox deliveries by outcome (sent, retry, failed).",
+    ["outcome"],
+)
@@ -0,0 +1,235 @@
+import asyncio
+import base64
+import datetime
+import json
+import os
+import time
+
+import resend
+from sqlalchemy import insert, select, update
+
+from database import SessionLocal, OutboxEmail, run_db, write_session
+from logs import get_logger
+from metrics import EMAILS, STAGE_SECONDS
+from retries import backoff_delay
+
+log = get_logger("outbox")
+
+
+# Provider status codes that fail the same way on every retry (bad request, auth, validation)
+_PERMANENT_CODES = {400, 401, 403, 404, 422}
+
+
+def _is_permanent(exc):
+    try:
+        return int(getattr(exc, "code", None)) in _PERMANENT_CODES
+    except (TypeError, ValueError):
+        return False
+
+
+class ResendProvider:
+    """Delivers through the Resend API. RESEND_API_URL points the SDK at another
+    server (e.g. a local fake provider)."""
+
+    def __init__(self, api_key=None):
+        resend.api_key = api_key
+
+    def send(self, params):
+        return resend.Emails.send(params)
+
+
+class EmailOutbox:
+    """Durable email queue (email_outbox table) drained by a background sender.
+
+    enqueue() only writes a row. The sender claims due rows in batches, delivers at
+    most `max_concurrent` at once through `provider.send(params)` (blocking, run in a
+    worker thread) and retries failures with full-jitter exponential backoff, up to
+    `max_attempts` sends; permanent provider errors (4xx) are not retried. A claimed row
+    is leased for `lease` seconds, so rows a crashed worker left "sending" go out again.
+    """
+
+    def __init__(self, provider, sender, max_concurrent=4, max_attempts=6, base_delay=5.0, max_delay=600.0,
+                 lease=120.0, poll_interval=5.0, batch_size=20):
+        self.provider = provider
+        self.sender = sender
+        self.max_concurrent = max_concurrent
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease = datetime.timedelta(seconds=lease)
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self._task = None
+        self._wakeup = None  # created lazily on the running loop
+        self._active = set()
+        self._queued = 0
+        self._sent = 0
+        self._retries = 0
+        self._failed = 0
+
+    def stats(self):
+        return {
+            "queued": self._queued,
+            "sent": self._sent,
+            "retries": self._retries,
+            "failed": self._failed,
+            "in_flight": len(self._active),
+        }
+
+    def enqueue(self, to, subject, html, attachments=(), session_id=None):
+        """Queue an email; attachments are (filename, bytes). Blocking — returns the row id."""
+        encoded = [
+            {"filename": filename, "content": base64.b64encode(content).decode("ascii")}
+            for filename, content in attachments
+        ]
+        with write_session() as db:
+            email_id = db.execute(insert(OutboxEmail).values(
+                to=to, subject=subject, html=html, attachments=json.dumps(encoded), session_id=session_id,
+                status="queued", attempts=0, next_attempt_at=datetime.datetime.utcnow(),
+                created_at=datetime.datetime.utcnow(),
+            )).inserted_primary_key[0]
+        self._queued += 1
+        return email_id
+
+    def wake(self):
+        """Have the sender look for due rows now (starting it if needed)."""
+        self.start()
+        self._wakeup.set()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop claiming rows and wait for the sends in progress."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._active:
+            await asyncio.gather(*self._active, return_exceptions=True)
+
+    async def drain(self):
+        """Deliver every row that is due, waiting for the sends to finish (retries that
+        back off into the future are left queued)."""
+        while True:
+            rows = await run_db(self._claim, self.max_concurrent)
+            if not rows:
+                break
+            await asyncio.gather(*(self._deliver(row) for row in rows))
+
+    async def _run(self):
+        while True:
+            free = self.max_concurrent - len(self._active)
+            rows = []
+            if free > 0:
+                try:
+                    rows = await run_db(self._claim, min(free, self.batch_size))
+                except Exception as e:
+                    log.error("outbox claim failed", error=str(e))
+            for row in rows:
+                task = asyncio.create_task(self._deliver(row))
+                self._active.add(task)
+                task.add_done_callback(self._on_done)
+            if rows and len(rows) == free:
+                # Slots are full: wait for one to free up
+                await self._wakeup.wait()
+            elif not rows:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+
+    def _on_done(self, task):
+        self._active.discard(task)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _claim(self, limit):
+        """Lease up to `limit` due rows (queued, or "sending" with an expired lease). The
+        conditional update makes each row go to one claimer, even across workers."""
+        now = datetime.datetime.utcnow()
+        due = (OutboxEmail.status.in_(("queued", "sending")), OutboxEmail.next_attempt_at <= now)
+        db = SessionLocal()
+        try:
+            ids = db.execute(
+                select(OutboxEmail.id).where(*due).order_by(OutboxEmail.next_attempt_at).limit(limit)
+            ).scalars().all()
+            db.commit()  # end the read before taking the write lock
+            if not ids:
+                return []
+            claimed = []
+            with write_session() as writer:
+                for email_id in ids:
+                    won = writer.execute(
+                        update(OutboxEmail).where(OutboxEmail.id == email_id, *due)
+                        .values(status="sending", next_attempt_at=now + self.lease, attempts=OutboxEmail.attempts + 1)
+                    ).rowcount
+                    if won:
+                        claimed.append(email_id)
+            rows = db.execute(
+                select(OutboxEmail.id, OutboxEmail.to, OutboxEmail.subject, OutboxEmail.html,
+                       OutboxEmail.attachments, OutboxEmail.attempts)
+                .where(OutboxEmail.id.in_(claimed))
+            ).all()
+            return [row._asdict() for row in rows]
+        finally:
+            db.close()
+
+    def _params(self, row):
+        params = {"from": self.sender, "to": [row["to"]], "subject": row["subject"], "html": row["html"]}
+        attachments = json.loads(row["attachments"] or "[]")
+        if attachments:
+            params["attachments"] = attachments
+        return params
+
+    def _backoff(self, attempts, exc):
+        return backoff_delay(attempts - 1, exc, self.base_delay, self.max_delay)
+
+    async def _deliver(self, row):
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self.provider.send, self._params(row))
+        except Exception as e:
+            final = _is_permanent(e) or row["attempts"] >= self.max_attempts
+            if final:
+                self._failed += 1
+                values = {"status": "failed"}
+                EMAILS.inc(outcome="failed")
+                log.error("email failed", email_id=row["id"], attempts=row["attempts"], error=str(e))
+            else:
+                self._retries += 1
+                delay = self._backoff(row["attempts"], e)
+                values = {"status": "queued", "next_attempt_at": datetime.datetime.utcnow() + datetime.timedelta(seconds=delay)}
+                EMAILS.inc(outcome="retry")
+                log.warning("email retry", email_id=row["id"], error=type(e).__name__, attempt=row["attempts"],
+                            max_attempts=self.max_attempts, delay_s=round(delay, 2))
+            values["last_error"] = str(e)[:2000]
+        else:
+            self._sent += 1
+            EMAILS.inc(outcome="sent")
+            values = {"status": "sent", "sent_at": datetime.datetime.utcnow(), "last_error": None}
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="email_send")
+        await run_db(self._update, row["id"], values)
+
+    def _update(self, email_id, values):
+        try:
+            with write_session() as db:
+                db.execute(update(OutboxEmail).where(OutboxEmail.id == email_id).values(**values))
+        except Exception as e:
+            log.error("outbox write failed", email_id=email_id, error=str(e))
+
+
+email_outbox = EmailOutbox(
+    ResendProvider(os.getenv("RESEND_API_KEY")),
+    sender=os.getenv("EMAIL_FROM", "OM <no-reply@leads.pipelineom.com>"),
+    max_concurrent=int(os.getenv("EMAIL_MAX_CONCURRENT", "4")),
+    max_attempts=int(os.getenv("EMAIL_MAX_ATTEMPTS", "6")),
+    base_delay=float(os.getenv("EMAIL_RETRY_BASE_S", "5")),
+    max_delay=float(os.getenv("EMAIL_RETRY_MAX_S", "600")),
+)
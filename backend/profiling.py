@@ -0,0 +1,200 @@
+import collections
+import contextlib
+import contextvars
+import datetime
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+from sqlalchemy import delete, select
+
+from database import SessionLocal, RequestProfile, write_session
+from logs import get_logger
+
+log = get_logger("profiling")
+
+_current = contextvars.ContextVar("pipelineom_profile", default=None)
+_NO_SPAN = contextlib.nullcontext()
+
+# Leaf frames of threads that are parked, not running: the event loop's selector, idle
+# executor workers, Event/Condition waits. Their samples count as idle, not CPU.
+_IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+}
+
+
+def span(name):
+    """Context manager recording a wall-clock span on the current request's profile.
+    Use around await points (`with span("llm.call"): await ...`) or blocking work in a
+    worker thread. Without an active profile it is a shared no-op."""
+    profile = _current.get()
+    if profile is None:
+        return _NO_SPAN
+    return profile.span(name)
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+class Profile:
+    """One request's profile: a sampling thread that records the stack of every other
+    thread each `interval` seconds (folded, for flamegraphs), plus the wall-clock spans
+    recorded through span(). Samples cover the whole process, so requests running at the
+    same time show up too — the spans are what is specific to this request."""
+
+    def __init__(self, session_id, interval=0.005, max_seconds=600):
+        self.session_id = session_id
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self.spans = []  # (name, thread name, start offset s, duration s)
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name=f"profiler-{session_id[:8]}", daemon=True)
+        self._token = None
+
+    def start(self):
+        self._token = _current.set(self)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+        self.duration = time.perf_counter() - self.started
+
+    @contextlib.contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.spans.append((name, threading.current_thread().name, start - self.started, end - start))
+
+    def _sample(self):
+        deadline = self.started + self.max_seconds
+        while not self._stop.wait(self.interval) and time.perf_counter() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, str(ident))
+                if ident == self._thread.ident or name.startswith("profiler-"):
+                    continue
+                self.samples += 1
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+                    self.idle_samples += 1
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(name.replace(";", ":"))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def folded(self):
+        """Collapsed stacks, one `thread;outer;...;inner count` line each — the input
+        format of flamegraph.pl, inferno and speedscope."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def trace(self):
+        """The spans as Chrome trace events (chrome://tracing, Perfetto, speedscope)."""
+        threads = {}
+        events = []
+        for name, thread, offset, duration in self.spans:
+            tid = threads.setdefault(thread, len(threads) + 1)
+            events.append({"name": name, "ph": "X", "pid": 1, "tid": tid,
+                           "ts": round(offset * 1e6), "dur": round(duration * 1e6)})
+        events += [{"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": thread}}
+                   for thread, tid in threads.items()]
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"session_id": self.session_id, "duration_s": round(self.duration, 3),
+                              "samples": self.samples, "idle_samples": self.idle_samples,
+                              "interval_s": self.interval}}
+
+
+class Profiler:
+    """Decides which /analyze requests are profiled and keeps their profiles.
+
+    A request is profiled when it carries `X-Profile: 1` (or `?profile=1`) together with
+    an `X-Admin-Token` matching `admin_token`, or at random for `sample_percent`% of runs.
+    With no admin token configured the flag is ignored. Profiles are stored in
+    request_profiles under the session_id; only the newest `keep` are kept. Storage
+    methods are blocking — call them off the event loop.
+    """
+
+    def __init__(self, admin_token="", sample_percent=0.0, interval=0.005, keep=100):
+        self.admin_token = admin_token
+        self.sample_percent = sample_percent
+        self.interval = interval
+        self.keep = keep
+        self._profiled = 0
+        self._saved = 0
+
+    def stats(self):
+        return {"profiled": self._profiled, "saved": self._saved, "sample_percent": self.sample_percent}
+
+    def is_admin(self, request):
+        token = request.headers.get("x-admin-token", "")
+        return bool(self.admin_token) and hmac.compare_digest(token.encode(), self.admin_token.encode())
+
+    def wanted(self, request):
+        """Whether to profile this request (cheap when nothing asks for it)."""
+        flag = request.headers.get("x-profile") or request.query_params.get("profile")
+        if flag and flag not in ("0", "false") and self.is_admin(request):
+            return True
+        return self.sample_percent > 0 and random.random() * 100 < self.sample_percent
+
+    def start(self, session_id):
+        self._profiled += 1
+        return Profile(session_id, self.interval).start()
+
+    def save(self, profile):
+        try:
+            with write_session() as db:
+                db.merge(RequestProfile(
+                    session_id=profile.session_id,
+                    duration=profile.duration,
+                    folded=profile.folded(),
+                    trace=json.dumps(profile.trace()),
+                    created_at=datetime.datetime.utcnow(),
+                ))
+                stale = select(RequestProfile.session_id).order_by(RequestProfile.created_at.desc()).offset(self.keep)
+                db.execute(delete(RequestProfile).where(RequestProfile.session_id.in_(stale.scalar_subquery())))
+            self._saved += 1
+        except Exception as e:
+            log.error("profile save failed", session_id=profile.session_id, error=str(e))
+
+    def load(self, session_id):
+        """(folded, trace JSON) for session_id, or None."""
+        db = SessionLocal()
+        try:
+            row = db.execute(
+                select(RequestProfile.folded, RequestProfile.trace).where(RequestProfile.session_id == session_id)
+            ).first()
+        finally:
+            db.close()
+        return tuple(row) if row else None
+
+
+profiler = Profiler(
+    admin_token=os.getenv("ADMIN_TOKEN", ""),
+    sample_percent=float(os.getenv("PROFILE_SAMPLE_PERCENT", "0")),
+    interval=float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000,
+    keep=int(os.getenv("PROFILE_KEEP", "100")),
+)
@@ -0,0 +1,68 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+
+_TOKEN_RE = r"[^\W_]+"
+
+
+def tokenize(text):
+    """Lowercased word tokens, as the index sees them."""
+    return re.findall(_TOKEN_RE, text.casefold())
+
+
+class LexicalIndex:
+    """BM25 index over short per-row documents (numpy inverted index, no scipy needed).
+
+    Identical documents are indexed once: `codes` maps every row to its distinct
+    document, so repeated titles/companies cost nothing extra to build or query.
+    """
+
+    def __init__(self, docs, k1=1.2, b=0.75, reference=None):
+        """reference: an index whose corpus statistics (document count, document
+        frequencies, average length) to score with instead of these docs' own — so
+        chunks of one upload, indexed separately, get comparable scores."""
+        codes, uniques = pd.factorize(pd.Series(docs, dtype=object), use_na_sentinel=False)
+        self.codes = codes
+        self.n_docs = len(uniques)
+
+        tokens = pd.Series(uniques, dtype=object).str.casefold().str.findall(_TOKEN_RE).explode().dropna()
+        doc_ids = tokens.index.to_numpy(dtype=np.int64)
+        term_ids, vocab = pd.factorize(tokens.to_numpy())
+        self.vocab = {term: i for i, term in enumerate(vocab)}
+        n_terms = len(vocab)
+
+        # Term frequency per (doc, term) pair, postings sorted by term
+        pairs, tf = np.unique(term_ids.astype(np.int64) * max(self.n_docs, 1) + doc_ids, return_counts=True)
+        post_terms, post_docs = np.divmod(pairs, max(self.n_docs, 1))
+        doc_len = np.bincount(doc_ids, minlength=self.n_docs).astype(np.float64)
+        self.avg_len = doc_len.mean() if self.n_docs else 0.0
+        self.doc_freq = np.bincount(post_terms, minlength=n_terms)
+        if reference is None:
+            corpus_docs, avg_len, df = self.n_docs, self.avg_len, self.doc_freq
+        else:
+            corpus_docs, avg_len = reference.n_docs, reference.avg_len
+            df = np.array([reference.term_doc_freq(term) for term in vocab], dtype=np.int64)
+        idf = np.log1p((corpus_docs - df + 0.5) / (df + 0.5))
+
+        norm = k1 * (1 - b + b * doc_len[post_docs] / (avg_len or 1.0))
+        self._weights = idf[post_terms] * tf * (k1 + 1) / (tf + norm)
+        self._docs = post_docs
+        self._indptr = np.concatenate(([0], np.cumsum(np.bincount(post_terms, minlength=n_terms))))
+
+    def term_doc_freq(self, term):
+        t = self.vocab.get(term)
+        return 0 if t is None else int(self.doc_freq[t])
+
+    def score(self, query):
+        """BM25 score of every row for query {text: weight}; multi-word texts add per token."""
+        doc_scores = np.zeros(self.n_docs, dtype=np.float64)
+        for text, weight in query.items():
+            for token in tokenize(text):
+                t = self.vocab.get(token)
+                if t is None:
+                    continue
+                lo, hi = self._indptr[t], self._indptr[t + 1]
+                doc_scores[self._docs[lo:hi]] += weight * self._weights[lo:hi]
+        return doc_scores[self.codes]
@@ -0,0 +1,24 @@
+import random
+
+
+def retry_after(exc):
+    """Seconds the provider asked us to wait (Retry-After header), if any. Looks at the
+    error's own headers (Resend) and at its HTTP response's (OpenAI, httpx)."""
+    headers = getattr(exc, "headers", None)
+    if not headers:
+        response = getattr(exc, "response", None)
+        headers = getattr(response, "headers", None)
+    try:
+        return float((headers or {}).get("retry-after"))
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def backoff_delay(attempt, exc, base_delay, max_delay):
+    """Full-jitter exponential backoff for retry `attempt` (0-based), raised to the
+    provider's Retry-After hint when there is one; never above max_delay."""
+    delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+    hinted = retry_after(exc)
+    if hinted is not None:
+        delay = max(delay, min(hinted, max_delay))
+    return delay
@@ -0,0 +1,113 @@
+import datetime
+import os
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database import SessionLocal, LeadScoreCache, engine, write_session
+from logs import get_logger
+from metrics import CACHE_REQUESTS, CACHE_WRITES
+
+log = get_logger("score_cache")
+
+
+class ScoreCache:
+    """Persistent per-lead LLM score cache on the app database (lead_score_cache table).
+
+    Entries expire `ttl` after they were written; beyond `max_entries` the least
+    recently used ones are evicted. Methods are blocking — call them off the event loop.
+    """
+
+    _CHUNK = 500  # keys per IN (...) query
+
+    def __init__(self, ttl_days=30, max_entries=200_000, enabled=True):
+        self.ttl = datetime.timedelta(days=ttl_days)
+        self.max_entries = max_entries
+        self.enabled = enabled
+
+    def get_many(self, keys):
+        """Return {key: {"score", "reasoning", "symmetric_value"}} for the fresh cached keys."""
+        keys = list(dict.fromkeys(keys))
+        if not self.enabled or not keys:
+            CACHE_REQUESTS.inc(len(keys), cache="score", result="miss")
+            return {}
+        now = datetime.datetime.utcnow()
+        found = {}
+        db = SessionLocal()
+        try:
+            for i in range(0, len(keys), self._CHUNK):
+                chunk = keys[i:i + self._CHUNK]
+                rows = db.execute(
+                    select(LeadScoreCache.key, LeadScoreCache.score, LeadScoreCache.reasoning, LeadScoreCache.symmetric_value)
+                    .where(LeadScoreCache.key.in_(chunk), LeadScoreCache.created_at >= now - self.ttl)
+                ).all()
+                for key, score, reasoning, symmetric_value in rows:
+                    found[key] = {"score": score, "reasoning": reasoning or "", "symmetric_value": symmetric_value or ""}
+            db.commit()  # end the read before taking the write lock
+            hit_keys = list(found)
+            if hit_keys:
+                with write_session() as writer:
+                    for i in range(0, len(hit_keys), self._CHUNK):
+                        writer.execute(
+                            update(LeadScoreCache)
+                            .where(LeadScoreCache.key.in_(hit_keys[i:i + self._CHUNK]))
+                            .values(last_used_at=now)
+                        )
+        except Exception as e:
+            log.error("score cache read failed", error=str(e))
+            found = {}
+        finally:
+            db.close()
+        CACHE_REQUESTS.inc(len(found), cache="score", result="hit")
+        CACHE_REQUESTS.inc(len(keys) - len(found), cache="score", result="miss")
+        return found
+
+    def put_many(self, entries):
+        """Store {key: {"score", "reasoning", "symmetric_value"}}, then apply TTL/LRU eviction."""
+        if not self.enabled or not entries:
+            return
+        now = datetime.datetime.utcnow()
+        rows = [
+            {
+                "key": key,
+                "score": float(e.get("score", 0)),
+                "reasoning": str(e.get("reasoning", "") or ""),
+                "symmetric_value": str(e.get("symmetric_value", "") or ""),
+                "created_at": now,
+                "last_used_at": now,
+            }
+            for key, e in entries.items()
+        ]
+        try:
+            with write_session() as db:
+                self._upsert(db, rows)
+                evicted = db.execute(delete(LeadScoreCache).where(LeadScoreCache.created_at < now - self.ttl)).rowcount
+                excess = db.execute(select(func.count()).select_from(LeadScoreCache)).scalar() - self.max_entries
+                if excess > 0:
+                    oldest = select(LeadScoreCache.key).order_by(LeadScoreCache.last_used_at).limit(excess)
+                    evicted += db.execute(delete(LeadScoreCache).where(LeadScoreCache.key.in_(oldest))).rowcount
+            CACHE_WRITES.inc(len(rows), cache="score", op="stored")
+            CACHE_WRITES.inc(max(evicted or 0, 0), cache="score", op="evicted")
+        except Exception as e:
+            log.error("score cache write failed", error=str(e))
+
+    def _upsert(self, db, rows):
+        """Insert rows, replacing existing keys. Postgres and SQLite do it in one
+        INSERT ... ON CONFLICT, so concurrent writers of a key never collide."""
+        dialect = {"postgresql": postgresql, "sqlite": sqlite}.get(engine.dialect.name)
+        if dialect is None:
+            keys = [row["key"] for row in rows]
+            for i in range(0, len(keys), self._CHUNK):
+                db.execute(delete(LeadScoreCache).where(LeadScoreCache.key.in_(keys[i:i + self._CHUNK])))
+            db.execute(insert(LeadScoreCache), rows)
+            return
+        stmt = dialect.insert(LeadScoreCache)
+        replaced = {column: stmt.excluded[column] for column in rows[0] if column != "key"}
+        db.execute(stmt.on_conflict_do_update(index_elements=[LeadScoreCache.key], set_=replaced), rows)
+
+
+score_cache = ScoreCache(
+    ttl_days=float(os.getenv("SCORE_CACHE_TTL_DAYS", "30")),
+    max_entries=int(os.getenv("SCORE_CACHE_MAX_ENTRIES", "200000")),
+    enabled=os.getenv("SCORE_CACHE_ENABLED", "1") != "0",
+)
@@ -1,20 +1,62 @@
+import asyncio
+import codecs
 import csv
+import functools
+import hashlib
 import json
 import os
 import re
+import time
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
+from llm_scheduler import LLMScheduler
+from strategy_cache import StrategyCache
+from batch_planner import BatchPlanner, estimate_tokens
+from stream_json import LeadObjectStream
+from relevance import LexicalIndex
+from column_matcher import ColumnMatcher
+from logs import get_logger
+from metrics import BATCH_FAILURES, LLM_CALLS, LLM_TOKENS, STAGE_SECONDS
+import numpy as np
 import pandas as pd
 import io
 
 load_dotenv()
 
+csv_log = get_logger("csv")
+llm_log = get_logger("llm")
+
+# Retries are handled by the scheduler (so backoff doesn't hold an in-flight slot)
 client = AsyncOpenAI(
-    base_url="https://api.gmi-serving.com/v1",
+    base_url=os.getenv("GMI_BASE_URL", "https://api.gmi-serving.com/v1"),
     api_key=os.getenv("GMI_API_KEY"),
+    max_retries=0,
 )
 MODEL_ID = "deepseek-ai/DeepSeek-V3-0324"
 
+# Every LLM call in the process goes through this gate
+llm_scheduler = LLMScheduler(
+    max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "8")),
+    timeout=float(os.getenv("LLM_CALL_TIMEOUT_S", "90")),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+)
+
+# Generated strategies, memoized per normalized goal text
+strategy_cache = StrategyCache(
+    ttl=float(os.getenv("STRATEGY_CACHE_TTL_S", str(6 * 3600))),
+    max_entries=int(os.getenv("STRATEGY_CACHE_MAX_ENTRIES", "1000")),
+)
+
+# Packs lead-scoring batches to the prompt/completion token budget
+batch_planner = BatchPlanner(
+    max_prompt_tokens=int(os.getenv("LLM_BATCH_PROMPT_TOKENS", "24000")),
+    max_output_tokens=int(os.getenv("LLM_BATCH_OUTPUT_TOKENS", "4000")),
+    output_tokens_per_lead=int(os.getenv("LLM_OUTPUT_TOKENS_PER_LEAD", "160")),
+    max_leads=int(os.getenv("LLM_BATCH_MAX_LEADS", "20")),
+)
+# Ask for token usage (incl. cached prompt tokens) on streamed scoring calls
+LLM_STREAM_USAGE = os.getenv("LLM_STREAM_USAGE", "1") != "0"
+
 
 # Canonical column names the rest of the pipeline expects
 _CANONICAL = ["First Name", "Last Name", "Company", "Position", "URL", "Email", "Industry", "Location", "Connected On"]
@@ -36,8 +78,8 @@ _COLUMN_VARIANTS = {
 _HEADER_MIN_MATCHES = 2
 
 
-def _normalize_header_cell(cell):
-    return cell.strip().lower().replace(" ", "").replace("-", "").replace("_", "")
+# Compiled once: exact-match index + substring automaton, with per-cell / per-header LRUs
+_column_matcher = ColumnMatcher(_COLUMN_VARIANTS)
 
 
 def _header_match_count(line):
@@ -46,24 +88,7 @@ def _header_match_count(line):
         row = next(csv.reader(io.StringIO(line), skipinitialspace=True), [])
     except Exception:
         return 0
-    seen = set()
-    for cell in row:
-        n = cell.strip().lower()
-        if not n:
-            continue
-        n_flat = _normalize_header_cell(cell)
-        for canonical, variants in _COLUMN_VARIANTS.items():
-            if canonical in seen:
-                continue
-            for v in variants:
-                v_flat = v.replace(" ", "").replace("_", "").replace("-", "")
-                if n == v or n_flat == v_flat:
-                    seen.add(canonical)
-                    break
-                if len(v) >= 4 and len(n) >= 3 and (v in n or n in v):
-                    seen.add(canonical)
-                    break
-    return len(seen)
+    return _column_matcher.match_count(row)
 
 
 def _build_column_rename(df_columns):
@@ -72,86 +97,113 @@ def _build_column_rename(df_columns):
     Uses a two-pass approach: exact matches first (high confidence), then substring
     matches (lower confidence) — so a loose match can't steal a slot from an exact one.
     """
-    used = set()
-    rename = {}
+    return _column_matcher.rename(df_columns)
 
-    # Pass 1: exact matches only (case-insensitive, ignoring separators)
-    for col in df_columns:
-        raw = col.strip()
-        if not raw:
-            continue
-        n = raw.lower()
-        n_flat = _normalize_header_cell(raw)
-        for canonical, variants in _COLUMN_VARIANTS.items():
-            if canonical in used:
-                continue
-            for v in variants:
-                v_flat = v.replace(" ", "").replace("_", "").replace("-", "")
-                if n == v or n_flat == v_flat:
-                    rename[col] = canonical
-                    used.add(canonical)
-                    break
 
-    # Pass 2: substring containment — only for still-unmapped columns & canonicals,
-    # and only when both variant and column name have meaningful length
-    for col in df_columns:
-        if col in rename:
-            continue
-        raw = col.strip()
-        if not raw:
-            continue
-        n = raw.lower()
-        for canonical, variants in _COLUMN_VARIANTS.items():
-            if canonical in used:
-                continue
-            for v in variants:
-                if len(v) < 4 or len(n) < 3:
-                    continue
-                if v in n or n in v:
-                    rename[col] = canonical
-                    used.add(canonical)
-                    break
-
-    return rename
+# Delimiters tried in order; the first giving 3+ recognized columns wins outright
+_DELIMITERS = [",", "\t", ";", "|"]
+# Header/delimiter sniffing only looks at a bounded prefix of the upload
+_SNIFF_BYTES = 64 * 1024
+_HEADER_SCAN_LINES = 25
+_SNIFF_ROWS = 200
+_UTF8_BOM = b"\xef\xbb\xbf"
+_WHITESPACE_BYTES = b" \t\n\r\x0b\x0c"
+_ENCODING_BLOCK = 1024 * 1024
 
 
-def process_csv(file_contents):
-    """Parse CSV with flexible header detection and column mapping for LinkedIn, Salesforce, HubSpot, Sheets."""
-    if not file_contents or len(file_contents) == 0:
-        raise ValueError("File is empty")
+def _encoding_of(blocks):
+    """'utf-8' if the byte blocks decode as UTF-8 end to end, else 'latin-1'. Decodes
+    incrementally, so the full text is never held in memory."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
     try:
-        content_str = file_contents.decode('utf-8')
+        for block in blocks:
+            decoder.decode(block)
+        decoder.decode(b"", final=True)
     except UnicodeDecodeError:
-        content_str = file_contents.decode('latin-1')
-    content_str = content_str.lstrip("\ufeff").strip()
-    if not content_str:
-        raise ValueError("File has no content")
+        return "latin-1"
+    return "utf-8"
 
-    lines = content_str.split('\n')
 
-    # Find the header: scan first 25 lines, pick the one with the MOST matches
-    # (LinkedIn exports often have 3+ noise rows before the real header)
-    best_header_idx = 0
-    best_header_score = 0
-    for i, line in enumerate(lines[:25]):
-        score = _header_match_count(line)
-        if score > best_header_score:
-            best_header_score = score
-            best_header_idx = i
-    header_idx = best_header_idx
-    print(f"[csv] header detection: line {header_idx} won with {best_header_score} column matches")
+def _detect_encoding(data):
+    """_encoding_of an in-memory upload."""
+    return _encoding_of(data[i:i + _ENCODING_BLOCK] for i in range(0, len(data), _ENCODING_BLOCK))
+
+
+def _detect_file_encoding(f):
+    """_encoding_of an open binary file; rewinds f."""
+    try:
+        return _encoding_of(iter(lambda: f.read(_ENCODING_BLOCK), b""))
+    finally:
+        f.seek(0)
+
+
+def _content_start(data, encoding):
+    """Offset of the first byte after any UTF-8 BOMs and leading whitespace."""
+    start = 0
+    if encoding == "utf-8":
+        while data.startswith(_UTF8_BOM, start):
+            start += len(_UTF8_BOM)
+    while start < len(data) and data[start] in _WHITESPACE_BYTES:
+        start += 1
+    return start
+
+
+def _strip_content(data, encoding):
+    """Bytes equivalent of decode + lstrip(BOM) + strip(); only copies when the ends need trimming."""
+    start, end = _content_start(data, encoding), len(data)
+    while end > start and data[end - 1] in _WHITESPACE_BYTES:
+        end -= 1
+    # Trailing blank lines don't change the parse — avoid copying just to drop them
+    if data[end:].strip(b"\r\n") == b"":
+        end = len(data)
+    if (start, end) == (0, len(data)):
+        return data
+    return data[start:end]
+
+
+def _sniff_sample(data):
+    """Prefix of data ending on a line break, long enough to cover the header scan."""
+    size = _SNIFF_BYTES
+    while size < len(data):
+        cut = data.rfind(b"\n", 0, size)
+        if cut != -1 and data.count(b"\n", 0, cut) > _HEADER_SCAN_LINES:
+            return data[:cut + 1]
+        size *= 2
+    return data
+
+
+def _read_delimited(data, header_idx, sep, encoding, nrows=None):
+    """One pd.read_csv pass over raw bytes with string dtypes (no type inference)."""
+    df = pd.read_csv(
+        io.BytesIO(data),
+        skiprows=header_idx,
+        sep=sep,
+        encoding=encoding,
+        dtype=str,
+        nrows=nrows,
+        engine="c",
+    )
+    return _clean_column_names(df)
+
+
+def _clean_column_names(df):
+    df.columns = [str(c).strip().strip('"').strip("'") for c in df.columns]
+    return df
 
-    # Try each delimiter; keep the one that gives the most recognized columns
+
+def _pick_delimiter(data, header_idx, encoding, seps, nrows=None):
+    """Try each delimiter; keep the one that gives the most recognized columns.
+
+    Returns (sep, rename, trial_df); sep is None when nothing parsed with data rows.
+    """
     best_df = None
-    best_sep = ","
+    best_sep = None
     best_rename = {}
-
-    for try_sep in [",", "\t", ";", "|"]:
+    for try_sep in seps:
         try:
-            trial = pd.read_csv(io.StringIO(content_str), skiprows=header_idx, sep=try_sep)
+            trial = _read_delimited(data, header_idx, try_sep, encoding, nrows=nrows)
             if trial.empty:
                 continue
-            trial.columns = [str(c).strip().strip('"').strip("'") for c in trial.columns]
             trial_rename = _build_column_rename(trial.columns)
             if len(trial_rename) > len(best_rename):
                 best_df = trial
@@ -161,17 +213,70 @@ def process_csv(file_contents):
                 break
         except Exception:
             continue
+    return best_sep, best_rename, best_df
+
+
+def _find_header(lines):
+    """Index of the header line: of the first 25 lines, the one with the MOST column matches
+    (LinkedIn exports often have 3+ noise rows before the real header)."""
+    best_header_idx = 0
+    best_header_score = 0
+    for i, line in enumerate(lines[:_HEADER_SCAN_LINES]):
+        score = _header_match_count(line)
+        if score > best_header_score:
+            best_header_score = score
+            best_header_idx = i
+    csv_log.debug("header detected", line=best_header_idx, column_matches=best_header_score)
+    return best_header_idx
+
+
+def _sniff_layout(sample, encoding, truncated):
+    """Header row and delimiter of a CSV from its leading bytes (whole lines).
+
+    Returns (header_idx, sep, rename, trial_df); sep is None when nothing parsed. With
+    `truncated`, the sample is only a prefix of the file and trials read _SNIFF_ROWS rows.
+    """
+    header_idx = _find_header(sample.decode(encoding).split('\n'))
+    sep, rename, trial = _pick_delimiter(sample, header_idx, encoding, _DELIMITERS, nrows=_SNIFF_ROWS if truncated else None)
+    return header_idx, sep, rename, trial
+
+
+def process_csv(file_contents):
+    """Parse CSV with flexible header detection and column mapping for LinkedIn, Salesforce, HubSpot, Sheets.
+
+    Header row and delimiter are sniffed on a bounded prefix of the bytes; the full
+    file is then parsed exactly once (unless that parse fails with the sniffed delimiter).
+    """
+    if not file_contents or len(file_contents) == 0:
+        raise ValueError("File is empty")
+    encoding = _detect_encoding(file_contents)
+    data = _strip_content(file_contents, encoding)
+    if not data:
+        raise ValueError("File has no content")
+
+    sample = _sniff_sample(data)
+    header_idx, best_sep, best_rename, best_df = _sniff_layout(sample, encoding, truncated=len(sample) < len(data))
+    if best_sep is not None and len(sample) < len(data):
+        try:
+            best_df = _read_delimited(data, header_idx, best_sep, encoding)
+        except Exception:
+            # Something past the sample broke this delimiter — retry the others on the full file
+            seps = [s for s in _DELIMITERS if s != best_sep]
+            best_sep, best_rename, best_df = _pick_delimiter(data, header_idx, encoding, seps)
 
     if best_df is None or best_df.empty:
         raise ValueError("CSV has no data rows")
 
-    df = best_df
-    rename = best_rename
-    print(f"[csv] delimiter: {repr(best_sep)}, skipped {header_idx} noise rows")
-    print(f"[csv] original columns ({len(df.columns)}): {list(df.columns)}")
-    print(f"[csv] rename map: {rename}")
+    csv_log.debug("delimiter picked", sep=best_sep, noise_rows=header_idx)
+    return _finish_frame(best_df, best_rename)
+
+
+def _finish_frame(df, rename, verbose=True):
+    """Map a parsed frame onto the canonical columns and materialize lead profiles."""
+    verbose = verbose and csv_log.enabled("debug")
+    if verbose:
+        csv_log.debug("columns mapped", original=[str(c) for c in df.columns], rename=rename)
     df.rename(columns=rename, inplace=True)
-    print(f"[csv] mapped columns: {list(df.columns)}")
 
     # Fallback: Full Name / Name -> First Name + Last Name
     name_col = None
@@ -204,17 +309,61 @@ def process_csv(file_contents):
         if col not in df.columns:
             df[col] = ""
 
-    df = df.fillna("")
-    # Diagnostic: show actual data in key columns for first 2 rows
-    key_cols = ["First Name", "Last Name", "Company", "Position", "URL"]
-    for idx, row in df.head(2).iterrows():
-        sample = {c: str(row.get(c, ""))[:40] for c in key_cols if row.get(c, "")}
-        non_canonical = {str(c)[:25]: str(v)[:30] for c, v in row.items() if c not in _CANONICAL and str(v).strip()}
-        print(f"[csv] row {idx}: canonical={sample}, other={non_canonical}")
-    print(f"[csv] final: {len(df)} rows, {len(df.columns)} columns")
+    df = materialize_profiles(df)
+    if verbose:
+        # Diagnostic: show actual data in key columns for first 2 rows
+        key_cols = ["First Name", "Last Name", "Company", "Position", "URL"]
+        for idx, row in df.head(2).iterrows():
+            sample = {c: str(row.get(c, ""))[:40] for c in key_cols if isinstance(row.get(c), str) and row.get(c)}
+            non_canonical = {str(c)[:25]: v[:30] for c, v in row.items() if c not in _CANONICAL and isinstance(v, str) and v.strip()}
+            csv_log.debug("sample row", row=idx, canonical=sample, other=non_canonical)
+
+    # Nothing downstream reads the other export columns once the profile is resolved
+    df = df[_CANONICAL]
+    for col in _CANONICAL:
+        if col not in _PROFILE_FIELDS and df[col].hasnans:
+            df[col] = df[col].fillna("")
+    if verbose:
+        csv_log.debug("frame ready", rows=len(df), columns=len(df.columns))
     return df
 
 
+def iter_csv_chunks(path, chunksize=50_000):
+    """process_csv for a file on disk, yielding canonical frames of up to `chunksize` rows.
+
+    Header row and delimiter are sniffed on a bounded prefix exactly like process_csv; the
+    file is then read once with pd.read_csv(chunksize=...), so memory is bounded by the
+    chunk size rather than the file size. Row index labels are global row numbers.
+    """
+    with open(path, "rb") as f:
+        encoding = _detect_file_encoding(f)
+        head = f.read(_SNIFF_BYTES * 16)
+        start = _content_start(head, encoding)
+        head = head[start:]
+        more = f.read(1) != b""
+        if more:
+            # Only sniff whole lines
+            head = head[:head.rfind(b"\n") + 1]
+        if not head.strip():
+            raise ValueError("File has no content")
+
+        sample = _sniff_sample(head)
+        header_idx, sep, rename, _ = _sniff_layout(sample, encoding, truncated=more or len(sample) < len(head))
+        if sep is None:
+            raise ValueError("CSV has no data rows")
+        csv_log.debug("delimiter picked", sep=sep, noise_rows=header_idx, chunksize=chunksize)
+
+        f.seek(start)
+        reader = pd.read_csv(f, skiprows=header_idx, sep=sep, encoding=encoding, dtype=str, chunksize=chunksize, engine="c")
+        rows = 0
+        for chunk in reader:
+            chunk = _finish_frame(_clean_column_names(chunk), dict(rename), verbose=rows == 0)
+            rows += len(chunk)
+            yield chunk
+        if rows == 0:
+            raise ValueError("CSV has no data rows")
+
+
 def _smart_fallback(idea: str, row_count: int):
     """
     Parse the user's prompt to build a usable fallback strategy.
@@ -354,8 +503,32 @@ def _extract_json(text: str):
     return None
 
 
-async def generate_strategy(idea: str, row_count: int):
-    """Generate scoring strategy with retry and smart fallback."""
+def _strategy_cache_key(idea: str):
+    """Normalized goal text: case, whitespace and surrounding punctuation don't matter."""
+    goal = _normalize_text(idea).strip(" .!?;:'\"")
+    return f"{MODEL_ID}|{goal}"
+
+
+async def generate_strategy(idea: str, row_count: int, request_key: str = "default"):
+    """Generate scoring strategy with retry and smart fallback.
+
+    LLM strategies are memoized per normalized goal (see strategy_cache), and
+    concurrent requests for the same goal share one in-flight call.
+    """
+    data = await strategy_cache.get_or_create(
+        _strategy_cache_key(idea), lambda: _request_strategy(idea, row_count, request_key)
+    )
+    if data is not None:
+        return data
+
+    # All attempts failed — use smart fallback
+    llm_log.warning("strategy fallback", idea=idea[:50])
+    fallback = _smart_fallback(idea, row_count)
+    return fallback
+
+
+async def _request_strategy(idea: str, row_count: int, request_key: str):
+    """Ask the LLM for a strategy (2 attempts). Returns None if both fail."""
     prompt = f"""User Goal: "{idea}"
 
 Task: Create a Scoring Rubric.
@@ -393,13 +566,15 @@ Return a SINGLE JSON object (all values must be strings or arrays of strings —
     # Try up to 2 times
     for attempt in range(2):
         try:
-            response = await client.chat.completions.create(
+            response = await llm_scheduler.run(request_key, lambda: client.chat.completions.create(
                 model=MODEL_ID,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.2,
                 max_tokens=800
-            )
+            ))
             raw = response.choices[0].message.content
+            if response.usage:
+                _record_usage("strategy", response.usage.prompt_tokens, response.usage.completion_tokens)
             data = _extract_json(raw)
             if data and isinstance(data, dict) and data.get("keywords"):
                 if not data.get("persona"):
@@ -411,104 +586,313 @@ Return a SINGLE JSON object (all values must be strings or arrays of strings —
                         data[str_field] = " | ".join(f"{k}: {v}" for k, v in val.items())
                     elif val is not None and not isinstance(val, str):
                         data[str_field] = str(val)
-                print(f"Strategy OK (attempt {attempt+1}): persona={data.get('persona')}, keywords={data.get('keywords')}")
+                LLM_CALLS.inc(kind="strategy", outcome="ok")
+                llm_log.info("strategy ok", attempt=attempt + 1, persona=data.get("persona"), keywords=data.get("keywords"))
                 return data
             else:
-                print(f"Strategy attempt {attempt+1}: invalid response, retrying. Raw: {raw[:200]}")
+                LLM_CALLS.inc(kind="strategy", outcome="invalid")
+                llm_log.warning("strategy invalid", attempt=attempt + 1, raw=raw[:200])
         except Exception as e:
-            print(f"Strategy attempt {attempt+1} error: {e}")
+            LLM_CALLS.inc(kind="strategy", outcome="error")
+            llm_log.error("strategy error", attempt=attempt + 1, error=str(e))
+    return None
 
-    # All attempts failed — use smart fallback
-    print(f"Strategy: using smart fallback for '{idea[:50]}'")
-    fallback = _smart_fallback(idea, row_count)
-    return fallback
 
+def _record_usage(kind, prompt_tokens=0, completion_tokens=0, cached_tokens=0, **_):
+    LLM_TOKENS.inc(prompt_tokens or 0, kind=kind, direction="prompt")
+    LLM_TOKENS.inc(completion_tokens or 0, kind=kind, direction="completion")
+    LLM_TOKENS.inc(cached_tokens or 0, kind=kind, direction="cached_prompt")
 
-def _build_lead_profile(row):
-    """Extract a clean profile dict from a CSV row.
-    
-    Tries canonical columns first, then scans all columns by header name
-    so data still flows even when column mapping missed something.
+
+# Profile fields the scoring pipeline reads, in prompt order
+_PROFILE_FIELDS = ["First Name", "Last Name", "Position", "Company", "Industry", "Location"]
+
+# Header hints used when a canonical profile field is empty
+_PROFILE_FALLBACK = {
+    "First Name": ["first name", "firstname", "first_name", "fname"],
+    "Last Name": ["last name", "lastname", "last_name", "lname", "surname"],
+    "Company": ["company", "organization", "employer", "account", "business"],
+    "Position": ["position", "title", "role", "job title", "occupation"],
+}
+
+_FULL_NAME_HEADERS = ("name", "full name", "fullname", "contact name", "display name")
+
+
+def _clean_column(df, col):
+    return df[col].fillna("").astype(str).str.strip()
+
+
+def materialize_profiles(df):
+    """Resolve the canonical profile fields once per frame, writing them back in place.
+
+    Tries canonical columns first, then scans the other columns by header name so
+    data still flows even when column mapping missed something. The fallback
+    columns are chosen once from the schema; each row takes the first non-empty
+    one. After this, the _PROFILE_FIELDS columns are the profile.
     """
-    fields = {}
-    for key in ["First Name", "Last Name", "Position", "Company", "Industry", "Location"]:
-        val = row.get(key, "")
-        if val is None or (isinstance(val, float) and pd.isna(val)):
-            continue
-        val = str(val).strip()
-        if val:
-            fields[key] = val
-
-    # If key fields are still empty, scan all columns by header keyword
-    _FALLBACK = {
-        "First Name": ["first name", "firstname", "first_name", "fname"],
-        "Last Name": ["last name", "lastname", "last_name", "lname", "surname"],
-        "Company": ["company", "organization", "employer", "account", "business"],
-        "Position": ["position", "title", "role", "job title", "occupation"],
-    }
-    for canonical, hints in _FALLBACK.items():
-        if fields.get(canonical):
-            continue
-        for col_name in row.index:
+    for key in _PROFILE_FIELDS:
+        values = _clean_column(df, key) if key in df.columns else pd.Series("", index=df.index, dtype=object)
+        hints = _PROFILE_FALLBACK.get(key, [])
+        for col_name in df.columns:
             if col_name in _CANONICAL:
                 continue
             col_lower = str(col_name).strip().lower()
             if any(h in col_lower for h in hints):
-                val = row.get(col_name, "")
-                if val is None or (isinstance(val, float) and pd.isna(val)):
-                    continue
-                val = str(val).strip()
-                if val:
-                    fields[canonical] = val
+                empty = values.eq("")
+                if not empty.any():
                     break
+                values = values.where(~empty, _clean_column(df, col_name))
+        df[key] = values
 
-    # Full name fallback: if we still have no name, look for a "name" column
-    if not fields.get("First Name") and not fields.get("Last Name"):
-        for col_name in row.index:
-            col_lower = str(col_name).strip().lower()
-            if col_lower in ("name", "full name", "fullname", "contact name", "display name"):
-                val = str(row.get(col_name, "")).strip()
-                if val:
-                    parts = val.split(None, 1)
-                    fields["First Name"] = parts[0]
-                    if len(parts) > 1:
-                        fields["Last Name"] = parts[1]
-                    break
+    # Full name fallback: rows with no name at all take the first non-empty "name" column
+    nameless = df["First Name"].eq("") & df["Last Name"].eq("")
+    for col_name in df.columns:
+        if not nameless.any():
+            break
+        if str(col_name).strip().lower() not in _FULL_NAME_HEADERS:
+            continue
+        full = _clean_column(df, col_name)
+        take = nameless & full.ne("")
+        if take.any():
+            parts = full[take].str.split(n=1, expand=True)
+            df.loc[take, "First Name"] = parts[0]
+            if parts.shape[1] > 1:
+                df.loc[take, "Last Name"] = parts[1].fillna("")
+            nameless &= ~take
+    return df
+
+
+def compact_leads(df):
+    """Store the string columns whose values repeat (Company, Position, Industry,
+    Location, dates — heavily, in real networks) as categoricals: each distinct value
+    once plus an integer code per row. Modifies df in place; call it on the final
+    deduplicated frame, since categoricals reject new values on assignment."""
+    for col in df.columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype) or not pd.api.types.is_string_dtype(values.dtype):
+            continue
+        codes, uniques = pd.factorize(values)
+        if len(uniques) * 2 <= len(values):
+            df[col] = pd.Categorical.from_codes(codes, categories=uniques)
+    return df
+
+
+def _text(values):
+    """A string column as plain strings (categoricals don't support `+`)."""
+    return values.astype(str) if isinstance(values.dtype, pd.CategoricalDtype) else values
+
+
+def lead_profiles(df):
+    """Profile dicts (non-empty fields only) for the rows of a materialized frame."""
+    columns = [df[key].tolist() for key in _PROFILE_FIELDS]
+    return [
+        {key: val for key, val in zip(_PROFILE_FIELDS, values) if val}
+        for values in zip(*columns)
+    ]
+
+
+def _strategy_terms(strategy):
+    """Lowercased keyword-scan term lists from a strategy dict."""
+    def _terms(field, default=()):
+        return [w.lower() for w in strategy.get(field, list(default)) if isinstance(w, str)]
 
-    return fields
+    return {
+        "keywords": _terms("keywords"),
+        "boost_words": _terms("boost_words"),
+        "company_words": _terms("company_words"),
+        "negative_words": _terms("negative_words", ["intern", "student"]),
+        "priority_signals": _terms("priority_signals"),
+    }
+
+
+def quick_score_frame(df, strategy):
+    """Keyword pre-score for every row of df, returned as an int Series aligned to df.
 
+    Scoring rules (a term counts once per list entry it appears in):
+      +1 keyword / priority signal found in "position company"
+      +2 boost word found in position, +2 company word found in company
+      -5 negative word found in position
 
-async def analyze_leads_batch(rows, strategy, user_prompt: str):
+    Terms are merged into one weight per (term, column), and each weighted term is
+    matched with a vectorized str.contains over the *distinct* column values only —
+    Position/Company repeat heavily in real networks. df must be materialized
+    (see materialize_profiles).
     """
-    Score a BATCH of leads in a single API call for speed.
-    Returns a list of result dicts, one per lead.
+    terms = _strategy_terms(strategy)
+    text_weights, pos_weights, comp_weights = {}, {}, {}
+    for field, weights, w in (
+        ("keywords", text_weights, 1),
+        ("priority_signals", text_weights, 1),
+        ("boost_words", pos_weights, 2),
+        ("negative_words", pos_weights, -5),
+        ("company_words", comp_weights, 2),
+    ):
+        for term in terms[field]:
+            weights[term] = weights.get(term, 0) + w
+
+    pos = df["Position"].str.lower()
+    comp = df["Company"].str.lower()
+    columns = [(pos, pos_weights), (comp, comp_weights)]
+    if text_weights:
+        columns.append((pos + " " + comp, text_weights))
+
+    scores = np.zeros(len(df), dtype=np.int64)
+    for values, weights in columns:
+        weights = {t: w for t, w in weights.items() if w}
+        if not weights:
+            continue
+        codes, uniques = pd.factorize(values)
+        uniques = pd.Series(uniques, dtype=object)
+        unique_scores = np.zeros(len(uniques), dtype=np.int64)
+        for term, w in weights.items():
+            unique_scores += w * uniques.str.contains(term, regex=False).to_numpy(dtype=bool)
+        scores += unique_scores[codes]
+    return pd.Series(scores, index=df.index)
+
+
+def build_lead_index(df, reference=None):
+    """BM25 index over "position company industry" for every row of a materialized df.
+    Pass the first chunk's index as `reference` to score later chunks on the same scale."""
+    return LexicalIndex(_text(df["Position"]) + " " + _text(df["Company"]) + " " + _text(df["Industry"]), reference=reference)
+
+
+def relevance_scores(index, df, strategy):
+    """BM25 relevance of every row to the strategy's positive terms, as a float Series aligned to df.
+
+    Uses the same term weights as quick_score_frame (boost/company words count double);
+    negative words are left to quick_score. Used to order rows with equal quick_score.
     """
-    value_flow = strategy.get("value_flow", "between")
-    implicit_ask = strategy.get("implicit_ask", user_prompt)
-    anchor = strategy.get("anchor_domain", "the specified field")
-    rubric = strategy.get("rubric", "")
-
-    # Build numbered lead list
-    lead_lines = []
-    for i, row in enumerate(rows):
-        fields = _build_lead_profile(row)
-        name = f"{fields.get('First Name', '')} {fields.get('Last Name', '')}".strip()
-        pos = fields.get("Position", "Unknown")
-        comp = fields.get("Company", "Unknown")
-        extra = ""
-        if fields.get("Industry"):
-            extra += f" | Industry: {fields['Industry']}"
-        lead_lines.append(f"{i+1}. {name}, {pos} at {comp}{extra}")
-
-    leads_block = "\n".join(lead_lines)
-
-    prompt = f"""User's Goal: "{user_prompt}"
-Implicit Ask: "{implicit_ask}"
-Value Flow: {value_flow} | Anchor Domain: "{anchor}"
-Rubric: {rubric}
+    terms = _strategy_terms(strategy)
+    query = {}
+    for field, w in (("keywords", 1), ("priority_signals", 1), ("boost_words", 2), ("company_words", 2)):
+        for term in terms[field]:
+            query[term] = query.get(term, 0) + w
+    return pd.Series(index.score(query), index=df.index)
+
+
+def top_k_positions(primary, secondary, k):
+    """Positions of the k best rows by (primary desc, secondary desc, position asc), best first.
+
+    argpartition finds the primary cutoff in O(n); only rows tied at the cutoff and the
+    k survivors are sorted.
+    """
+    primary = np.asarray(primary)
+    secondary = np.asarray(secondary)
+    n = len(primary)
+    if k >= n:
+        keep = np.arange(n)
+    elif k <= 0:
+        keep = np.arange(0)
+    else:
+        cutoff = primary[np.argpartition(primary, n - k)[n - k]]
+        above = np.flatnonzero(primary > cutoff)
+        tied = np.flatnonzero(primary == cutoff)
+        tied = tied[np.lexsort((tied, -secondary[tied]))][:k - len(above)]
+        keep = np.concatenate((above, tied))
+    return keep[np.lexsort((keep, -secondary[keep], -primary[keep]))]
+
+
+# Bump whenever the batch scoring prompt changes so cached scores are not reused across prompts
+SCORE_PROMPT_VERSION = "2"
+
+# Strategy fields that shape the batch scoring prompt
+_SCORE_STRATEGY_FIELDS = ("value_flow", "implicit_ask", "anchor_domain", "rubric")
 
-LEADS TO SCORE:
-{leads_block}
+
+def _normalize_text(val):
+    return " ".join(str(val).split()).casefold()
+
+
+def strategy_fingerprint(strategy, user_prompt: str):
+    """Stable hash of everything in the scoring prompt that is shared by all leads."""
+    parts = {f: _normalize_text(strategy.get(f, "")) for f in _SCORE_STRATEGY_FIELDS}
+    parts["user_prompt"] = _normalize_text(user_prompt)
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def lead_score_key(profile, fingerprint: str):
+    """Content address for one lead's LLM score: profile + strategy + model + prompt version."""
+    lead = [_normalize_text(profile.get(f, "")) for f in ("First Name", "Last Name", "Position", "Company", "Industry")]
+    raw = json.dumps([lead, fingerprint, MODEL_ID, SCORE_PROMPT_VERSION])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+async def _stream_lead_scores(messages):
+    """Stream a batch completion, parsing lead objects as they close.
+
+    Returns (raw text, lead dicts, finish_reason, usage). A response cut off at max_tokens
+    still yields every lead that was completed before the cut. usage holds the provider's
+    token counts (estimated when it doesn't report them) and call timings.
+    """
+    started = time.perf_counter()
+    extra = {"stream_options": {"include_usage": True}} if LLM_STREAM_USAGE else {}
+    stream = await client.chat.completions.create(
+        model=MODEL_ID,
+        messages=messages,
+        temperature=0.3,
+        max_tokens=batch_planner.max_output_tokens,
+        stream=True,
+        **extra,
+    )
+    parser = LeadObjectStream()
+    chunks, results, finish_reason, reported, first_token_s = [], [], None, None, None
+    async for chunk in stream:
+        if getattr(chunk, "usage", None):
+            reported = chunk.usage
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        text = choice.delta.content if choice.delta else None
+        if text:
+            if first_token_s is None:
+                first_token_s = time.perf_counter() - started
+            chunks.append(text)
+            results.extend(parser.feed(text))
+        finish_reason = choice.finish_reason or finish_reason
+    raw = "".join(chunks)
+
+    details = getattr(reported, "prompt_tokens_details", None)
+    usage = {
+        "prompt_tokens": reported.prompt_tokens if reported else sum(estimate_tokens(m["content"]) for m in messages),
+        "cached_tokens": (getattr(details, "cached_tokens", None) or 0) if details else 0,
+        "completion_tokens": reported.completion_tokens if reported else estimate_tokens(raw),
+        "seconds": time.perf_counter() - started,
+        "first_token_s": first_token_s,
+    }
+    return raw, results, finish_reason, usage
+
+
+def _parse_batch_response(raw):
+    """Whole-response fallback for output the streaming parser found no leads in."""
+    parsed = _extract_json(raw)
+
+    # Handle dict wrapper
+    if isinstance(parsed, dict):
+        for key in ["results", "leads", "data", "scores"]:
+            if key in parsed and isinstance(parsed[key], list):
+                parsed = parsed[key]
+                break
+        else:
+            parsed = list(parsed.values())[0] if parsed else []
+
+    results = parsed if isinstance(parsed, list) else []
+    return [r for r in results if isinstance(r, dict)]
+
+
+def _lead_line(i, fields):
+    """Numbered prompt line for one lead profile."""
+    name = f"{fields.get('First Name', '')} {fields.get('Last Name', '')}".strip()
+    pos = fields.get("Position", "Unknown")
+    comp = fields.get("Company", "Unknown")
+    extra = ""
+    if fields.get("Industry"):
+        extra += f" | Industry: {fields['Industry']}"
+    return f"{i+1}. {name}, {pos} at {comp}{extra}"
+
+
+# Request-invariant system prompt for lead scoring. It is sent first and byte-identical on
+# every call, so providers with prefix caching only process it once.
+_SCORING_RULES = """You score leads against the user's goal, implicit ask, value flow, anchor domain and rubric given in the user message.
 
 SCORING RULES (apply to each lead independently):
 1. CATEGORY MATCH — understand the EXACT relationship the user wants:
@@ -531,7 +915,7 @@ SCORING RULES (apply to each lead independently):
    - Partner: does this company have DISTRIBUTION LEVERAGE? (many end-users, many clients, platform ecosystem, complementary product). A BPO with 500 SDRs = massive leverage. A 1-person consultancy = low.
    Company doesn't fit = cap at 4.
 
-3. DOMAIN + SENIORITY: In "{anchor}"? Right level?
+3. DOMAIN + SENIORITY: In the Anchor Domain? Right level?
    Wrong domain = 0-2. Right domain, wrong level = 5-6.
 
 4. FINAL SCORE (0-10, tough grading):
@@ -565,29 +949,98 @@ SCORING RULES (apply to each lead independently):
    --- IF PARTNER (distribution / integration) ---
    Explain DISTRIBUTION math: "integrating into [Company]'s operations = N end-users from one deal." Reference company BY NAME. No filler (alignment, synergy, explore).
 
-Return a JSON array. Each element: {{"id": <number>, "score": <float>, "symmetric_value": "<string>", "reasoning": "<max 15 words>"}}
+Return a JSON array. Each element: {"id": <number>, "score": <float>, "symmetric_value": "<string>", "reasoning": "<max 15 words>"}
 Return ONLY the JSON array."""
 
+
+@functools.lru_cache(maxsize=256)
+def _strategy_section(user_prompt, implicit_ask, value_flow, anchor, rubric):
+    return f"""User's Goal: "{user_prompt}"
+Implicit Ask: "{implicit_ask}"
+Value Flow: {value_flow} | Anchor Domain: "{anchor}"
+Rubric: {rubric}
+
+LEADS TO SCORE:
+"""
+
+
+def _batch_messages(strategy, user_prompt, leads_block):
+    """Chat messages for one scoring batch: shared rules, then the strategy, then the leads.
+
+    leads_block is newline-joined _lead_line output. Everything before it is the same for
+    every batch of a request.
+    """
+    section = _strategy_section(
+        user_prompt,
+        str(strategy.get("implicit_ask", user_prompt)),
+        str(strategy.get("value_flow", "between")),
+        str(strategy.get("anchor_domain", "the specified field")),
+        str(strategy.get("rubric", "")),
+    )
+    return [
+        {"role": "system", "content": _SCORING_RULES},
+        {"role": "user", "content": section + leads_block},
+    ]
+
+
+def plan_batches(profiles, strategy, user_prompt):
+    """Split profiles into scoring batches sized to the token budget; returns lists of positions."""
+    lead_tokens = [estimate_tokens(_lead_line(i, p)) + 1 for i, p in enumerate(profiles)]
+    base_tokens = sum(estimate_tokens(m["content"]) for m in _batch_messages(strategy, user_prompt, ""))
+    return batch_planner.plan(lead_tokens, base_tokens)
+
+
+def _result_id(result):
     try:
-        response = await client.chat.completions.create(
-            model=MODEL_ID,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3,
-            max_tokens=4000
-        )
-        raw = response.choices[0].message.content
-        parsed = _extract_json(raw)
-
-        # Handle dict wrapper
-        if isinstance(parsed, dict):
-            for key in ["results", "leads", "data", "scores"]:
-                if key in parsed and isinstance(parsed[key], list):
-                    parsed = parsed[key]
-                    break
-            else:
-                parsed = list(parsed.values())[0] if parsed else []
+        return int(result.get("id"))
+    except (ValueError, TypeError):
+        return None
+
 
-        results = parsed if isinstance(parsed, list) else []
+async def _rescore_truncated(profiles, results, strategy, user_prompt, request_key):
+    """Score the leads a truncated response never reached, in two smaller batches.
+
+    Returned results carry ids relative to `profiles`.
+    """
+    done = {_result_id(r) for r in results}
+    missing = [i for i in range(len(profiles)) if i + 1 not in done]
+    llm_log.info("batch truncated", salvaged=len(profiles) - len(missing), leads=len(profiles))
+    if not missing or len(missing) == len(profiles) == 1:
+        return []
+    batch_planner.record_split()
+    half = (len(missing) + 1) // 2
+    parts = [part for part in (missing[:half], missing[half:]) if part]
+    rescored = await asyncio.gather(*[
+        analyze_leads_batch([profiles[i] for i in part], strategy, user_prompt, request_key=request_key)
+        for part in parts
+    ])
+    recovered = []
+    for part, part_results in zip(parts, rescored):
+        for r in part_results:
+            rid = _result_id(r)
+            if rid is not None and 1 <= rid <= len(part):
+                r["id"] = part[rid - 1] + 1
+                recovered.append(r)
+    return recovered
+
+
+async def analyze_leads_batch(profiles, strategy, user_prompt: str, request_key: str = "default"):
+    """
+    Score a BATCH of leads (profile dicts from lead_profiles) in a single API call for speed.
+    Returns a list of result dicts, one per lead.
+    """
+    messages = _batch_messages(strategy, user_prompt, "\n".join(_lead_line(i, p) for i, p in enumerate(profiles)))
+
+    try:
+        raw, results, finish_reason, usage = await llm_scheduler.run(request_key, lambda: _stream_lead_scores(messages))
+        if not results:
+            results = _parse_batch_response(raw)
+        batch_planner.observe(len(results), **usage)
+        _record_usage("batch", **usage)
+        STAGE_SECONDS.observe(usage["seconds"], stage="llm_batch")
+        LLM_CALLS.inc(kind="batch", outcome="truncated" if finish_reason == "length" else "ok")
+        if finish_reason == "length":
+            results += await _rescore_truncated(profiles, results, strategy, user_prompt, request_key)
 
         for r in results:
             try:
@@ -595,11 +1048,12 @@ Return ONLY the JSON array."""
             except (ValueError, TypeError):
                 r["score"] = 0.0
 
-        scored = [r for r in results if r["score"] >= 6.0]
-        print(f"Batch: {len(rows)} leads → {len(results)} parsed, {len(scored)} scored 6+")
+        if llm_log.enabled("debug"):
+            llm_log.debug("batch scored", leads=len(profiles), parsed=len(results),
+                          scored_6_plus=sum(r["score"] >= 6.0 for r in results))
         return results
     except Exception as e:
-        print(f"Batch analysis error: {e}")
-        import traceback
-        traceback.print_exc()
-        return [{"id": i+1, "score": 0, "reasoning": "Analysis failed", "symmetric_value": ""} for i in range(len(rows))]
+        LLM_CALLS.inc(kind="batch", outcome="error")
+        BATCH_FAILURES.inc()
+        llm_log.error("batch failed", exc_info=True, leads=len(profiles), error=str(e))
+        return [{"id": i+1, "score": 0, "reasoning": "Analysis failed", "symmetric_value": "", "failed": True} for i in range(len(profiles))]
@@ -0,0 +1,181 @@
+import datetime
+import hashlib
+import json
+import os
+
+from sqlalchemy import and_, delete, insert, or_, select, update
+
+from database import SessionLocal, AnalysisSession, SessionLead, write_session
+from logs import get_logger
+from metrics import CACHE_REQUESTS
+
+log = get_logger("sessions")
+
+
+def request_hash(idea, funnel, file_digests):
+    """Fingerprint of an /analyze request: the goal (whitespace-normalized), the funnel
+    settings and the sha256 of every uploaded file, in any order."""
+    payload = {"idea": " ".join(idea.split()), "funnel": funnel, "files": sorted(file_digests)}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class SessionStore:
+    """analysis_sessions rows (which request hash each session ran, and its response)
+    plus session_leads (every scored lead, best first, for reports).
+
+    find() returns the latest session for a hash started within `window` seconds that
+    finished successfully, or is still running and started less than `stale_after`
+    seconds ago — failed runs are never reused, and a row still "running" past that
+    is taken to be orphaned (its worker crashed or was redeployed). With enabled=False
+    it never matches, but sessions are still recorded. Methods are blocking — call
+    them off the event loop.
+    """
+
+    _CHUNK = 500  # session_leads rows per insert / fetch
+
+    def __init__(self, window=600, enabled=True, stale_after=300):
+        self.window = datetime.timedelta(seconds=window)
+        self.stale_after = datetime.timedelta(seconds=stale_after)
+        self.enabled = enabled
+        self._lookups = 0
+        self._reused = 0
+        self._attached = 0
+
+    def stats(self):
+        return {
+            "lookups": self._lookups,
+            "reused": self._reused,
+            "attached_in_process": self._attached,
+        }
+
+    def record_attach(self):
+        """Count a request that joined an identical one in flight in this process."""
+        self._attached += 1
+        CACHE_REQUESTS.inc(cache="session", result="coalesced")
+
+    def find(self, request_hash):
+        """(session_id, status, result, created_at) of a reusable session for request_hash, else None."""
+        if not self.enabled:
+            return None
+        self._lookups += 1
+        now = datetime.datetime.utcnow()
+        db = SessionLocal()
+        try:
+            row = db.execute(
+                select(AnalysisSession.session_id, AnalysisSession.status, AnalysisSession.result,
+                       AnalysisSession.created_at)
+                .where(
+                    AnalysisSession.request_hash == request_hash,
+                    AnalysisSession.created_at >= now - self.window,
+                    or_(
+                        AnalysisSession.status == "done",
+                        and_(AnalysisSession.status == "running", AnalysisSession.created_at >= now - self.stale_after),
+                    ),
+                )
+                .order_by(AnalysisSession.created_at.desc())
+                .limit(1)
+            ).first()
+        except Exception as e:
+            log.error("session store read failed", error=str(e))
+            return None
+        finally:
+            db.close()
+        if row is None:
+            CACHE_REQUESTS.inc(cache="session", result="miss")
+            return None
+        self._reused += 1
+        CACHE_REQUESTS.inc(cache="session", result="hit")
+        session_id, status, result, created_at = row
+        return session_id, status, json.loads(result) if result else None, created_at
+
+    def wait_deadline(self, created_at):
+        """When to stop waiting on a session still running since created_at (UTC): the
+        end of its dedup window, or when it counts as orphaned, whichever comes first."""
+        return created_at + min(self.window, self.stale_after)
+
+    def get(self, session_id):
+        """(status, idea, result, error) for session_id, or None if unknown."""
+        db = SessionLocal()
+        try:
+            row = db.execute(
+                select(AnalysisSession.status, AnalysisSession.idea, AnalysisSession.result, AnalysisSession.error)
+                .where(AnalysisSession.session_id == session_id)
+            ).first()
+        finally:
+            db.close()
+        if row is None:
+            return None
+        status, idea, result, error = row
+        return status, idea, json.loads(result) if result else None, error
+
+    def iter_leads(self, session_id, limit=None):
+        """Yield (name, role, company, score, symmetric_value, reasoning) for the session's
+        stored leads, best first, fetched _CHUNK rows at a time."""
+        stmt = (
+            select(SessionLead.name, SessionLead.role, SessionLead.company, SessionLead.score,
+                   SessionLead.symmetric_value, SessionLead.reasoning)
+            .where(SessionLead.session_id == session_id)
+            .order_by(SessionLead.rank)
+            .limit(limit)
+            .execution_options(yield_per=self._CHUNK)
+        )
+        db = SessionLocal()
+        try:
+            yield from db.execute(stmt)
+        finally:
+            db.close()
+
+    def start(self, session_id, request_hash, idea=""):
+        self._write(insert(AnalysisSession).values(
+            session_id=session_id, request_hash=request_hash, idea=idea, status="running",
+            created_at=datetime.datetime.utcnow(),
+        ))
+
+    def save_leads(self, session_id, leads):
+        """Store a session's scored leads ({"name", "role", "company", "score", ...}), best first."""
+        rows = [
+            {
+                "session_id": session_id,
+                "rank": rank,
+                "name": lead.get("name", ""),
+                "role": lead.get("role", ""),
+                "company": lead.get("company", ""),
+                "score": float(lead.get("score", 0)),
+                "symmetric_value": str(lead.get("symmetric_value", "") or ""),
+                "reasoning": str(lead.get("reasoning", "") or ""),
+            }
+            for rank, lead in enumerate(leads, start=1)
+        ]
+        stmts = [delete(SessionLead).where(SessionLead.session_id == session_id)]
+        stmts += [(insert(SessionLead), rows[i:i + self._CHUNK]) for i in range(0, len(rows), self._CHUNK)]
+        self._write(*stmts)
+
+    def finish(self, session_id, result):
+        self._write(update(AnalysisSession).where(AnalysisSession.session_id == session_id).values(
+            status="done", result=json.dumps(result, default=str), finished_at=datetime.datetime.utcnow(),
+        ))
+
+    def fail(self, session_id, error):
+        self._write(update(AnalysisSession).where(AnalysisSession.session_id == session_id).values(
+            status="error", error=str(error)[:2000], finished_at=datetime.datetime.utcnow(),
+        ))
+
+    def _write(self, *stmts):
+        """Run statements (or (statement, params) pairs) in one transaction. A failed
+        write is logged, not raised: it must not fail the analysis itself."""
+        try:
+            with write_session() as db:
+                for stmt in stmts:
+                    if isinstance(stmt, tuple):
+                        db.execute(*stmt)
+                    else:
+                        db.execute(stmt)
+        except Exception as e:
+            log.error("session store write failed", error=str(e))
+
+
+session_store = SessionStore(
+    window=float(os.getenv("ANALYZE_DEDUP_WINDOW_S", "600")),
+    enabled=os.getenv("ANALYZE_DEDUP_ENABLED", "1") != "0",
+    stale_after=float(os.getenv("ANALYZE_DEDUP_STALE_S", "300")),
+)
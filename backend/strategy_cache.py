@@ -0,0 +1,92 @@
+import asyncio
+import copy
+import time
+from collections import OrderedDict
+
+from metrics import CACHE_REQUESTS
+
+
+class StrategyCache:
+    """In-process TTL/LRU memo for generated strategies, with single-flight coalescing.
+
+    Concurrent lookups of a key that is still being generated await the same call
+    instead of starting their own. A factory result of None (LLM failed) is not cached.
+    """
+
+    def __init__(self, ttl=6 * 3600, max_entries=1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._in_flight = {}  # key -> asyncio.Future
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+
+    def stats(self):
+        lookups = self._hits + self._misses + self._coalesced
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "coalesced": self._coalesced,
+            "hit_rate": round((self._hits + self._coalesced) / lookups, 3) if lookups else 0.0,
+            "size": len(self._entries),
+        }
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_create(self, key, factory):
+        """Cached value for key, else the result of `await factory()` (shared by concurrent callers)."""
+        value = self._get(key)
+        if value is not None:
+            self._hits += 1
+            CACHE_REQUESTS.inc(cache="strategy", result="hit")
+            return copy.deepcopy(value)
+
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            self._coalesced += 1
+            CACHE_REQUESTS.inc(cache="strategy", result="coalesced")
+            try:
+                value = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The caller doing the work went away — take over
+                return await self.get_or_create(key, factory)
+            return copy.deepcopy(value)
+
+        self._misses += 1
+        CACHE_REQUESTS.inc(cache="strategy", result="miss")
+        pending = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = pending
+        try:
+            value = await factory()
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as e:
+            pending.set_exception(e)
+            pending.exception()  # mark retrieved when nobody else is waiting
+            raise
+        else:
+            if value is not None:
+                self._put(key, value)
+            pending.set_result(value)
+        finally:
+            del self._in_flight[key]
+        return copy.deepcopy(value)
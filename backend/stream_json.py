@@ -0,0 +1,83 @@
+import json
+
+
+class LeadObjectStream:
+    """Incremental parser for streamed model output of the form `[{"id": .., "score": ..}, ...]`.
+
+    feed() takes text chunks as they arrive and returns every lead object (a JSON object
+    with a "score" key) whose closing brace has been seen. Anything around the objects —
+    markdown fences, prose, a dict wrapper like {"results": [...]}, a truncated tail — is
+    ignored, so a cut-off response still yields all of its complete leads.
+
+    Only objects at lead depth count: a top-level object, or an element of an array held
+    directly by a wrapper object. Objects nested inside a lead are part of that lead, even
+    when they have a "score" key of their own.
+    """
+
+    def __init__(self):
+        self._buf = []  # characters since the outermost open brace
+        self._stack = []  # (bracket, buffer offset) of the open "{" / "[" in the outermost object
+        self._in_string = False
+        self._escape = False
+        self._key_start = None  # offset of the last string closed directly in the outermost object
+        self._key = None
+        self._outer_scored = False  # the outermost object has its own "score": it is a lead, not a wrapper
+
+    def feed(self, text):
+        found = []
+        for ch in text:
+            if not self._stack:
+                # Outside any object: only an opening brace matters (prose quotes don't)
+                if ch == "{":
+                    self._buf = ["{"]
+                    self._stack.append(("{", 0))
+                    self._outer_scored = False
+                continue
+
+            self._buf.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        self._key = self._decode("".join(self._buf[self._key_start:]))
+            elif ch == '"':
+                self._in_string = True
+                self._key_start = len(self._buf) - 1
+                self._key = None
+            elif ch == ":" and len(self._stack) == 1:
+                if self._key == "score":
+                    self._outer_scored = True
+            elif ch in "{[":
+                self._stack.append((ch, len(self._buf) - 1))
+            elif ch == "]":
+                if self._stack[-1][0] == "[":
+                    self._stack.pop()
+            elif ch == "}":
+                if self._stack[-1][0] == "[":
+                    self._stack.pop()  # unbalanced "]" — let the enclosing object fail to decode
+                _, start = self._stack.pop()
+                if self._at_lead_depth():
+                    obj = self._decode("".join(self._buf[start:]))
+                    if isinstance(obj, dict) and "score" in obj:
+                        found.append(obj)
+                if not self._stack:
+                    self._buf = []
+        return found
+
+    def _at_lead_depth(self):
+        """Whether the object that just closed is a lead: the outermost object itself, or an
+        element of an array directly inside an outermost wrapper object."""
+        if not self._stack:
+            return True
+        return len(self._stack) == 2 and self._stack[1][0] == "[" and not self._outer_scored
+
+    @staticmethod
+    def _decode(raw):
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            return None
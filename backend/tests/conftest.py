@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# Importing the backend modules builds the LLM client and creates the SQLite tables
+os.environ.setdefault("GMI_API_KEY", "test")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='pipelineom-tests-')}/test.db")
+os.environ.setdefault("LOG_LEVEL", "warning")
@@ -0,0 +1,79 @@
+import csv
+import datetime
+import os
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, delete, select
+
+import database
+from database import Base, GlobalLead, LEAD_INSERT_COLUMNS, SessionLocal, _copy_csv, bulk_insert_leads
+
+STAMP = "2026-10-17 03:04:05.000006"
+
+
+def _leads(session_id):
+    return [
+        (session_id, "Ada", "Chen", "https://x.test/ada", "Acme, Inc.", 'Partner "GP"', "01 Mar 2024"),
+        (session_id, "Ben", "", "", None, "line\nbreak", None),
+    ]
+
+
+def _stored(session_id, engine=None):
+    db = SessionLocal(bind=engine) if engine is not None else SessionLocal()
+    try:
+        columns = [getattr(GlobalLead, name) for name in LEAD_INSERT_COLUMNS] + [GlobalLead.created_at]
+        return db.execute(select(*columns).where(GlobalLead.session_id == session_id).order_by(GlobalLead.id)).all()
+    finally:
+        db.close()
+
+
+def test_copy_csv_keeps_empty_strings_apart_from_null():
+    text = _copy_csv(_leads("s1"), STAMP).getvalue()
+    first, second = text.split("\n", 1)
+    assert first == ('"s1","Ada","Chen","https://x.test/ada","Acme, Inc.","Partner ""GP""","01 Mar 2024",'
+                     '"2026-10-17 03:04:05.000006"')
+    # "" is a quoted empty string; None is an unquoted empty field, which COPY reads as NULL
+    assert second == '"s1","Ben","","",,"line\nbreak",,"2026-10-17 03:04:05.000006"\n'
+
+
+def test_copy_csv_round_trips_through_a_csv_reader():
+    rows = list(csv.reader(_copy_csv(_leads("s1"), STAMP)))
+    assert rows == [
+        ["s1", "Ada", "Chen", "https://x.test/ada", "Acme, Inc.", 'Partner "GP"', "01 Mar 2024", STAMP],
+        ["s1", "Ben", "", "", "", "line\nbreak", "", STAMP],
+    ]
+
+
+def test_bulk_insert_writes_every_chunk():
+    session_id = str(uuid.uuid4())
+    rows = [(session_id, f"First{i}", f"Last{i}", "", "Co", "", "") for i in range(23)]
+    assert bulk_insert_leads(iter(rows), chunk_size=5) == 23
+    stored = _stored(session_id)
+    assert [row[:7] for row in stored] == rows
+    assert len({row.created_at for row in stored}) == 1
+
+
+def test_bulk_insert_keeps_null_and_empty_strings():
+    session_id = str(uuid.uuid4())
+    bulk_insert_leads(_leads(session_id))
+    assert [row[:7] for row in _stored(session_id)] == _leads(session_id)
+
+
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"), reason="set TEST_POSTGRES_URL to run against Postgres")
+def test_copy_path_on_postgres(monkeypatch):
+    pytest.importorskip("psycopg2")
+    engine = create_engine(os.environ["TEST_POSTGRES_URL"])
+    Base.metadata.create_all(bind=engine, tables=[GlobalLead.__table__])
+    monkeypatch.setattr(database, "engine", engine)
+    session_id = str(uuid.uuid4())
+    try:
+        before = datetime.datetime.utcnow()
+        assert bulk_insert_leads(iter(_leads(session_id)), chunk_size=1) == 2
+        stored = _stored(session_id, engine)
+        assert [row[:7] for row in stored] == _leads(session_id)
+        assert all(before <= row.created_at <= datetime.datetime.utcnow() for row in stored)
+    finally:
+        with engine.begin() as conn:
+            conn.execute(delete(GlobalLead).where(GlobalLead.session_id == session_id))
+        engine.dispose()
@@ -0,0 +1,175 @@
+import pytest
+
+from services import _build_column_rename, _header_match_count
+
+
+# Headers of real CRM/contact exports -> (match count, rename map). The expected values
+# come from the original per-cell matcher and are frozen; ColumnMatcher must reproduce them.
+GOLDEN = {
+    "linkedin": (
+        (
+            "First Name", "Last Name", "URL", "Email Address", "Company", "Position", "Connected On",
+        ),
+        7,
+        {
+            "First Name": "First Name",
+            "Last Name": "Last Name",
+            "URL": "URL",
+            "Email Address": "Email",
+            "Company": "Company",
+            "Position": "Position",
+            "Connected On": "Connected On",
+        },
+    ),
+    "hubspot": (
+        (
+            "Record ID", "First Name", "Last Name", "Email", "Phone Number", "Company Name", "Job Title",
+            "Lifecycle Stage", "Contact owner", "City", "Country/Region", "Industry", "Create Date",
+        ),
+        7,
+        {
+            "First Name": "First Name",
+            "Last Name": "Last Name",
+            "Email": "Email",
+            "Company Name": "Company",
+            "Job Title": "Position",
+            "City": "Location",
+            "Industry": "Industry",
+        },
+    ),
+    "salesforce": (
+        (
+            "Salutation", "First Name", "Last Name", "Title", "Account Name", "Mailing City",
+            "Mailing Country", "Email", "Phone", "Lead Source", "Industry", "Website",
+        ),
+        8,
+        {
+            "First Name": "First Name",
+            "Last Name": "Last Name",
+            "Title": "Position",
+            "Account Name": "Company",
+            "Email": "Email",
+            "Industry": "Industry",
+            "Website": "URL",
+            "Mailing City": "Location",
+        },
+    ),
+    "apollo": (
+        (
+            "First Name", "Last Name", "Title", "Company", "Company Name for Emails", "Email", "Email Status",
+            "Seniority", "Departments", "Person Linkedin Url", "Website", "Company Linkedin Url", "Industry",
+            "City", "State", "Country",
+        ),
+        8,
+        {
+            "First Name": "First Name",
+            "Last Name": "Last Name",
+            "Title": "Position",
+            "Company": "Company",
+            "Email": "Email",
+            "Website": "URL",
+            "Industry": "Industry",
+            "City": "Location",
+        },
+    ),
+    "outlook": (
+        (
+            "First Name", "Middle Name", "Last Name", "Title", "Suffix", "Nickname", "E-mail Address",
+            "E-mail 2 Address", "Home Street", "Company", "Department", "Job Title", "Business City",
+            "Business Country/Region", "Web Page",
+        ),
+        6,
+        {
+            "First Name": "First Name",
+            "Last Name": "Last Name",
+            "Title": "Position",
+            "E-mail Address": "Email",
+            "Company": "Company",
+            "Business City": "Location",
+        },
+    ),
+    "google": (
+        (
+            "Name", "Given Name", "Additional Name", "Family Name", "Nickname", "Organization 1 - Name",
+            "Organization 1 - Title", "E-mail 1 - Type", "E-mail 1 - Value", "Address 1 - City",
+            "Website 1 - Value",
+        ),
+        7,
+        {
+            "Given Name": "First Name",
+            "Family Name": "Last Name",
+            "Name": "Company",
+            "Organization 1 - Title": "Position",
+            "E-mail 1 - Type": "Email",
+            "Address 1 - City": "Location",
+            "Website 1 - Value": "URL",
+        },
+    ),
+    "zoominfo": (
+        (
+            "ZoomInfo Contact ID", "First Name", "Last Name", "Job Title", "Job Function",
+            "Direct Phone Number", "Email Address", "Company Name", "Website", "LinkedIn Contact Profile URL",
+            "Primary Industry", "Company City", "Company Country",
+        ),
+        8,
+        {
+            "First Name": "First Name",
+            "Last Name": "Last Name",
+            "Job Title": "Position",
+            "Email Address": "Email",
+            "Company Name": "Company",
+            "Website": "URL",
+            "Primary Industry": "Industry",
+            "Company City": "Location",
+        },
+    ),
+    "snake_case": (
+        (
+            "first_name", "last_name", "job_position", "org", "work email", "sector", "region",
+            "date connected",
+        ),
+        8,
+        {
+            "first_name": "First Name",
+            "last_name": "Last Name",
+            "job_position": "Position",
+            "org": "Company",
+            "work email": "Email",
+            "sector": "Industry",
+            "region": "Location",
+            "date connected": "Connected On",
+        },
+    ),
+    "padded": (
+        (
+            "  FIRSTNAME ", "", "LastName", "e-mail", "  ", "Employer", "Occupation", "connection date",
+        ),
+        6,
+        {
+            "  FIRSTNAME ": "First Name",
+            "LastName": "Last Name",
+            "e-mail": "Email",
+            "Employer": "Company",
+            "Occupation": "Position",
+            "connection date": "Connected On",
+        },
+    ),
+}
+
+
+def _csv_line(header):
+    return ",".join('"%s"' % cell for cell in header)
+
+
+@pytest.mark.parametrize("source", sorted(GOLDEN))
+def test_header_match_count_is_frozen(source):
+    header, count, _ = GOLDEN[source]
+    assert _header_match_count(_csv_line(header)) == count
+    assert _header_match_count(_csv_line(header)) == count  # cached path
+
+
+@pytest.mark.parametrize("source", sorted(GOLDEN))
+def test_column_rename_is_frozen(source):
+    header, _, rename = GOLDEN[source]
+    assert _build_column_rename(list(header)) == rename
+    assert _build_column_rename(list(header)) == rename  # cached path
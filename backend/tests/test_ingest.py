@@ -0,0 +1,107 @@
+import io
+
+import pandas as pd
+import pytest
+
+from services import (
+    _build_column_rename, _detect_encoding, _header_match_count, _sniff_layout, _sniff_sample, _strip_content,
+    iter_csv_chunks, process_csv,
+)
+
+LINKEDIN = (
+    "Notes:\n"
+    '"When exporting your connection data, you may notice that some of the email addresses are missing."\n'
+    "\n"
+    "First Name,Last Name,URL,Email Address,Company,Position,Connected On\n"
+    + "".join(f"Ada{i},Lovelace{i},https://www.linkedin.com/in/ada-{i},,Analytical {i % 7} Ltd,Partner,01 Jan 2024\n"
+              for i in range(300))
+)
+HUBSPOT = "Record ID;Full Name;Email;Job Title;Company Name;Industry;City\n" + "".join(
+    f"{i};Grace Hopper{i};g{i}@navy.mil;Rear Admiral;US Navy {i % 5};Defense;Arlington\n" for i in range(300)
+)
+SALESFORCE = "Contact ID\tFirst Name\tLast Name\tTitle\tAccount Name\tEmail\n" + "".join(
+    f"003{i:06d}\tJosé{i}\tNúñez\tDirectör\tCafé {i % 3}\t\n" for i in range(300)
+)
+
+SALESFORCE_CSV = "Salutation,First Name,Last Name,Title,Account Name,Mailing City,Email,Lead Source\n" + "".join(
+    f'Dr.,Jane{i},Doe{i},"VP, Sales",Acme {i % 9},Paris,j{i}@acme.test,Web\n' for i in range(300)
+)
+
+CASES = {
+    "linkedin": LINKEDIN.encode("utf-8"),
+    "bom+whitespace": b"\xef\xbb\xbf\xef\xbb\xbf \n\t" + LINKEDIN.encode("utf-8") + b"\n\n",
+    "semicolon": HUBSPOT.encode("utf-8"),
+    "latin-1 tabs": SALESFORCE.encode("latin-1"),
+    "crlf": LINKEDIN.replace("\n", "\r\n").encode("utf-8"),
+}
+
+# Header/delimiter regression fixtures: the cases above, plus exports larger than the sniff prefix
+LAYOUT_CASES = {
+    **CASES,
+    "salesforce": SALESFORCE_CSV.encode("utf-8"),
+    "linkedin large": (LINKEDIN + LINKEDIN.split("Connected On\n", 1)[1] * 20).encode("utf-8"),
+    "semicolon large": (HUBSPOT + HUBSPOT.split("City\n", 1)[1] * 20).encode("utf-8"),
+    "no header": "".join(f"a{i},b{i},c{i}\n" for i in range(50)).encode("utf-8"),
+}
+
+
+def legacy_layout(file_contents):
+    """The header row, delimiter and rename map process_csv picked before prefix sniffing:
+    decode everything, scan the first 25 lines, then trial-parse the whole text per delimiter."""
+    try:
+        content_str = file_contents.decode("utf-8")
+    except UnicodeDecodeError:
+        content_str = file_contents.decode("latin-1")
+    content_str = content_str.lstrip("\ufeff").strip()
+    lines = content_str.split("\n")
+    header_idx, best_score = 0, 0
+    for i, line in enumerate(lines[:25]):
+        score = _header_match_count(line)
+        if score > best_score:
+            header_idx, best_score = i, score
+    best_sep, best_rename = ",", {}
+    for sep in [",", "\t", ";", "|"]:
+        try:
+            trial = pd.read_csv(io.StringIO(content_str), skiprows=header_idx, sep=sep)
+            if trial.empty:
+                continue
+            trial.columns = [str(c).strip().strip('"').strip("'") for c in trial.columns]
+            rename = _build_column_rename(trial.columns)
+            if len(rename) > len(best_rename):
+                best_sep, best_rename = sep, rename
+            if len(rename) >= 3:
+                break
+        except Exception:
+            continue
+    return header_idx, best_sep, best_rename
+
+
+@pytest.mark.parametrize("name", LAYOUT_CASES)
+def test_sniffed_layout_matches_the_full_text_parser(name):
+    data = LAYOUT_CASES[name]
+    encoding = _detect_encoding(data)
+    content = _strip_content(data, encoding)
+    sample = _sniff_sample(content)
+    header_idx, sep, rename, _ = _sniff_layout(sample, encoding, truncated=len(sample) < len(content))
+    assert (header_idx, sep or ",", rename) == legacy_layout(data)
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_streamed_chunks_match_in_memory_parse(name, tmp_path):
+    data = CASES[name]
+    path = tmp_path / "upload.csv"
+    path.write_bytes(data)
+    whole = process_csv(data)
+    streamed = pd.concat(list(iter_csv_chunks(str(path), chunksize=70)))
+    assert len(whole) == 300
+    pd.testing.assert_frame_equal(streamed.reset_index(drop=True), whole.reset_index(drop=True))
+
+
+@pytest.mark.parametrize("data", [b"", b"   \n\t", b"\xef\xbb\xbf"])
+def test_blank_uploads_are_rejected(data, tmp_path):
+    path = tmp_path / "blank.csv"
+    path.write_bytes(data)
+    with pytest.raises(ValueError):
+        process_csv(data)
+    with pytest.raises(ValueError):
+        list(iter_csv_chunks(str(path)))
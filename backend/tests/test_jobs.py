@@ -0,0 +1,29 @@
+import asyncio
+
+from jobs import Job
+
+
+def test_unread_keep_alive_does_not_block_publish():
+    async def scenario():
+        job = Job("j")
+        job.keep_alive = 0.05
+        stream = job.stream()
+        assert await stream.__anext__() == ": keep-alive\n\n"
+        # The consumer stalls here, holding the generator suspended after the keep-alive
+        await asyncio.wait_for(job.publish("stage", stage="scoring"), timeout=1)
+        assert (await stream.__anext__()).startswith("id: 1\nevent: stage\n")
+        await stream.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_stream_replays_from_start_and_ends_when_finished():
+    async def scenario():
+        job = Job("j")
+        await job.publish("stage", stage="ingest")
+        await job.publish("partial", stage="scoring", leads=[{"name": "a"}])
+        job.status = "done"
+        return [chunk async for chunk in job.stream(start=1)]
+
+    chunks = asyncio.run(scenario())
+    assert len(chunks) == 1 and chunks[0].startswith("id: 2\nevent: partial\n")
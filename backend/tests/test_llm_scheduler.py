@@ -0,0 +1,197 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from benchmarks.fake_llm import create_app
+from llm_scheduler import LLMScheduler
+
+
+def _scheduler(**kwargs):
+    return LLMScheduler(**{"timeout": 5.0, "max_retries": 2, "base_delay": 0.0, "max_delay": 0.0, **kwargs})
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_in_flight_cap_is_never_exceeded():
+    scheduler = _scheduler(max_in_flight=3)
+    running = {"now": 0, "peak": 0}
+
+    async def call():
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+        return "ok"
+
+    async def main():
+        return await asyncio.gather(*(scheduler.run(f"req{i % 4}", call) for i in range(20)))
+
+    assert asyncio.run(main()) == ["ok"] * 20
+    assert running["peak"] == 3
+    assert scheduler.stats()["in_flight"] == 0
+    assert scheduler.stats()["queue_depth"] == 0
+
+
+def test_waiting_requests_are_served_round_robin():
+    scheduler = _scheduler(max_in_flight=1)
+    order = []
+
+    async def main():
+        gate = asyncio.Event()
+
+        async def blocker():
+            await gate.wait()
+
+        def call(name):
+            async def run():
+                order.append(name)
+            return run
+
+        holder = asyncio.create_task(scheduler.run("holder", blocker))
+        await _settle()
+        tasks = []
+        for key, n in (("a", 4), ("b", 2), ("c", 1)):
+            for i in range(n):
+                tasks.append(asyncio.create_task(scheduler.run(key, call(f"{key}{i + 1}"))))
+                await _settle()
+        assert scheduler.stats()["queue_depth"] == 7
+        gate.set()
+        await asyncio.gather(holder, *tasks)
+
+    asyncio.run(main())
+    assert order == ["a1", "b1", "c1", "a2", "b2", "a3", "a4"]
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    scheduler = _scheduler(max_in_flight=1)
+    ran = []
+
+    async def main():
+        gate = asyncio.Event()
+
+        async def blocker():
+            await gate.wait()
+
+        async def call():
+            ran.append("b")
+
+        holder = asyncio.create_task(scheduler.run("holder", blocker))
+        await _settle()
+        cancelled = asyncio.create_task(scheduler.run("a", call))
+        waiting = asyncio.create_task(scheduler.run("b", call))
+        await _settle()
+        cancelled.cancel()
+        await _settle()
+        assert scheduler.stats()["queued_requests"] == 1
+        gate.set()
+        await asyncio.gather(holder, waiting)
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+
+    asyncio.run(main())
+    assert ran == ["b"]
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_slot_handed_to_a_cancelled_waiter_goes_to_the_next():
+    scheduler = _scheduler(max_in_flight=1)
+
+    async def call():
+        return "ok"
+
+    async def main():
+        await scheduler._acquire("holder")
+        first = asyncio.create_task(scheduler.run("a", call))
+        second = asyncio.create_task(scheduler.run("b", call))
+        await _settle()
+        # Hand the slot to `first`, then cancel it before it gets to run
+        scheduler._release()
+        first.cancel()
+        assert await asyncio.wait_for(second, 2) == "ok"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    asyncio.run(main())
+    assert scheduler.stats()["in_flight"] == 0
+    assert scheduler.stats()["queue_depth"] == 0
+
+
+def test_timeouts_are_retried_then_raised():
+    scheduler = _scheduler(timeout=0.02, max_retries=2)
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(1)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(scheduler.run("req", slow))
+    assert len(calls) == 3
+    stats = scheduler.stats()
+    assert (stats["timeouts"], stats["retries"], stats["failures"], stats["in_flight"]) == (3, 2, 1, 0)
+
+
+def test_other_errors_are_not_retried():
+    scheduler = _scheduler()
+    calls = []
+
+    async def broken():
+        calls.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(scheduler.run("req", broken))
+    assert len(calls) == 1
+    assert scheduler.stats()["failures"] == 1
+
+
+def _http(app):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://fake-llm")
+
+
+def _fake_client(app):
+    return openai.AsyncOpenAI(base_url="http://fake-llm/v1", api_key="test", max_retries=0, http_client=_http(app))
+
+
+def _completion(client, i):
+    async def call():
+        response = await client.chat.completions.create(
+            model="fake", messages=[{"role": "user", "content": f"prompt {i}"}],
+        )
+        return response.choices[0].message.content
+    return call
+
+
+def test_rate_limits_from_the_fake_server_are_retried():
+    app = create_app(latency=0.005, token_ms=0, rate_429=0.4, seed=3)
+    scheduler = _scheduler(max_in_flight=4, max_retries=8, base_delay=0.01, max_delay=0.05)
+
+    async def main():
+        client = _fake_client(app)
+        results = await asyncio.gather(*(scheduler.run(f"req{i % 3}", _completion(client, i)) for i in range(12)))
+        return results, (await _http(app).get("/stats")).json()
+
+    results, server = asyncio.run(main())
+    assert len(results) == 12 and all(results)
+    assert server["rate_limited"] > 0
+    assert scheduler.stats()["retries"] == server["rate_limited"]
+    assert scheduler.stats()["failures"] == 0
+
+
+def test_rate_limit_retries_are_exhausted():
+    app = create_app(latency=0, token_ms=0, rate_429=1.0)
+    scheduler = _scheduler(max_retries=3, base_delay=0.01, max_delay=0.05)
+
+    async def main():
+        client = _fake_client(app)
+        with pytest.raises(openai.RateLimitError):
+            await scheduler.run("req", _completion(client, 0))
+        return (await _http(app).get("/stats")).json()
+
+    assert asyncio.run(main())["calls"] == 4
+    assert scheduler.stats()["failures"] == 1
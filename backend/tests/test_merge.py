@@ -0,0 +1,23 @@
+from main import _match_enrichments
+
+
+def test_matches_by_id_in_any_order():
+    results = [{"id": 2, "reasoning": "P2"}, {"id": "1", "reasoning": "P1"}]
+    assert _match_enrichments(results, 2) == [(results[1], True), (results[0], True)]
+
+
+def test_skipped_id_is_not_filled_by_position():
+    results = [{"id": 1, "reasoning": "P1"}, {"id": 3, "reasoning": "P3"}]
+    matched = _match_enrichments(results, 3)
+    assert matched[1] == (None, True)
+    assert [m[0]["reasoning"] for m in (matched[0], matched[2])] == ["P1", "P3"]
+
+
+def test_out_of_range_and_bad_ids_are_ignored():
+    results = [{"id": 9}, {"id": "x"}, {"id": 2, "reasoning": "P2"}, {}]
+    assert _match_enrichments(results, 2) == [(None, True), (results[2], True)]
+
+
+def test_positional_fallback_only_without_usable_ids():
+    results = [{"reasoning": "a"}, {"id": None, "reasoning": "b"}]
+    assert _match_enrichments(results, 3) == [(results[0], False), (results[1], False), (None, False)]
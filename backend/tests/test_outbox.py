@@ -0,0 +1,157 @@
+import asyncio
+import datetime
+import threading
+import time
+
+import pytest
+from sqlalchemy import delete, insert, select
+
+from database import OutboxEmail, SessionLocal, write_session
+from outbox import EmailOutbox
+
+
+class ProviderError(Exception):
+    def __init__(self, code, retry_after=None):
+        super().__init__(f"provider error {code}")
+        self.code = code
+        self.headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+
+
+class FakeProvider:
+    """Records every send; `failures` is a list of errors raised by the first sends."""
+
+    def __init__(self, failures=(), latency=0.0):
+        self.failures = list(failures)
+        self.latency = latency
+        self.sent = []
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def send(self, params):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            failure = self.failures.pop(0) if self.failures else None
+        try:
+            time.sleep(self.latency)
+            if failure is not None:
+                raise failure
+            self.sent.append(params)
+            return {"id": len(self.sent)}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+@pytest.fixture(autouse=True)
+def empty_outbox():
+    with write_session() as db:
+        db.execute(delete(OutboxEmail))
+
+
+def _outbox(provider, **kwargs):
+    kwargs = {"base_delay": 0.0, "max_delay": 0.0, "poll_interval": 0.05, **kwargs}
+    return EmailOutbox(provider, sender="OM <test@example.com>", **kwargs)
+
+
+def _rows():
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(OutboxEmail.id, OutboxEmail.status, OutboxEmail.attempts, OutboxEmail.next_attempt_at,
+                   OutboxEmail.last_error).order_by(OutboxEmail.id)
+        ).all()
+        return [row._asdict() for row in rows]
+    finally:
+        db.close()
+
+
+def test_drain_delivers_queued_emails_with_attachments():
+    provider = FakeProvider()
+    outbox = _outbox(provider)
+    outbox.enqueue("a@example.com", "Report", "<p>hi</p>", attachments=[("leads.csv", b"a,b\n")])
+    outbox.enqueue("b@example.com", "Report", "<p>hi</p>")
+    asyncio.run(outbox.drain())
+    assert [row["status"] for row in _rows()] == ["sent", "sent"]
+    first = next(p for p in provider.sent if p["to"] == ["a@example.com"])
+    assert first["from"] == "OM <test@example.com>"
+    assert first["attachments"] == [{"filename": "leads.csv", "content": "YSxiCg=="}]
+    assert "attachments" not in next(p for p in provider.sent if p["to"] == ["b@example.com"])
+    assert outbox.stats()["sent"] == 2
+
+
+def test_transient_errors_are_retried_until_sent():
+    provider = FakeProvider(failures=[ProviderError(500), ProviderError(429)])
+    outbox = _outbox(provider)
+    outbox.enqueue("a@example.com", "Report", "<p>hi</p>")
+    asyncio.run(outbox.drain())
+    [row] = _rows()
+    assert (row["status"], row["attempts"], row["last_error"]) == ("sent", 3, None)
+    assert outbox.stats()["retries"] == 2
+
+
+def test_retry_backs_off_by_the_retry_after_hint():
+    provider = FakeProvider(failures=[ProviderError(429, retry_after=30)])
+    outbox = _outbox(provider, base_delay=0.01, max_delay=60.0)
+    outbox.enqueue("a@example.com", "Report", "<p>hi</p>")
+    before = datetime.datetime.utcnow()
+    asyncio.run(outbox.drain())
+    [row] = _rows()
+    assert (row["status"], row["attempts"]) == ("queued", 1)
+    assert row["next_attempt_at"] >= before + datetime.timedelta(seconds=30)
+    assert provider.sent == []
+
+
+def test_permanent_error_is_not_retried():
+    provider = FakeProvider(failures=[ProviderError(422)])
+    outbox = _outbox(provider)
+    outbox.enqueue("bad-address", "Report", "<p>hi</p>")
+    asyncio.run(outbox.drain())
+    [row] = _rows()
+    assert (row["status"], row["attempts"]) == ("failed", 1)
+    assert "422" in row["last_error"]
+
+
+def test_gives_up_after_max_attempts():
+    provider = FakeProvider(failures=[ProviderError(503)] * 10)
+    outbox = _outbox(provider, max_attempts=3)
+    outbox.enqueue("a@example.com", "Report", "<p>hi</p>")
+    asyncio.run(outbox.drain())
+    [row] = _rows()
+    assert (row["status"], row["attempts"]) == ("failed", 3)
+    assert len(provider.failures) == 7
+
+
+def test_expired_lease_is_sent_again_after_a_restart():
+    past = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+    future = datetime.datetime.utcnow() + datetime.timedelta(minutes=5)
+    with write_session() as db:
+        for to, leased_until in (("orphan@example.com", past), ("live@example.com", future)):
+            db.execute(insert(OutboxEmail).values(
+                to=to, subject="Report", html="<p>hi</p>", attachments="[]", status="sending",
+                attempts=1, next_attempt_at=leased_until, created_at=past,
+            ))
+    provider = FakeProvider()
+    asyncio.run(_outbox(provider).drain())
+    assert [p["to"] for p in provider.sent] == [["orphan@example.com"]]
+    assert [(row["status"], row["attempts"]) for row in _rows()] == [("sent", 2), ("sending", 1)]
+
+
+def test_sender_never_exceeds_max_concurrent():
+    provider = FakeProvider(latency=0.05)
+    outbox = _outbox(provider, max_concurrent=2)
+    for i in range(6):
+        outbox.enqueue(f"user{i}@example.com", "Report", "<p>hi</p>")
+
+    async def run():
+        outbox.wake()
+        deadline = time.monotonic() + 10
+        while len(provider.sent) < 6 and time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+        await outbox.stop()
+
+    asyncio.run(run())
+    assert len(provider.sent) == 6
+    assert provider.peak == 2
+    assert all(row["status"] == "sent" for row in _rows())
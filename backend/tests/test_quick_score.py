@@ -0,0 +1,77 @@
+import random
+
+import pandas as pd
+import pytest
+
+from services import lead_profiles, materialize_profiles, quick_score_frame
+
+
+def legacy_quick_score(profile, strategy):
+    """The per-row scorer quick_score_frame replaced, kept as the oracle."""
+    keywords = [k.lower() for k in strategy.get("keywords", []) if isinstance(k, str)]
+    boost_words = [b.lower() for b in strategy.get("boost_words", []) if isinstance(b, str)]
+    company_words = [c.lower() for c in strategy.get("company_words", []) if isinstance(c, str)]
+    negative_words = [n.lower() for n in strategy.get("negative_words", ["intern", "student"]) if isinstance(n, str)]
+    priority_signals = [s.lower() for s in strategy.get("priority_signals", []) if isinstance(s, str)]
+
+    pos = profile.get("Position", "").lower()
+    comp = profile.get("Company", "").lower()
+    text = f"{pos} {comp}"
+    score = 0
+    score += sum(1 for w in keywords if w in text)
+    score += sum(2 for w in boost_words if w in pos)
+    score += sum(2 for w in company_words if w in comp)
+    score += sum(1 for w in priority_signals if w in text)
+    for w in negative_words:
+        if w in pos:
+            score -= 5
+    return score
+
+
+TITLES = ["General Partner", "Partner", "VP Sales", "Software Engineer", "Founder & CEO", "Intern",
+          "Student Ambassador", "Venture Partner", "Angel Investor", "Head of Growth", "", "  Principal  "]
+COMPANIES = ["Acme Capital", "Ventures Inc", "Globex", "Initech Labs", "Partner Capital Group", "", "VC Fund",
+             "CAPITAL ventures", "Student Loans Co"]
+TERMS = ["partner", "Partner", "capital", "vc", "ventures", "angel", "intern", "student", "partner capital",
+         "r c", "sales", "", "CEO", "p", "labs", 7, None]
+
+
+def _frame(n, rnd):
+    return materialize_profiles(pd.DataFrame({
+        "First Name": [f"F{i}" for i in range(n)],
+        "Last Name": [f"L{i}" for i in range(n)],
+        "Position": [rnd.choice(TITLES) for _ in range(n)],
+        "Company": [rnd.choice(COMPANIES) for _ in range(n)],
+        "Industry": "", "Location": "", "URL": "", "Email": "", "Connected On": "",
+    }))
+
+
+def _strategy(rnd):
+    strategy = {}
+    for field in ("keywords", "boost_words", "company_words", "negative_words", "priority_signals"):
+        if rnd.random() < 0.85:  # missing negative_words falls back to the defaults
+            strategy[field] = [rnd.choice(TERMS) for _ in range(rnd.randint(0, 6))]
+    return strategy
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_matches_legacy_scorer(seed):
+    rnd = random.Random(seed)
+    df = _frame(300, rnd)
+    strategy = _strategy(rnd)
+    expected = [legacy_quick_score(p, strategy) for p in lead_profiles(df)]
+    assert quick_score_frame(df, strategy).tolist() == expected
+
+
+def test_repeated_terms_count_per_entry():
+    df = _frame(1, random.Random(0))
+    df["Position"] = "partner"
+    df["Company"] = "capital"
+    strategy = {"keywords": ["partner", "partner"], "company_words": ["capital"], "negative_words": ["partner"]}
+    assert quick_score_frame(df, strategy).tolist() == [1 + 1 + 2 - 5]
+
+
+def test_aligned_to_frame_index():
+    df = _frame(50, random.Random(1)).iloc[::2]
+    scores = quick_score_frame(df, {"keywords": ["partner"]})
+    assert scores.index.equals(df.index)
@@ -0,0 +1,44 @@
+import types
+import uuid
+
+import pytest
+from sqlalchemy import insert, select
+
+from database import SessionLocal, SiteEmail, write_session
+from retries import backoff_delay, retry_after
+
+
+def test_retry_after_reads_error_or_response_headers():
+    assert retry_after(types.SimpleNamespace(headers={"retry-after": "7"})) == 7.0
+    response = types.SimpleNamespace(headers={"retry-after": "2.5"})
+    assert retry_after(types.SimpleNamespace(headers=None, response=response)) == 2.5
+    assert retry_after(types.SimpleNamespace(response=types.SimpleNamespace(headers={}))) is None
+    assert retry_after(types.SimpleNamespace(headers={"retry-after": "soon"})) is None
+    assert retry_after(ValueError("boom")) is None
+
+
+def test_backoff_delay_honours_the_hint_up_to_max_delay():
+    hinted = types.SimpleNamespace(headers={"retry-after": "30"})
+    assert backoff_delay(0, hinted, 0.5, 10) == 10
+    assert backoff_delay(0, types.SimpleNamespace(headers={"retry-after": "3"}), 0.5, 10) >= 3
+    assert 0 <= backoff_delay(10, ValueError(), 0.5, 10) <= 10
+
+
+def _emails(address):
+    db = SessionLocal()
+    try:
+        return db.execute(select(SiteEmail.email).where(SiteEmail.email == address)).scalars().all()
+    finally:
+        db.close()
+
+
+def test_write_session_commits_on_success_and_rolls_back_on_error():
+    kept, dropped = f"{uuid.uuid4().hex}@a.test", f"{uuid.uuid4().hex}@b.test"
+    with write_session() as db:
+        db.execute(insert(SiteEmail).values(email=kept, source="test"))
+    with pytest.raises(RuntimeError):
+        with write_session() as db:
+            db.execute(insert(SiteEmail).values(email=dropped, source="test"))
+            raise RuntimeError("abort")
+    assert _emails(kept) == [kept]
+    assert _emails(dropped) == []
@@ -0,0 +1,45 @@
+import types
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.dialects import postgresql
+
+import score_cache as score_cache_module
+from metrics import CACHE_WRITES
+from score_cache import ScoreCache
+
+
+def _entry(score, reasoning="r"):
+    return {"score": score, "reasoning": reasoning, "symmetric_value": "v"}
+
+
+def test_put_many_replaces_existing_keys():
+    cache = ScoreCache()
+    key = uuid.uuid4().hex
+    stored = CACHE_WRITES.value(cache="score", op="stored")
+    cache.put_many({key: _entry(3, "first")})
+    cache.put_many({key: _entry(8, "second"), uuid.uuid4().hex: _entry(1)})
+    assert cache.get_many([key]) == {key: {"score": 8.0, "reasoning": "second", "symmetric_value": "v"}}
+    assert CACHE_WRITES.value(cache="score", op="stored") == stored + 3
+
+
+def test_concurrent_writers_of_the_same_key_all_land():
+    cache = ScoreCache()
+    keys = [uuid.uuid4().hex for _ in range(20)]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda score: cache.put_many({key: _entry(score) for key in keys}), range(8)))
+    found = cache.get_many(keys)
+    assert set(found) == set(keys)
+    assert len({entry["score"] for entry in found.values()}) == 1
+
+
+def test_postgres_upsert_is_a_single_on_conflict_insert(monkeypatch):
+    statements = []
+    db = types.SimpleNamespace(execute=lambda stmt, rows=None: statements.append(stmt))
+    monkeypatch.setattr(score_cache_module, "engine", types.SimpleNamespace(dialect=types.SimpleNamespace(name="postgresql")))
+    row = {"key": "k", "score": 1.0, "reasoning": "", "symmetric_value": "", "created_at": None, "last_used_at": None}
+    ScoreCache()._upsert(db, [row])
+    [stmt] = statements
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (key) DO UPDATE SET score = excluded.score" in sql
+    assert "created_at = excluded.created_at" in sql
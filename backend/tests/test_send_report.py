@@ -0,0 +1,34 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert, select
+
+import main
+from database import AnalysisSession, SessionLocal, SiteEmail
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def _emails(address):
+    db = SessionLocal()
+    try:
+        return db.execute(select(SiteEmail.email).where(SiteEmail.email == address)).all()
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("status, code", [(None, 404), ("running", 409)])
+def test_rejected_report_records_nothing(client, status, code):
+    session_id = str(uuid.uuid4())
+    if status:
+        main.session_store._write(insert(AnalysisSession).values(
+            session_id=session_id, request_hash=uuid.uuid4().hex, idea="", status=status,
+        ))
+    address = f"{uuid.uuid4().hex}@example.com"
+    response = client.post("/send-report", json={"email": address, "session_id": session_id})
+    assert response.status_code == code
+    assert _emails(address) == []
@@ -0,0 +1,65 @@
+import asyncio
+import datetime
+import time
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import insert
+
+import main
+from database import AnalysisSession
+from session_store import SessionStore
+
+
+def _row(store, status, age_s, result=None):
+    session_id = str(uuid.uuid4())
+    fingerprint = uuid.uuid4().hex
+    store._write(insert(AnalysisSession).values(
+        session_id=session_id, request_hash=fingerprint, idea="", status=status, result=result,
+        created_at=datetime.datetime.utcnow() - datetime.timedelta(seconds=age_s),
+    ))
+    return session_id, fingerprint
+
+
+def test_find_reuses_done_and_live_running_sessions():
+    store = SessionStore(window=600, stale_after=60)
+    done, done_hash = _row(store, "done", 300, result='{"data": []}')
+    running, running_hash = _row(store, "running", 10)
+    assert store.find(done_hash)[:3] == (done, "done", {"data": []})
+    assert store.find(running_hash)[:2] == (running, "running")
+
+
+def test_find_skips_failed_orphaned_and_expired_sessions():
+    store = SessionStore(window=600, stale_after=60)
+    for status, age in (("error", 5), ("running", 120), ("done", 900)):
+        _, fingerprint = _row(store, status, age)
+        assert store.find(fingerprint) is None
+
+
+def test_wait_is_bounded_by_the_session_start(monkeypatch):
+    monkeypatch.setattr(main, "SESSION_POLL_S", 0.05)
+    monkeypatch.setattr(main.session_store, "stale_after", datetime.timedelta(seconds=4))
+    session_id, _ = _row(main.session_store, "running", 3.5)
+    created_at = datetime.datetime.utcnow() - datetime.timedelta(seconds=3.5)
+    started = time.monotonic()
+    with pytest.raises(HTTPException) as err:
+        asyncio.run(main._wait_for_session(session_id, created_at))
+    assert err.value.status_code == 504
+    assert time.monotonic() - started < 1.5
+
+
+def test_cancelled_run_is_marked_failed():
+    async def scenario():
+        fingerprint, session_id = uuid.uuid4().hex, str(uuid.uuid4())
+        pending = main._claim(fingerprint, session_id)
+        task = asyncio.create_task(main._run_claimed(fingerprint, session_id, "idea", pending, lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return session_id, fingerprint
+
+    session_id, fingerprint = asyncio.run(scenario())
+    assert main.session_store.get(session_id)[0] == "error"
+    assert main.session_store.find(fingerprint) is None
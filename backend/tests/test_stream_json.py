@@ -0,0 +1,104 @@
+import json
+import random
+
+import pytest
+
+from stream_json import LeadObjectStream
+
+TRICKY = ['plain', 'has "quotes"', 'brace } and { inside', 'back\\slash', 'tail backslash \\', '[1, 2]', '',
+          'unicode – é 🚀', 'json-ish {"score": 1}', 'newline\nand\ttab']
+
+
+def _leads(rnd, n):
+    leads = []
+    for i in range(n):
+        lead = {"id": i + 1, "score": round(rnd.uniform(0, 10), 1),
+                "symmetric_value": rnd.choice(TRICKY), "reasoning": rnd.choice(TRICKY)}
+        if rnd.random() < 0.3:
+            lead["meta"] = {"tags": [rnd.choice(TRICKY)], "nested": {"x": rnd.choice(TRICKY)}}
+        if rnd.random() < 0.3:
+            # nested objects with a "score" of their own belong to the lead, not beside it
+            lead["detail"] = {"score": rnd.randint(0, 10), "history": [{"score": rnd.randint(0, 10)}]}
+        leads.append(lead)
+    return leads
+
+
+def _render(rnd, leads):
+    """Model-style output and, per lead, the offset just past its closing brace."""
+    parts, ends = [], []
+    prefix = rnd.choice(["", "```json\n", "```\n", "Here are the scores:\n", '{"results": '])
+    text = prefix + "["
+    for i, lead in enumerate(leads):
+        text += ("," if i else "") + rnd.choice(["", " ", "\n  "])
+        text += json.dumps(lead, ensure_ascii=rnd.random() < 0.5, indent=rnd.choice([None, 2]))
+        ends.append(len(text))
+    text += "]"
+    if prefix.startswith("{"):
+        text += "}"
+    text += rnd.choice(["", "\n```", "\nHope this helps!"])
+    return text, ends
+
+
+def _feed(text, cuts):
+    stream = LeadObjectStream()
+    found = []
+    bounds = [0, *sorted(cuts), len(text)]
+    for a, b in zip(bounds, bounds[1:]):
+        found.extend(stream.feed(text[a:b]))
+    return found
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_any_chunking_yields_every_lead_in_order(seed):
+    rnd = random.Random(seed)
+    leads = _leads(rnd, rnd.randint(0, 12))
+    text, _ = _render(rnd, leads)
+    cuts = rnd.sample(range(len(text) + 1), min(len(text), rnd.randint(0, 40)))
+    assert _feed(text, cuts) == leads
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_truncation_yields_the_complete_prefix(seed):
+    rnd = random.Random(1000 + seed)
+    leads = _leads(rnd, rnd.randint(1, 8))
+    text, ends = _render(rnd, leads)
+    for cut in sorted(rnd.sample(range(len(text) + 1), 25)):
+        complete = sum(1 for end in ends if end <= cut)
+        assert _feed(text[:cut], [rnd.randrange(cut + 1)]) == leads[:complete]
+
+
+def test_one_character_at_a_time():
+    leads = _leads(random.Random(7), 5)
+    text = "```json\n" + json.dumps(leads) + "\n```"
+    assert _feed(text, range(len(text))) == leads
+
+
+def test_objects_without_score_are_skipped():
+    text = '{"results": [{"id": 1, "note": "no score"}, {"id": 2, "score": 4}], "meta": {"count": 2}}'
+    assert _feed(text, []) == [{"id": 2, "score": 4}]
+
+
+@pytest.mark.parametrize("prefix,suffix", [("", ""), ('{"results": ', "}")])
+def test_nested_score_objects_are_not_leads(prefix, suffix):
+    text = prefix + '[{"index": 0, "score": 5, "detail": {"score": 1}}, {"index": 1, "score": 3}]' + suffix
+    assert _feed(text, []) == [{"index": 0, "score": 5, "detail": {"score": 1}}, {"index": 1, "score": 3}]
+
+
+def test_arrays_inside_a_lead_are_not_a_wrapper():
+    text = '[{"id": 1, "score": 6, "history": [{"score": 2}, {"score": 4}]}]'
+    assert _feed(text, [20, 40]) == [{"id": 1, "score": 6, "history": [{"score": 2}, {"score": 4}]}]
+
+
+def test_malformed_object_is_dropped_and_parsing_continues():
+    text = '[{"id": 1, "score": 7,}, {"id": 2, "score": 5, "reasoning": "ok"}]'
+    assert _feed(text, [10, 30]) == [{"id": 2, "score": 5, "reasoning": "ok"}]
+
+
+def test_prose_quotes_outside_objects_are_ignored():
+    text = 'The "top" lead\'s scores: [{"id": 1, "score": 9, "reasoning": "say \\"hi\\""}]'
+    assert _feed(text, [5, 40]) == [{"id": 1, "score": 9, "reasoning": 'say "hi"'}]
+
+
+@pytest.mark.parametrize("text", ["", "Sorry, I can't help with that.", "```json\n[]\n```", "[", '[{"id": 1, "sco'])
+def test_no_complete_leads(text):
+    assert _feed(text, [len(text) // 2]) == []
@@ -18,6 +18,7 @@ export default function Home() {
   const [email, setEmail] = useState("");
   const [sessionId, setSessionId] = useState<string>("");
   const [isUnlocked, setIsUnlocked] = useState(false);
+  const [scoring, setScoring] = useState<{ done: number; total: number } | null>(null);
   
   // Loading State
   const [loadingMessage, setLoadingMessage] = useState("Initializing...");
@@ -63,13 +64,40 @@ export default function Home() {
     try {
       setStatus("analyzing");
       setIsUnlocked(false); 
+      setScoring(null);
       
-      const response = await axios.post(`${siteConfig.api.url}/analyze`, formData);
-      setStrategy(response.data.strategy);
-      setResults(response.data.data);
-      setSessionId(response.data.session_id || "");
-      setProgress(100);
-      setTimeout(() => setStatus("done"), 500);
+      // Submit returns immediately; stage updates and partial top leads stream over SSE
+      const response = await axios.post(`${siteConfig.api.url}/analyze/jobs`, formData);
+      const jobId: string = response.data.job_id;
+      setSessionId(response.data.session_id || jobId);
+
+      const events = new EventSource(`${siteConfig.api.url}/analyze/jobs/${jobId}/events`);
+      events.addEventListener("strategy", (ev) => {
+        setStrategy(JSON.parse((ev as MessageEvent).data).strategy);
+      });
+      events.addEventListener("partial", (ev) => {
+        const data = JSON.parse((ev as MessageEvent).data);
+        setResults(data.leads || []);
+        setScoring({ done: data.batches_done, total: data.batches });
+        setStatus("done");
+      });
+      events.addEventListener("done", (ev) => {
+        const data = JSON.parse((ev as MessageEvent).data);
+        events.close();
+        setStrategy(data.strategy);
+        setResults(data.data);
+        setScoring(null);
+        setProgress(100);
+        setTimeout(() => setStatus("done"), 500);
+      });
+      events.addEventListener("error", (ev) => {
+        const detail = (ev as MessageEvent).data ? JSON.parse((ev as MessageEvent).data).detail : null;
+        if (!detail && events.readyState !== EventSource.CLOSED) return; // transient drop — browser reconnects
+        events.close();
+        alert(detail || "Analysis failed. Ensure backend is running and try again.");
+        setScoring(null);
+        setStatus("idle");
+      });
       
     } catch (e: unknown) {
       const msg = axios.isAxiosError(e) && e.response?.data?.detail
@@ -83,6 +111,10 @@ export default function Home() {
   };
 
   const handleUnlock = async () => {
+    if (scoring) {
+      alert("Still scoring your leads — the report will be ready in a moment.");
+      return;
+    }
     if (!email.includes("@")) {
       alert("Please enter a valid email address.");
       return;
@@ -91,12 +123,9 @@ export default function Home() {
     try {
       setIsUnlocked(true); 
 
+      // The report is built server-side from the session's stored leads
       await axios.post(`${siteConfig.api.url}/send-report`, {
         email: email,
-        leads: results || [],
-        query: idea || "Network Analysis",
-        persona: strategy?.persona || "Targeted Leads",
-        summary_analysis: strategy?.summary_analysis || strategy?.summary || "Analysis complete.",
         session_id: sessionId,
       });
       
@@ -220,6 +249,9 @@ export default function Home() {
                     <p className="text-sm font-medium text-stone-500 uppercase tracking-wide">
                       {isUnlocked ? `Report: ${results.length} candidates` : `Preview — ${results.length} leads scored`}
                     </p>
+                    {scoring && (
+                      <p className="text-xs text-stone-400">Still scoring — {scoring.done}/{scoring.total} batches</p>
+                    )}
                   </div>
 
                   {/* Results Table — Pulse-style bar + number, muted palette */}